@@ -0,0 +1,52 @@
+"""Compara la exportación PDF con fpdf y con el escritor por páginas.
+
+Mide el tiempo y el pico de memoria (tracemalloc) de cada modo sobre
+informes sintéticos de distinto número de líneas: informes mixtos
+(secciones, listas y tablas) y un informe con una sola tabla de
+incidencias, que es un único bloque.
+
+Uso: python -m benchmarks.bench_pdf_export [líneas ...]
+"""
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+from benchmarks.synthetic import make_report_markdown, make_table_markdown
+from exports.document import parse_markdown
+from exports.pdf import render_pdf
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+MODES = {"fpdf": False, "streaming": True}
+CASES = {"mixto": make_report_markdown, "tabla": make_table_markdown}
+
+def measure(document, streaming, output_file):
+    """Devuelve (segundos, pico de memoria en MB, tamaño en KB) de un renderizado.
+
+    El tiempo se mide en una ejecución sin tracemalloc, que lo distorsiona,
+    y el pico de memoria en una segunda ejecución.
+    """
+    start = time.perf_counter()
+    render_pdf(document, output_file, streaming=streaming)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    render_pdf(document, output_file, streaming=streaming)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak / 1024 ** 2, os.path.getsize(output_file) / 1024
+
+def main(sizes):
+    print(f"{'caso':>6} {'líneas':>8} {'bloques':>8} {'unidades':>9} {'modo':>10} {'tiempo (s)':>11} "
+          f"{'pico (MB)':>10} {'PDF (KB)':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for case, make_markdown in CASES.items():
+            for size in sizes:
+                document = parse_markdown(make_markdown(size))
+                for mode, streaming in MODES.items():
+                    seconds, peak, kb = measure(document, streaming, os.path.join(tmp, f"{mode}.pdf"))
+                    print(f"{case:>6} {size:>8} {len(document.blocks):>8} {document.render_units():>9} "
+                          f"{mode:>10} {seconds:>11.2f} {peak:>10.1f} {kb:>9.0f}")
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,64 @@
+"""Clientes falsos de Jira y OpenAI para medir el pipeline sin red.
+
+Reproducen solo la parte de la interfaz que usa el código: search_issues
+de jira.JIRA y chat.completions.create de openai.OpenAI (con y sin stream).
+"""
+import time
+import threading
+from types import SimpleNamespace
+from benchmarks.synthetic import make_report_markdown
+
+class ResultList(list):
+    """Página de resultados de search_issues, con el total como jira.client.ResultList."""
+
+    def __init__(self, items, total):
+        super().__init__(items)
+        self.total = total
+
+class FakeJiraClient:
+    """Sustituto de jira.JIRA que pagina una lista fija de incidencias."""
+
+    def __init__(self, issues, latency=0.0):
+        self.issues = issues
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def search_issues(self, jql, startAt=0, maxResults=50, fields=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return ResultList(self.issues[startAt:startAt + maxResults], len(self.issues))
+
+    def myself(self):
+        return {"displayName": "Usuario de prueba"}
+
+class FakeCompletions:
+    """chat.completions de un cliente de OpenAI que devuelve siempre el mismo informe."""
+
+    def __init__(self, report, latency=0.0, chunk_chars=40):
+        self.report = report
+        self.latency = latency
+        self.chunk_chars = chunk_chars
+        self.calls = 0
+        self.prompt_chars = 0
+        self._lock = threading.Lock()
+
+    def create(self, model, messages, temperature=None, stream=False, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.prompt_chars += sum(len(message["content"]) for message in messages)
+        if self.latency:
+            time.sleep(self.latency)
+        if stream:
+            return iter([
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=self.report[i:i + self.chunk_chars]))])
+                for i in range(0, len(self.report), self.chunk_chars)
+            ])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.report))])
+
+def make_fake_openai(report=None, latency=0.0):
+    """Cliente con la forma de openai.OpenAI; el informe por defecto es Markdown sintético."""
+    completions = FakeCompletions(report or make_report_markdown(200), latency)
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
@@ -0,0 +1,250 @@
+"""Prueba de carga del pipeline de informes contra Jira y OpenAI simulados.
+
+Arranca los servidores de benchmarks/standins.py (en procesos aparte), apunta
+la configuración del pipeline a ellos (JIRA_SERVER y OPENAI_BASE_URL) y
+ejecuta con run_manifest (o run_manifest_async con --async), como
+`main.py batch`, lotes de informes de Jira a cada nivel de concurrencia.
+Por nivel muestra informes por minuto, latencias p50/p95/p99 de cada etapa,
+memoria máxima del proceso y las peticiones, errores y 429 de cada servidor.
+
+Se ejecuta en un directorio temporal, con la caché de respuestas de OpenAI
+desactivada, para que cada informe haga sus peticiones.
+
+Uso:
+    python -m benchmarks.loadtest [--concurrency 1 4 8] [--reports N] [--async]
+                                  [--issues 1000] [--page-size 100]
+                                  [--jira-latency 0.05] [--jira-error-rate 0] [--jira-rate-limit 0]
+                                  [--openai-latency 2] [--openai-error-rate 0] [--openai-rate-limit 0]
+                                  [--output resultados.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import contextlib
+from datetime import datetime
+
+from benchmarks.standins import Standin
+
+STAGES = ["connect", "fetch", "prepare", "generate", "export", "total"]
+PERCENTILES = [50, 95, 99]
+DEFAULT_CONCURRENCY = [1, 4, 8]
+# Informes por nivel si no se indica --reports: varias rondas por trabajador
+REPORTS_PER_WORKER = 5
+MEMORY_SAMPLE_SECONDS = 0.05
+
+def percentile(values, q):
+    """Percentil q (0-100) con interpolación lineal entre los valores ordenados."""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+class MemorySampler:
+    """Muestrea la memoria residente del proceso en un hilo y guarda el máximo.
+
+    Sin /proc (fuera de Linux) usa el máximo histórico de getrusage, que no
+    se puede reiniciar entre niveles.
+    """
+
+    def __init__(self, interval=MEMORY_SAMPLE_SECONDS):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = _rss_bytes()
+        if rss is None:
+            # ru_maxrss está en KB en Linux y en bytes en macOS
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            rss *= 1 if sys.platform == "darwin" else 1024
+        self.peak = max(self.peak, rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+def configure_environment(jira_url, openai_url):
+    """Apunta la configuración del pipeline a los servidores simulados.
+
+    Debe llamarse antes de importar config y los servicios: leen el entorno
+    al importarse.
+    """
+    os.environ.update({
+        "JIRA_SERVER": jira_url,
+        "JIRA_USERNAME": "carga",
+        "JIRA_API_TOKEN": "carga",
+        "OPENAI_API_KEY": "carga",
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        "OPENAI_CACHE_ENABLED": "0",
+    })
+
+def make_jobs(count, concurrency, projects, formats, use_store):
+    return [{
+        "integration": "jira",
+        "project": projects[i % len(projects)],
+        "formats": formats,
+        "output": f"carga_{concurrency}_{i}",
+        "use_store": use_store,
+    } for i in range(count)]
+
+def run_level(jobs, concurrency, use_async=False):
+    """Ejecuta un lote con concurrency informes en paralelo; devuelve resultados, segundos y memoria."""
+    from services.pipeline import run_manifest
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), MemorySampler() as memory:
+        start = time.perf_counter()
+        if use_async:
+            from services.async_pipeline import run_manifest_async
+            results = run_manifest_async(jobs, concurrency, openai_concurrency=concurrency)
+        else:
+            results = run_manifest(jobs, concurrency)
+        elapsed = time.perf_counter() - start
+    return results, elapsed, memory.peak
+
+def summarize(results, elapsed, peak_memory, concurrency):
+    """Informes por minuto, percentiles por etapa y errores de un nivel."""
+    succeeded = [result for result in results if not result["error"]]
+    errors = {}
+    for result in results:
+        if result["error"]:
+            message = result["error"].split("\n")[0][:200]
+            errors[message] = errors.get(message, 0) + 1
+    stages = {}
+    for stage in STAGES:
+        values = [result["timings"][stage] for result in succeeded if stage in result["timings"]]
+        if values:
+            stages[stage] = {f"p{q}": percentile(values, q) for q in PERCENTILES}
+    return {
+        "concurrency": concurrency,
+        "reports": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "seconds": elapsed,
+        "reports_per_minute": len(succeeded) / elapsed * 60 if elapsed else None,
+        "peak_memory_mb": peak_memory / (1024 * 1024),
+        "stages": stages,
+        "errors": errors,
+    }
+
+def print_level(summary):
+    print(f"\n📈 Concurrencia {summary['concurrency']}: {summary['succeeded']}/{summary['reports']} informes "
+          f"en {summary['seconds']:.1f}s -> {summary['reports_per_minute']:.1f} informes/min, "
+          f"memoria máx. {summary['peak_memory_mb']:.0f} MB")
+    print(f"   {'etapa':<10}" + "".join(f"{'p' + str(q):>10}" for q in PERCENTILES))
+    for stage, values in summary["stages"].items():
+        print(f"   {stage:<10}" + "".join(f"{values['p' + str(q)]:>10.3f}" for q in PERCENTILES))
+    for server, stats in summary["servers"].items():
+        print(f"   {server}: {stats['requests']} peticiones, {stats['errors']} errores simulados, "
+              f"{stats['rate_limited']} limitadas (429), {stats['not_found']} sin ruta")
+    for message, count in summary["errors"].items():
+        print(f"   ❌ {count} x {message}")
+
+def print_scaling(summaries):
+    print("\n📊 Escalado:")
+    print(f"{'concurrencia':>12}{'informes/min':>14}{'p95 total (s)':>15}{'errores':>9}{'memoria (MB)':>14}")
+    for summary in summaries:
+        p95 = summary["stages"].get("total", {}).get("p95")
+        print(f"{summary['concurrency']:>12}{summary['reports_per_minute']:>14.1f}"
+              f"{p95 if p95 is not None else float('nan'):>15.3f}{summary['failed']:>9}"
+              f"{summary['peak_memory_mb']:>14.0f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga con Jira y OpenAI simulados")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=DEFAULT_CONCURRENCY,
+                        help="Informes en paralelo; un nivel por valor")
+    parser.add_argument("--reports", type=int,
+                        help=f"Informes por nivel (por defecto, {REPORTS_PER_WORKER} por trabajador)")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Usa el pipeline asyncio")
+    parser.add_argument("--formats", nargs="+", default=["md"], help="Formatos de salida de cada informe")
+    parser.add_argument("--use-store", action="store_true",
+                        help="Usa el almacén local de Jira (por defecto cada informe descarga el proyecto)")
+    parser.add_argument("--projects", type=int, default=1, help="Proyectos distintos entre los que repartir")
+    parser.add_argument("--issues", type=int, default=1_000, help="Incidencias por proyecto")
+    parser.add_argument("--page-size", type=int, default=100, help="Tamaño máximo de página del Jira simulado")
+    parser.add_argument("--jira-latency", type=float, default=0.05, help="Latencia media de Jira (s)")
+    parser.add_argument("--jira-error-rate", type=float, default=0.0, help="Fracción de errores 500 de Jira")
+    parser.add_argument("--jira-rate-limit", type=float, default=0, help="Peticiones/s admitidas por Jira")
+    parser.add_argument("--openai-latency", type=float, default=2.0, help="Latencia media de OpenAI (s)")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0, help="Fracción de errores 500 de OpenAI")
+    parser.add_argument("--openai-rate-limit", type=float, default=0, help="Peticiones/s admitidas por OpenAI")
+    parser.add_argument("--report-lines", type=int, default=200, help="Líneas del informe devuelto por OpenAI")
+    parser.add_argument("--output", help="Archivo JSON con los resultados")
+    args = parser.parse_args(argv)
+
+    projects = [f"LOAD{i + 1}" for i in range(args.projects)]
+    jira = Standin("jira", latency=args.jira_latency, error_rate=args.jira_error_rate,
+                   rate_limit=args.jira_rate_limit, issues=args.issues, page_size=args.page_size,
+                   projects=projects)
+    openai = Standin("openai", latency=args.openai_latency, error_rate=args.openai_error_rate,
+                     rate_limit=args.openai_rate_limit, report_lines=args.report_lines)
+    output = os.path.abspath(args.output) if args.output else None
+    previous_dir = os.getcwd()
+    summaries = []
+    print(f"🚀 Iniciando Jira y OpenAI simulados ({args.issues} incidencias x {len(projects)} proyectos)...")
+    with jira, openai, tempfile.TemporaryDirectory() as work_dir:
+        configure_environment(jira.url, openai.url)
+        os.chdir(work_dir)
+        try:
+            # Un informe previo, fuera de la medición, para importar módulos y abrir conexiones
+            run_level(make_jobs(1, 0, projects, args.formats, args.use_store), 1, args.use_async)
+            for concurrency in args.concurrency:
+                count = args.reports or concurrency * REPORTS_PER_WORKER
+                print(f"\n⏱️ {count} informes con concurrencia {concurrency}"
+                      f"{' (asyncio)' if args.use_async else ''}...")
+                jira.stats(reset=True)
+                openai.stats(reset=True)
+                jobs = make_jobs(count, concurrency, projects, args.formats, args.use_store)
+                results, elapsed, peak_memory = run_level(jobs, concurrency, args.use_async)
+                summary = summarize(results, elapsed, peak_memory, concurrency)
+                summary["servers"] = {"jira": jira.stats(), "openai": openai.stats()}
+                print_level(summary)
+                summaries.append(summary)
+        finally:
+            os.chdir(previous_dir)
+
+    print_scaling(summaries)
+    if output:
+        document = {
+            "meta": {
+                "created": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "options": vars(args),
+            },
+            "levels": summaries,
+        }
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(document, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Resultados guardados en {output}")
+    return 1 if any(summary["failed"] for summary in summaries) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""Servidores HTTP locales que sustituyen a Jira y a OpenAI en las pruebas de carga.
+
+Implementan solo lo que usa el pipeline: serverInfo, myself, project y
+search de la API REST 2 de Jira, y chat/completions de OpenAI (con y sin
+stream). Cada servidor tiene latencia, tasa de errores (HTTP 500), límite
+de peticiones por segundo (HTTP 429 con Retry-After) y, en Jira, tamaño
+máximo de página configurables. GET /__stats devuelve sus contadores.
+
+Cada servidor se ejecuta en su propio proceso para no competir por el GIL
+con el pipeline que se mide.
+"""
+import json
+import queue
+import time
+import random
+import threading
+import multiprocessing
+import urllib.request
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic import make_raw_issues, make_report_markdown
+
+DEFAULT_OPTIONS = {
+    # Latencia media por petición (segundos), uniforme entre 0.5x y 1.5x
+    "latency": 0.0,
+    # Fracción de peticiones que responden con un error 500
+    "error_rate": 0.0,
+    # Peticiones por segundo admitidas (0 = sin límite); el resto recibe 429
+    "rate_limit": 0,
+    # Jira: incidencias por proyecto y tamaño máximo de página del servidor
+    "issues": 1_000,
+    "page_size": 100,
+    "projects": ["LOAD"],
+    # OpenAI: líneas del informe devuelto
+    "report_lines": 200,
+}
+
+class RateLimiter:
+    """Cubo de tokens: rate peticiones por segundo con ráfagas de hasta rate."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self):
+        if not self.rate:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """Base común: estadísticas, latencia, errores y límite de peticiones."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def _count(self, name):
+        with self.server.stats_lock:
+            self.server.stats[name] += 1
+
+    def _handle(self, method):
+        url = urlsplit(self.path)
+        if url.path == "/__stats":
+            with self.server.stats_lock:
+                stats = dict(self.server.stats)
+                if "reset" in parse_qs(url.query):
+                    self.server.stats.update({name: 0 for name in stats})
+            return self._send_json(200, stats)
+
+        self._count("requests")
+        # El cuerpo se lee siempre para no dejar la conexión a medias si se responde con error
+        self.body = self._read_json() if method == "POST" else {}
+        options = self.server.options
+        if not self.server.limiter.allow():
+            self._count("rate_limited")
+            return self._send_json(429, {"errorMessages": ["Rate limit exceeded"],
+                                         "error": {"message": "Rate limit exceeded"}},
+                                   {"Retry-After": "1"})
+        if options["latency"]:
+            time.sleep(options["latency"] * random.uniform(0.5, 1.5))
+        if options["error_rate"] and random.random() < options["error_rate"]:
+            self._count("errors")
+            return self._send_json(500, {"errorMessages": ["Error simulado"],
+                                         "error": {"message": "Error simulado"}})
+        route = self.routes.get((method, url.path))
+        if route is None:
+            self._count("not_found")
+            return self._send_json(404, {"errorMessages": [f"Ruta no simulada: {method} {url.path}"]})
+        route(self, url)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+class JiraHandler(StandinHandler):
+    """API REST 2 de Jira Server con incidencias sintéticas."""
+
+    def server_info(self, url):
+        self._send_json(200, {
+            "baseUrl": f"http://{self.headers.get('Host')}",
+            "version": "9.12.0",
+            "versionNumbers": [9, 12, 0],
+            "deploymentType": "Server",
+            "buildNumber": 9120000,
+            "serverTitle": "Jira simulado",
+        })
+
+    def myself(self, url):
+        self._send_json(200, {"name": "carga", "displayName": "Usuario de carga", "active": True})
+
+    def projects(self, url):
+        self._send_json(200, [{"id": str(10000 + i), "key": key, "name": f"Proyecto {key}"}
+                              for i, key in enumerate(self.server.issues)])
+
+    def fields(self, url):
+        self._send_json(200, [])
+
+    def search(self, url):
+        query = parse_qs(url.query)
+        params = {key: values[-1] for key, values in query.items()}
+        # jira.JIRA envía fields repetido (fields=a&fields=b); httpx, separado por comas
+        if "fields" in query:
+            params["fields"] = ",".join(query["fields"])
+        if self.command == "POST":
+            params.update(self.body)
+        jql = params.get("jql", "")
+        project = next((key for key in self.server.issues if f"project = {key}" in jql),
+                       next(iter(self.server.issues)))
+        issues = self.server.issues[project]
+        start_at = int(params.get("startAt") or 0)
+        max_results = min(int(params.get("maxResults") or 50), self.server.options["page_size"])
+        fields = params.get("fields") or "*all"
+        if isinstance(fields, str):
+            fields = fields.split(",")
+        page = issues[start_at:start_at + max_results]
+        if "*all" not in fields:
+            # Proyección de campos, como el servidor real
+            page = [{**issue, "fields": {name: issue["fields"][name] for name in fields
+                                         if name in issue["fields"]}} for issue in page]
+        self._send_json(200, {"startAt": start_at, "maxResults": max_results, "total": len(issues),
+                              "issues": page})
+
+    routes = {
+        ("GET", "/rest/api/2/serverInfo"): server_info,
+        ("GET", "/rest/api/2/myself"): myself,
+        ("GET", "/rest/api/2/project"): projects,
+        ("GET", "/rest/api/2/field"): fields,
+        ("GET", "/rest/api/2/search"): search,
+        ("POST", "/rest/api/2/search"): search,
+    }
+
+class OpenAIHandler(StandinHandler):
+    """chat/completions de OpenAI que devuelve un informe Markdown fijo."""
+
+    def completions(self, url):
+        request = self.body
+        report = self.server.report
+        created = int(time.time())
+        prompt_tokens = sum(len(message.get("content") or "") for message in request.get("messages", [])) // 4
+        if not request.get("stream"):
+            return self._send_json(200, {
+                "id": "chatcmpl-simulado",
+                "object": "chat.completion",
+                "created": created,
+                "model": request.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": report},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(report) // 4,
+                          "total_tokens": prompt_tokens + len(report) // 4},
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for i in range(0, len(report), 200):
+            chunk = {"id": "chatcmpl-simulado", "object": "chat.completion.chunk", "created": created,
+                     "model": request.get("model"),
+                     "choices": [{"index": 0, "delta": {"content": report[i:i + 200]}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            chunk = {"id": "chatcmpl-simulado", "object": "chat.completion.chunk", "created": created,
+                     "model": request.get("model"), "choices": [],
+                     "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(report) // 4,
+                               "total_tokens": prompt_tokens + len(report) // 4}}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    routes = {
+        ("POST", "/v1/chat/completions"): completions,
+        ("POST", "/chat/completions"): completions,
+    }
+
+HANDLERS = {"jira": JiraHandler, "openai": OpenAIHandler}
+
+def _serve(kind, options, ready):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), HANDLERS[kind])
+    server.daemon_threads = True
+    server.options = options
+    server.limiter = RateLimiter(options["rate_limit"])
+    server.stats = {"requests": 0, "errors": 0, "rate_limited": 0, "not_found": 0}
+    server.stats_lock = threading.Lock()
+    if kind == "jira":
+        server.issues = {key: make_raw_issues(options["issues"], seed=i, project=key)
+                         for i, key in enumerate(options["projects"])}
+    else:
+        server.report = make_report_markdown(options["report_lines"])
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+class Standin:
+    """Servidor simulado en un proceso aparte; url es su dirección base."""
+
+    def __init__(self, kind, **options):
+        self.kind = kind
+        self.options = {**DEFAULT_OPTIONS, **options}
+        self.process = None
+        self.url = None
+
+    def start(self, timeout=60):
+        context = multiprocessing.get_context("spawn")
+        ready = context.Queue()
+        self.process = context.Process(target=_serve, args=(self.kind, self.options, ready), daemon=True)
+        self.process.start()
+        deadline = time.monotonic() + timeout
+        while self.url is None:
+            try:
+                self.url = f"http://127.0.0.1:{ready.get(timeout=0.5)}"
+            except queue.Empty:
+                if not self.process.is_alive() or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError(f"No se pudo iniciar el servidor simulado de {self.kind}")
+        return self
+
+    def stats(self, reset=False):
+        """Contadores del servidor: requests, errors, rate_limited y not_found."""
+        with urllib.request.urlopen(f"{self.url}/__stats{'?reset=1' if reset else ''}", timeout=10) as response:
+            return json.load(response)
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join(timeout=10)
+            self.process = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,245 @@
+"""Batería de benchmarks del pipeline de informes, sin red.
+
+Genera datos sintéticos (incidencias de Jira, libros de Excel de varias
+hojas, un esquema SQLite e informes Markdown), sustituye Jira y OpenAI por
+los clientes de benchmarks/fakes.py y mide cada etapa: preparación de datos
+de Jira, lectura y perfil de Excel, resumen de la base de datos,
+serialización del prompt en generate_report y cada exportador. Todo se
+ejecuta en un directorio temporal.
+
+Los resultados se guardan en JSON; con --compare se comparan con una
+ejecución anterior y el proceso termina con código 1 si algún caso es más
+lento que la referencia por encima del umbral.
+
+Uso:
+    python -m benchmarks.suite [--quick] [--only jira excel database openai exports]
+                               [--output resultados.json] [--compare referencia.json]
+                               [--threshold 1.25]
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import contextlib
+from datetime import datetime
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from benchmarks.synthetic import make_issues, make_report_markdown, make_workbook, make_database
+from benchmarks.fakes import FakeJiraClient, make_fake_openai
+
+GROUPS = ["jira", "excel", "database", "openai", "exports"]
+SIZES = {
+    "full": {
+        "issues": [1_000, 10_000, 100_000],
+        "sheet_rows": [1_000, 10_000, 50_000],
+        "tables": [50, 200],
+        "report_lines": [1_000, 10_000],
+    },
+    "quick": {
+        "issues": [1_000],
+        "sheet_rows": [1_000],
+        "tables": [20],
+        "report_lines": [500],
+    },
+}
+REPEAT = 3
+SHEETS = 5
+TABLE_ROWS = 200
+EXPORT_FORMATS = ["md", "pdf", "excel", "latex"]
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DEFAULT_THRESHOLD = 1.25
+# Diferencias menores que esto (segundos) se consideran ruido al comparar
+MIN_REGRESSION_SECONDS = 0.01
+
+def measure(results, name, func, repeat=REPEAT, **params):
+    """Ejecuta func repeat veces sin su salida por consola y anota mejor tiempo, mediana y tiempos."""
+    runs = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            runs.append(time.perf_counter() - start)
+    key = name + ("[" + ",".join(f"{k}={v}" for k, v in params.items()) + "]" if params else "")
+    results[key] = {"best": min(runs), "median": statistics.median(runs), "runs": runs, "params": params}
+    print(f"  {key:<55} {min(runs):>9.4f}s  (mediana {statistics.median(runs):.4f}s)")
+
+def bench_jira(results, sizes):
+    from integrations.jira import JiraIntegration
+    for size in sizes["issues"]:
+        issues = make_issues(size)
+        integration = JiraIntegration({"server": None, "username": None, "token": None})
+        measure(results, "jira.generate_report_data", lambda: integration.generate_report_data(issues),
+                repeat=REPEAT if size < 100_000 else 1, n=size)
+
+        integration.client = FakeJiraClient(issues)
+        measure(results, "jira.fetch_data",
+                lambda: integration.fetch_data(project_key="SYN", fetch_all=True, page_size=100),
+                repeat=REPEAT if size < 100_000 else 1, n=size)
+
+def bench_excel(results, sizes):
+    import integrations.excel as excel
+    from integrations.excel_cache import sheet_cache
+    from integrations.excel_profile import profile_workbook
+    os.makedirs(excel.DATA_DIR, exist_ok=True)
+    integration = excel.ExcelIntegration({"catalog_path": os.path.join(".cache", "catalog.sqlite")})
+    # Se mide la lectura del libro, no la caché columnar
+    cache_enabled, sheet_cache.enabled = sheet_cache.enabled, False
+    try:
+        for rows in sizes["sheet_rows"]:
+            file_name = f"bench_{rows}.xlsx"
+            make_workbook(os.path.join(excel.DATA_DIR, file_name), sheets=SHEETS, rows=rows)
+            sheets = [f"Hoja{index + 1}" for index in range(SHEETS)]
+            measure(results, "excel.list_sheets", lambda: integration.list_sheets(file_name), rows=rows)
+            measure(results, "excel.fetch_data", lambda: integration.fetch_data(file_name, sheets=sheets),
+                    rows=rows)
+            measure(results, "excel.profile_workbook",
+                    lambda: profile_workbook(os.path.join(excel.DATA_DIR, file_name), sheets),
+                    repeat=REPEAT if rows < 50_000 else 1, rows=rows)
+        measure(results, "excel.verify_connection", integration.verify_connection,
+                files=len(sizes["sheet_rows"]))
+    finally:
+        sheet_cache.enabled = cache_enabled
+
+def bench_database(results, sizes):
+    from integrations.database import DatabaseIntegration, get_engine
+    from integrations.database_schema import SchemaCache, schema_cache
+    for tables in sizes["tables"]:
+        url = f"sqlite:///{os.path.abspath(f'bench_{tables}.db')}"
+        make_database(get_engine(url), tables=tables, rows=TABLE_ROWS)
+        integration = DatabaseIntegration(url)
+        integration.verify_connection()
+        measure(results, "database.get_schema[cold]",
+                lambda: SchemaCache(tempfile.mkdtemp(dir=".")).load(integration.engine, url), tables=tables)
+        schema_cache.load(integration.engine, url)
+        measure(results, "database.get_schema[warm]", integration.get_schema, tables=tables)
+        measure(results, "database.fetch_database_overview",
+                lambda: integration.fetch_database_overview(progress=None), tables=tables)
+
+def bench_openai(results, sizes):
+    import services.openai as openai_service
+    from integrations.jira import JiraIntegration
+    fake = make_fake_openai()
+    original_client, openai_service.client = openai_service.client, fake
+    try:
+        integration = JiraIntegration({"server": None, "username": None, "token": None})
+        for size in sizes["issues"]:
+            report_data = integration.generate_report_data(make_issues(size))
+            measure(results, "openai.generate_report",
+                    lambda: openai_service.generate_report(report_data, "Jira - SYN", use_cache=False),
+                    repeat=REPEAT if size < 100_000 else 1, n=size)
+    finally:
+        openai_service.client = original_client
+
+def bench_exports(results, sizes):
+    from exports.document import parse_markdown
+    from services.exports import convert_report, convert_report_formats
+    for lines in sizes["report_lines"]:
+        content = make_report_markdown(lines)
+        measure(results, "exports.parse_markdown", lambda: parse_markdown(content), lines=lines)
+        for output_format in EXPORT_FORMATS:
+            measure(results, f"exports.{output_format}",
+                    lambda: convert_report(content, output_format, f"bench_{lines}"),
+                    repeat=REPEAT if lines < 10_000 else 1, lines=lines)
+        measure(results, "exports.convert_report_formats",
+                lambda: convert_report_formats(content, EXPORT_FORMATS, f"bench_all_{lines}"),
+                repeat=1, lines=lines)
+
+BENCHMARKS = {
+    "jira": bench_jira,
+    "excel": bench_excel,
+    "database": bench_database,
+    "openai": bench_openai,
+    "exports": bench_exports,
+}
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run_suite(groups=GROUPS, quick=False):
+    """Ejecuta los grupos indicados en un directorio temporal y devuelve el documento de resultados."""
+    sizes = SIZES["quick" if quick else "full"]
+    results = {}
+    previous_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        try:
+            for group in groups:
+                print(f"\n⏱️ {group}")
+                BENCHMARKS[group](results, sizes)
+        finally:
+            os.chdir(previous_dir)
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "quick": quick,
+            "groups": list(groups),
+        },
+        "results": results,
+    }
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """Compara el mejor tiempo de cada caso con la referencia y devuelve los casos más lentos."""
+    regressions = []
+    print(f"\n📊 Comparación con {baseline['meta'].get('commit') or 'referencia'} "
+          f"({baseline['meta'].get('created')}), umbral {threshold:.2f}x:")
+    for name, result in current["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            continue
+        ratio = result["best"] / reference["best"] if reference["best"] else float("inf")
+        slower = ratio > threshold and result["best"] - reference["best"] > MIN_REGRESSION_SECONDS
+        mark = "❌" if slower else "✅"
+        print(f"  {mark} {name:<55} {reference['best']:>9.4f}s -> {result['best']:>9.4f}s  {ratio:>5.2f}x")
+        if slower:
+            regressions.append({"name": name, "baseline": reference["best"], "current": result["best"],
+                                "ratio": ratio})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del pipeline de informes")
+    parser.add_argument("--quick", action="store_true", help="Tamaños pequeños, para comprobaciones rápidas")
+    parser.add_argument("--only", nargs="+", choices=GROUPS, default=GROUPS, help="Grupos a ejecutar")
+    parser.add_argument("--output", help="Archivo JSON de resultados (por defecto en benchmarks/results/)")
+    parser.add_argument("--compare", help="Resultados de referencia para detectar regresiones")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Cociente de tiempos a partir del cual un caso es una regresión")
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output or os.path.join(
+        RESULTS_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"))
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    document = run_suite(args.only, args.quick)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(document, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Resultados guardados en {output}")
+
+    if baseline is not None:
+        regressions = compare(document, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} casos más lentos que la referencia.")
+            return 1
+        print("\n✅ Sin regresiones.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import random
+import datetime
+from types import SimpleNamespace
+
+STATUSES = ["To Do", "In Progress", "In Review", "Done", "Blocked"]
+TYPES = ["Historia", "Tarea", "Error", "Subtarea", "Épica"]
+PRIORITIES = ["Highest", "High", "Medium", "Low", "Lowest"]
+LABELS = ["backend", "frontend", "infra", "ux", "datos", "seguridad", "deuda", "soporte"]
+
+def make_raw_issues(count, seed=42, assignees=50, epics=200, project="SYN"):
+    """Genera incidencias sintéticas como el JSON de /rest/api/2/search ({"key", "fields"})."""
+    rng = random.Random(seed)
+    issues = []
+    for i in range(count):
+        assignee = rng.randrange(assignees + 1)
+        fields = {
+            "summary": f"Incidencia sintética {i}",
+            "status": {"name": rng.choice(STATUSES)},
+            "assignee": {"displayName": f"Usuario {assignee}"} if assignee else None,
+            "reporter": {"displayName": f"Usuario {rng.randrange(assignees)}"},
+            "created": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T10:00:00.000+0000",
+            "priority": {"name": rng.choice(PRIORITIES)},
+            "description": "Descripción " * rng.randint(0, 40) or None,
+            "issuetype": {"name": rng.choice(TYPES)},
+            "labels": rng.sample(LABELS, rng.randint(0, 3)),
+            "customfield_10020": [f"com.atlassian.greenhopper.service.sprint.Sprint@1[id=1,name=Sprint {rng.randint(1, 30)},state=CLOSED]"]
+                                 if rng.random() < 0.8 else None,
+            "customfield_10014": f"EPIC-{rng.randrange(epics)}" if rng.random() < 0.7 else None,
+        }
+        issues.append({"id": str(10000 + i), "key": f"{project}-{i + 1}", "fields": fields})
+    return issues
+
+def _namespace(value):
+    if isinstance(value, dict):
+        return SimpleNamespace(**{key: _namespace(item) for key, item in value.items()})
+    return value
+
+def make_issues(count, seed=42, assignees=50, epics=200):
+    """Genera incidencias sintéticas con la forma de jira.resources.Issue."""
+    return [SimpleNamespace(key=raw["key"], fields=_namespace(raw["fields"]))
+            for raw in make_raw_issues(count, seed, assignees, epics)]
+
+def make_report_markdown(lines, seed=42):
+    """Genera un informe Markdown de unas lines líneas, como los de cartera de proyectos.
+
+    Alterna secciones con párrafos, listas con negritas y tablas largas de
+    incidencias (la mayor parte de las líneas).
+    """
+    rng = random.Random(seed)
+    out = ["# Informe sintético de cartera", ""]
+    section = 0
+    while len(out) < lines:
+        section += 1
+        out += [f"## Sección {section}", "",
+                "Resumen de la sección con *cursiva* y **negrita**. " * rng.randint(1, 4), ""]
+        out += [f"- **Métrica {n}:** {rng.randint(0, 500)}" for n in range(rng.randint(2, 6))]
+        out += ["", "| Clave | Resumen | Estado | Responsable |", "|---|---|---|---|"]
+        for _ in range(rng.randint(20, 200)):
+            out.append(f"| SYN-{len(out)} | Incidencia sintética {'con texto ' * rng.randint(0, 8)}"
+                       f"| {rng.choice(STATUSES)} | Usuario {rng.randrange(50)} |")
+        out.append("")
+    return "\n".join(out[:lines])
+
+def make_table_markdown(rows, seed=42):
+    """Genera un informe Markdown con una sola tabla de rows incidencias (un único bloque)."""
+    rng = random.Random(seed)
+    out = ["# Informe sintético de incidencias", "", "Listado completo de incidencias del proyecto.", "",
+           "| Clave | Resumen | Estado | Responsable |", "|---|---|---|---|"]
+    for i in range(rows):
+        out.append(f"| SYN-{i + 1} | Incidencia sintética {'con texto ' * rng.randint(0, 8)}"
+                   f"| {rng.choice(STATUSES)} | Usuario {rng.randrange(50)} |")
+    return "\n".join(out)
+
+def make_workbook(path, sheets=5, rows=10_000, seed=42):
+    """Escribe un libro .xlsx sintético de varias hojas con columnas numéricas, de fecha y de texto.
+
+    Usa el modo write_only de openpyxl, por lo que la memoria no depende de rows.
+    """
+    from openpyxl import Workbook
+    rng = random.Random(seed)
+    workbook = Workbook(write_only=True)
+    start = datetime.date(2023, 1, 1)
+    for index in range(sheets):
+        sheet = workbook.create_sheet(f"Hoja{index + 1}")
+        sheet.append(["id", "fecha", "estado", "responsable", "importe", "unidades", "comentario"])
+        for i in range(rows):
+            sheet.append([
+                i + 1,
+                start + datetime.timedelta(days=rng.randrange(730)),
+                rng.choice(STATUSES),
+                f"Usuario {rng.randrange(50)}",
+                round(rng.lognormvariate(5, 1), 2),
+                rng.randint(1, 100) if rng.random() > 0.05 else None,
+                "Comentario " * rng.randint(0, 5) or None,
+            ])
+    workbook.save(path)
+    return path
+
+def make_database(engine, tables=50, rows=1_000, seed=42):
+    """Crea un esquema sintético con SQLAlchemy Core (válido en SQLite y PostgreSQL).
+
+    Una tabla de clientes y tables tablas de pedidos con clave foránea a
+    ella, cada una con rows filas.
+    """
+    import sqlalchemy
+    rng = random.Random(seed)
+    metadata = sqlalchemy.MetaData()
+    customers = sqlalchemy.Table(
+        "customers", metadata,
+        sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+        sqlalchemy.Column("name", sqlalchemy.String(100), nullable=False),
+        sqlalchemy.Column("country", sqlalchemy.String(2)),
+        sqlalchemy.Column("created_at", sqlalchemy.DateTime),
+    )
+    orders = [
+        sqlalchemy.Table(
+            f"orders_{index:03d}", metadata,
+            sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+            sqlalchemy.Column("customer_id", sqlalchemy.Integer, sqlalchemy.ForeignKey("customers.id")),
+            sqlalchemy.Column("status", sqlalchemy.String(20)),
+            sqlalchemy.Column("total", sqlalchemy.Numeric(12, 2)),
+            sqlalchemy.Column("created_at", sqlalchemy.DateTime),
+        )
+        for index in range(tables)
+    ]
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+    start = datetime.datetime(2023, 1, 1)
+    customer_count = max(rows // 10, 1)
+    with engine.begin() as conn:
+        conn.execute(customers.insert(), [
+            {"id": i + 1, "name": f"Cliente {i + 1}", "country": rng.choice(["ES", "MX", "AR", "CO"]),
+             "created_at": start + datetime.timedelta(days=rng.randrange(730))}
+            for i in range(customer_count)
+        ])
+        for table in orders:
+            conn.execute(table.insert(), [
+                {"id": i + 1, "customer_id": rng.randint(1, customer_count), "status": rng.choice(STATUSES),
+                 "total": round(rng.lognormvariate(4, 1), 2),
+                 "created_at": start + datetime.timedelta(minutes=rng.randrange(1_000_000))}
+                for i in range(rows)
+            ])
+    return [customers.name] + [table.name for table in orders]
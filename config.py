@@ -12,17 +12,61 @@ VERSION = "1.0.0"
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = "gpt-4o"  # Versión con mayor capacidad de tokens
 OPENAI_TEMPERATURE = 0.4
+# Presupuesto de tokens para los datos del prompt (deja margen para la respuesta)
+OPENAI_PROMPT_TOKEN_BUDGET = int(os.getenv("OPENAI_PROMPT_TOKEN_BUDGET", "60000"))
+# Generación por fragmentos (map-reduce) para datos que no caben en el presupuesto
+OPENAI_CHUNK_TOKENS = int(os.getenv("OPENAI_CHUNK_TOKENS", "20000"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "4"))
+# Caché en disco de respuestas del modelo
+OPENAI_CACHE_CONFIG = {
+    "enabled": os.getenv("OPENAI_CACHE_ENABLED", "1") == "1",
+    "dir": os.getenv("OPENAI_CACHE_DIR", ".cache/llm"),
+    "ttl_seconds": int(os.getenv("OPENAI_CACHE_TTL", str(7 * 24 * 3600))),
+    "max_entries": int(os.getenv("OPENAI_CACHE_MAX_ENTRIES", "500")),
+    "max_bytes": int(os.getenv("OPENAI_CACHE_MAX_BYTES", str(200 * 1024 * 1024))),
+}
+
+# Trazas por etapa (JSON lines), métricas para Prometheus y perfiles de cProfile
+TRACING_CONFIG = {
+    "enabled": os.getenv("TRACING_ENABLED", "1") == "1",
+    "trace_path": os.getenv("TRACE_PATH", ".cache/traces.jsonl"),
+    # Tamaño a partir del que el archivo de trazas pasa a TRACE_PATH.1 (se conserva una copia)
+    "trace_max_bytes": int(os.getenv("TRACE_MAX_BYTES", str(20 * 1024 * 1024))),
+    "metrics_path": os.getenv("METRICS_TEXTFILE", ".cache/metrics.prom"),
+    # Carpeta de los volcados de cProfile por etapa (desactivado si no se indica)
+    "profile_dir": os.getenv("PROFILE_DIR") or None,
+}
 
 # Configuraciones de Jira
 JIRA_CONFIG = {
     "server": os.getenv("JIRA_SERVER"),
     "username": os.getenv("JIRA_USERNAME"),
     "token": os.getenv("JIRA_API_TOKEN"),
+    "store_path": os.getenv("JIRA_STORE_PATH", ".cache/jira_store.sqlite"),
+    # Medir el ahorro de la proyección de campos (descarga una muestra extra con todos los campos)
+    "report_savings": os.getenv("JIRA_REPORT_SAVINGS", "0") == "1",
+}
+
+# Tipos de informe de Jira: enfoque -> nombre y parámetros de consulta
+JIRA_REPORT_OPTIONS = {
+    "general": {"name": "Incidencias actuales (todas)", "params": {}},
+    "sprint_activo": {"name": "Sprint activo", "params": {"sprint_state": "active"}},
+    "sprints_finalizados": {"name": "Sprints finalizados", "params": {"sprint_state": "closed"}},
+    "etiquetas": {"name": "Análisis por etiquetas", "params": {"include_labels": True}},
+    "jerarquico": {"name": "Análisis jerárquico", "params": {"include_epics": True}}
 }
 
 # Configuración de Excel
 EXCEL_CONFIG = {
-    "data_dir": "data"  
+    "data_dir": "data",
+    # Perfil estadístico de las hojas completas (tipos, nulos, rangos, histogramas...)
+    "profile": True,
+    # Copia columnar (Parquet) de cada hoja leída, invalidada al cambiar el archivo
+    "cache_enabled": os.getenv("EXCEL_CACHE_ENABLED", "1") == "1",
+    "cache_dir": os.getenv("EXCEL_CACHE_DIR", ".cache/excel"),
+    "cache_max_bytes": int(os.getenv("EXCEL_CACHE_MAX_BYTES", str(1024 * 1024 * 1024))),
+    # Catálogo de los libros de la carpeta de datos (recursivo, incremental)
+    "catalog_path": os.getenv("EXCEL_CATALOG_PATH", ".cache/excel_catalog.sqlite"),
 }
 
 # Lista de integraciones disponibles
@@ -0,0 +1,257 @@
+import re
+
+# Estilos de los fragmentos de texto: "" normal, "b" negrita, "i" cursiva, "bi" ambas
+PLAIN, BOLD, ITALIC, BOLD_ITALIC = "", "b", "i", "bi"
+
+_HEADING = re.compile(r'(#{1,6})\s+(.*?)\s*#*$')
+_LIST_ITEM = re.compile(r'([-*+]|\d{1,9}[.)])\s+(.*)')
+# Un número de este valor o mayor ("2024. texto") no abre una lista numerada
+ORDERED_LIST_MAX_START = 1000
+_RULE = re.compile(r'(?:-{3,}|\*{3,}|_{3,})$')
+_TABLE_SEPARATOR = re.compile(r'\|?\s*:?-+:?\s*(?:\|\s*:?-+:?\s*)*\|?$')
+_INLINE_MARKERS = re.compile(r'(\*\*|\*)')
+
+class Heading:
+    __slots__ = ("level", "spans")
+
+    def __init__(self, level, spans):
+        self.level = level
+        self.spans = spans
+
+class Paragraph:
+    """Párrafo; conserva los saltos de línea del original como "\\n" en el texto."""
+    __slots__ = ("spans",)
+
+    def __init__(self, spans):
+        self.spans = spans
+
+class ListBlock:
+    """Lista de elementos (profundidad, fragmentos); ordered indica lista numerada."""
+    __slots__ = ("ordered", "items")
+
+    def __init__(self, ordered, items):
+        self.ordered = ordered
+        self.items = items
+
+class Table:
+    """Tabla con una fila de cabecera y filas de celdas, cada celda una lista de fragmentos."""
+    __slots__ = ("header", "rows")
+
+    def __init__(self, header, rows):
+        self.header = header
+        self.rows = rows
+
+class CodeBlock:
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+class Rule:
+    __slots__ = ()
+
+class Document:
+    """Árbol de un informe Markdown: título y lista plana de bloques.
+
+    Los fragmentos de texto (spans) son tuplas (texto, estilo) con los
+    estilos PLAIN, BOLD, ITALIC o BOLD_ITALIC. source conserva el Markdown
+    original, que es lo que se guarda como .md.
+    """
+
+    def __init__(self, blocks, source=None):
+        self.blocks = blocks
+        self.source = source
+        self.title = self._find_title()
+
+    def _find_title(self):
+        headings = [block for block in self.blocks if isinstance(block, Heading)]
+        if not headings:
+            return "Informe"
+        top = min(headings, key=lambda heading: heading.level)
+        return plain_text(top.spans)
+
+    def sections(self):
+        """Agrupa los bloques por encabezado: lista de (encabezado o None, bloques)."""
+        sections = [(None, [])]
+        for block in self.blocks:
+            if isinstance(block, Heading):
+                sections.append((block, []))
+            else:
+                sections[-1][1].append(block)
+        if not sections[0][1]:
+            sections.pop(0)
+        return sections
+
+    def render_units(self):
+        """Tamaño en unidades de renderizado: filas de tabla, elementos de lista, líneas de código o bloques."""
+        units = 0
+        for block in self.blocks:
+            if isinstance(block, Table):
+                units += len(block.rows) + 1
+            elif isinstance(block, ListBlock):
+                units += len(block.items)
+            elif isinstance(block, CodeBlock):
+                units += block.text.count("\n") + 1
+            else:
+                units += 1
+        return units
+
+def plain_text(spans):
+    """Texto de una lista de fragmentos, sin formato."""
+    return "".join(text for text, _ in spans)
+
+def parse_inline(text):
+    """Divide una línea en fragmentos (texto, estilo) según ** y *.
+
+    Recorre los marcadores una sola vez. Un marcador sin pareja (número
+    impar de apariciones) se conserva como texto literal.
+    """
+    parts = _INLINE_MARKERS.split(text)
+    if len(parts) == 1:
+        return [(text, PLAIN)] if text else []
+
+    literal = set()
+    for marker in ("**", "*"):
+        positions = [i for i in range(1, len(parts), 2) if parts[i] == marker]
+        if len(positions) % 2:
+            literal.add(positions[-1])
+
+    spans = []
+    bold = italic = False
+    for i, part in enumerate(parts):
+        if i % 2 and i not in literal:
+            if part == "**":
+                bold = not bold
+            else:
+                italic = not italic
+            continue
+        if not part:
+            continue
+        style = (BOLD if bold else "") + (ITALIC if italic else "")
+        if spans and spans[-1][1] == style:
+            spans[-1] = (spans[-1][0] + part, style)
+        else:
+            spans.append((part, style))
+    return spans
+
+def _split_row(line):
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|"):
+        line = line[:-1]
+    return [parse_inline(cell.strip()) for cell in line.split("|")]
+
+def _is_table_start(line, next_line):
+    """Indica si line es la cabecera de una tabla sin | inicial: la sigue un separador con | y las mismas columnas."""
+    next_line = next_line.strip()
+    if "|" not in line or "|" not in next_line or not _TABLE_SEPARATOR.match(next_line):
+        return False
+    return len(_split_row(line)) == len(_split_row(next_line))
+
+def _opens_ordered_list(marker, in_paragraph):
+    """Indica si un marcador numerado puede abrir una lista nueva.
+
+    Como en CommonMark, dentro de un párrafo solo la abre "1."; además los
+    números grandes, como un año al principio de una frase, no la abren.
+    """
+    number = int(marker[:-1])
+    return number < ORDERED_LIST_MAX_START and (not in_paragraph or number == 1)
+
+def parse_markdown(text):
+    """Analiza el Markdown del informe en una sola pasada y devuelve un Document.
+
+    Reconoce encabezados, listas (con viñetas o numeradas, con su
+    profundidad), tablas (con o sin | al principio de las filas), bloques
+    de código, separadores, citas y párrafos, y dentro de ellos negrita y
+    cursiva.
+    """
+    blocks = []
+    paragraph = []
+    list_block = None
+    table = None
+    code = None
+
+    def close_open_blocks():
+        nonlocal list_block, table
+        if paragraph:
+            blocks.append(Paragraph(parse_inline("\n".join(paragraph))))
+            paragraph.clear()
+        list_block = None
+        table = None
+
+    lines = text.split("\n")
+    for index, raw_line in enumerate(lines):
+        line = raw_line.strip()
+
+        if code is not None:
+            if line.startswith("```"):
+                blocks.append(CodeBlock("\n".join(code)))
+                code = None
+            else:
+                code.append(raw_line.rstrip())
+            continue
+        if line.startswith("```"):
+            close_open_blocks()
+            code = []
+            continue
+        if not line:
+            close_open_blocks()
+            continue
+
+        if line.startswith("#"):
+            match = _HEADING.match(line)
+            if match:
+                close_open_blocks()
+                blocks.append(Heading(len(match.group(1)), parse_inline(match.group(2))))
+                continue
+
+        if _RULE.match(line):
+            close_open_blocks()
+            blocks.append(Rule())
+            continue
+
+        if (line.startswith("|") or (table is not None and "|" in line)
+                or (table is None and index + 1 < len(lines) and _is_table_start(line, lines[index + 1]))):
+            if table is None:
+                close_open_blocks()
+                table = Table(_split_row(line), [])
+                blocks.append(table)
+            elif not table.rows and _TABLE_SEPARATOR.match(line):
+                pass
+            else:
+                table.rows.append(_split_row(line))
+            continue
+
+        match = _LIST_ITEM.match(line)
+        depth = (len(raw_line) - len(raw_line.lstrip())) // 2
+        ordered = bool(match) and match.group(1)[0].isdigit()
+        # Un número que abriría una lista numerada nueva puede ser texto ("2024. texto")
+        if ordered and (list_block is None or (depth == 0 and not list_block.ordered)):
+            if not _opens_ordered_list(match.group(1), bool(paragraph)):
+                match = None
+        if match:
+            # Los subelementos se mantienen en la lista de su elemento padre
+            if list_block is None or (depth == 0 and list_block.ordered != ordered):
+                close_open_blocks()
+                list_block = ListBlock(ordered, [])
+                blocks.append(list_block)
+            list_block.items.append((depth, parse_inline(match.group(2))))
+            continue
+
+        if line.startswith(">"):
+            line = line.lstrip(">").strip()
+        if list_block is not None or table is not None:
+            close_open_blocks()
+        paragraph.append(line)
+
+    if code is not None:
+        blocks.append(CodeBlock("\n".join(code)))
+    close_open_blocks()
+    return Document(blocks, text)
+
+def as_document(content):
+    """Devuelve content como Document, analizándolo si es texto."""
+    if isinstance(content, Document):
+        return content
+    return parse_markdown(content or "")
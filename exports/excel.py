@@ -1,5 +1,104 @@
 import os
 import re
+from exports.document import Heading, Paragraph, ListBlock, Table, plain_text, as_document
+
+# Límites de Excel para los nombres de hoja
+SHEET_NAME_MAX = 31
+# Crear miles de hojas es muy lento; a partir de aquí el resto va a una hoja común
+MAX_SHEETS = 50
+OVERFLOW_SHEET = "Más datos"
+_INVALID_SHEET_CHARS = re.compile(r'[\[\]:*?/\\]')
+
+def sheet_name(title, used):
+    """Nombre de hoja válido y único (sin caracteres prohibidos, máximo 31)."""
+    name = _INVALID_SHEET_CHARS.sub("-", title).strip("' ")[:SHEET_NAME_MAX] or "Hoja"
+    candidate, n = name, 2
+    while candidate.lower() in used:
+        suffix = f" ({n})"
+        candidate = name[:SHEET_NAME_MAX - len(suffix)] + suffix
+        n += 1
+    used.add(candidate.lower())
+    return candidate
+
+def _key_value(spans):
+    text = plain_text(spans)
+    if ":" not in text:
+        return None
+    key, value = text.split(":", 1)
+    return key.strip().strip("-").strip(), value.strip()
+
+def build_sheets(document):
+    """Hojas del libro como {nombre: (columnas, filas)}.
+
+    Cada sección con datos "clave: valor" en párrafos o listas genera una
+    hoja de Dato/Valor, y cada tabla su propia hoja con sus columnas.
+    """
+    sheets = {}
+    used = set()
+    for i, (heading, blocks) in enumerate(document.sections(), 1):
+        title = plain_text(heading.spans) if heading else "Introducción"
+        data_dict = {}
+        tables = []
+        for block in blocks:
+            if isinstance(block, Paragraph):
+                pairs = [_key_value([(line, "")]) for line in plain_text(block.spans).split("\n")]
+            elif isinstance(block, ListBlock):
+                pairs = [_key_value(spans) for _, spans in block.items]
+            elif isinstance(block, Table):
+                tables.append(block)
+                continue
+            else:
+                continue
+            data_dict.update(pair for pair in pairs if pair)
+
+        if data_dict:
+            sheets[sheet_name(f"Sección {i} - {title[:20]}", used)] = (
+                ['Dato', 'Valor'], list(data_dict.items())
+            )
+        for n, table in enumerate(tables, 1):
+            columns = [plain_text(cell) for cell in table.header]
+            rows = [[plain_text(cell) for cell in row][:len(columns)] for row in table.rows]
+            sheets[sheet_name(f"Tabla {i}.{n} - {title[:18]}", used)] = (columns, rows)
+
+    if len(sheets) > MAX_SHEETS:
+        sheets = _fold_overflow(sheets)
+
+    # Si no hay datos estructurados, una hoja simple con el texto de cada bloque
+    if not sheets:
+        rows = [[_block_text(block)] for block in document.blocks]
+        sheets["Informe Completo"] = (["Contenido"], [row for row in rows if row[0]])
+    return sheets
+
+def _fold_overflow(sheets):
+    """Conserva MAX_SHEETS - 1 hojas y reúne las demás en OVERFLOW_SHEET."""
+    names = list(sheets)
+    kept = {name: sheets[name] for name in names[:MAX_SHEETS - 1]}
+    rows = []
+    for name in names[MAX_SHEETS - 1:]:
+        _, sheet_rows = sheets[name]
+        for row in sheet_rows:
+            row = [str(value) for value in row]
+            rows.append([name, row[0] if row else "", " | ".join(row[1:])])
+    kept[OVERFLOW_SHEET] = (["Hoja", "Dato", "Valor"], rows)
+    return kept
+
+def _block_text(block):
+    if isinstance(block, (Heading, Paragraph)):
+        return plain_text(block.spans)
+    if isinstance(block, ListBlock):
+        return "\n".join(plain_text(spans) for _, spans in block.items)
+    if isinstance(block, Table):
+        return "\n".join(" | ".join(plain_text(cell) for cell in row) for row in [block.header] + block.rows)
+    return getattr(block, "text", "")
+
+def render_excel(document, output_file):
+    """Escribe las hojas del documento en un libro de Excel."""
+    import pandas as pd
+
+    with pd.ExcelWriter(output_file) as writer:
+        for name, (columns, rows) in build_sheets(document).items():
+            pd.DataFrame(rows, columns=columns).to_excel(writer, sheet_name=name, index=False)
+    return output_file
 
 def save_excel_report(content, filename_base):
     """Guarda el informe en formato Excel."""
@@ -12,29 +111,4 @@ def save_excel_report(content, filename_base):
     reports_dir = "reports"
     if not os.path.exists(reports_dir):
         os.makedirs(reports_dir)
-
-    # Extraer secciones del informe
-    sections = re.split(r'#{1,3}\s+', content)[1:]
-    section_titles = re.findall(r'#{1,3}\s+(.*)', content)
-
-    sheets = {}
-    for i, (title, section) in enumerate(zip(section_titles, sections)):
-        data_dict = {}
-        for line in section.split("\n"):
-            if ":" in line:
-                parts = line.split(":", 1)
-                if len(parts) == 2:
-                    key = parts[0].strip().strip("-").strip()
-                    value = parts[1].strip()
-                    data_dict[key] = value
-        if data_dict:
-            sheets[f"Sección {i+1}: {title[:20]}"] = pd.DataFrame(list(data_dict.items()), columns=['Dato', 'Valor'])
-
-    if not sheets:
-        sheets["Informe Completo"] = pd.DataFrame([content], columns=["Contenido"])
-
-    output_file = f"{reports_dir}/{filename_base}.xlsx"
-    with pd.ExcelWriter(output_file) as writer:
-        for sheet_name, df in sheets.items():
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
-    return output_file
\ No newline at end of file
+    return render_excel(as_document(content), f"{reports_dir}/{filename_base}.xlsx")
@@ -1,13 +1,29 @@
 import os
 import re
+from exports.document import (Heading, Paragraph, ListBlock, Table, CodeBlock,
+                              BOLD, ITALIC, plain_text, as_document)
 
-def save_latex_report(content, filename_base):
-    """Guarda el informe en formato LaTeX."""
-    reports_dir = "reports"
-    if not os.path.exists(reports_dir):
-        os.makedirs(reports_dir)
+BEAMER_TEMPLATE = r"""
+\documentclass{beamer}
+\usetheme{Madrid}
+\usepackage[utf8]{inputenc}
+\usepackage{graphicx}
+\usepackage{booktabs}
+\usepackage{hyperref}
+\title{%s}
+\author{Report Generator AI}
+\date{\today}
+
+\begin{document}
+
+\frame{\titlepage}
 
-    latex_template = r"""
+%s
+
+\end{document}
+"""
+
+ARTICLE_TEMPLATE = r"""
 \documentclass{article}
 \usepackage[utf8]{inputenc}
 \usepackage{graphicx}
@@ -29,20 +45,129 @@ def save_latex_report(content, filename_base):
 \end{document}
 """
 
-    def md_to_latex(text):
-        text = re.sub(r'# (.*)', r'\\section{\1}', text)
-        text = re.sub(r'## (.*)', r'\\subsection{\1}', text)
-        text = re.sub(r'### (.*)', r'\\subsubsection{\1}', text)
-        text = re.sub(r'\*\*(.*?)\*\*', r'\\textbf{\1}', text)
-        text = re.sub(r'\*(.*?)\*', r'\\textit{\1}', text)
-        return text
+_LATEX_SPECIAL = {
+    '&': r'\&',
+    '%': r'\%',
+    '$': r'\$',
+    '#': r'\#',
+    '_': r'\_',
+    '{': r'\{',
+    '}': r'\}',
+    '~': r'\textasciitilde{}',
+    '^': r'\textasciicircum{}',
+    '\\': r'\textbackslash{}',
+}
+_LATEX_SPECIAL_RE = re.compile("|".join(re.escape(char) for char in _LATEX_SPECIAL))
+
+ARTICLE_SECTIONS = {1: "section", 2: "subsection", 3: "subsubsection"}
+
+def escape_latex(text):
+    """Escapa los caracteres especiales de LaTeX en una sola pasada."""
+    return _LATEX_SPECIAL_RE.sub(lambda match: _LATEX_SPECIAL[match.group()], text)
+
+def render_spans(spans):
+    """Fragmentos de texto a LaTeX con \\textbf y \\textit."""
+    parts = []
+    for text, style in spans:
+        text = escape_latex(text).replace("\n", "\\\\\n")
+        if ITALIC in style:
+            text = "\\textit{%s}" % text
+        if BOLD in style:
+            text = "\\textbf{%s}" % text
+        parts.append(text)
+    return "".join(parts)
+
+def render_table(table):
+    columns = max([len(table.header)] + [len(row) for row in table.rows])
+    latex = ["\\begin{tabular}{%s}" % ("l" * columns)]
+    latex.append("\\toprule")
+    latex.append(" & ".join(render_spans(cell) for cell in table.header) + " \\\\")
+    latex.append("\\midrule")
+    for row in table.rows:
+        latex.append(" & ".join(render_spans(cell) for cell in row) + " \\\\")
+    latex.append("\\bottomrule")
+    latex.append("\\end{tabular}")
+    return "\n".join(latex)
+
+def render_list(block):
+    """Lista a itemize/enumerate, anidando un entorno itemize por nivel de profundidad."""
+    environments = ["enumerate" if block.ordered else "itemize"]
+    latex = ["\\begin{%s}" % environments[0]]
+    for depth, spans in block.items:
+        while len(environments) - 1 < depth:
+            environments.append("itemize")
+            latex.append("\\begin{itemize}")
+        while len(environments) - 1 > depth:
+            latex.append("\\end{%s}" % environments.pop())
+        latex.append("\\item %s" % render_spans(spans))
+    while environments:
+        latex.append("\\end{%s}" % environments.pop())
+    return "\n".join(latex)
+
+def render_block(block):
+    """Bloque de contenido (no encabezado) a LaTeX; None si no se representa."""
+    if isinstance(block, Paragraph):
+        return render_spans(block.spans) + "\\\\"
+    if isinstance(block, ListBlock):
+        return render_list(block)
+    if isinstance(block, Table):
+        return render_table(block)
+    if isinstance(block, CodeBlock):
+        return "\n".join("\\texttt{%s}\\\\" % escape_latex(line) for line in block.text.split("\n"))
+    return None
+
+def render_beamer(document):
+    """Documento a presentación beamer: cada encabezado de nivel 1 abre una diapositiva."""
+    slides = []
+    slide_title = None
+    slide_content = []
+
+    def flush_slide():
+        if slide_title or slide_content:
+            slides.append("\\begin{frame}{%s}\n%s\n\\end{frame}" % (
+                slide_title or "", "\n".join(slide_content)
+            ))
+
+    for block in document.blocks:
+        if isinstance(block, Heading):
+            text = render_spans(block.spans)
+            if block.level == 1:
+                flush_slide()
+                slide_title, slide_content = escape_latex(plain_text(block.spans)), []
+            elif block.level == 2:
+                slide_content.append("\\textbf{%s}\\\\[1ex]" % text)
+            else:
+                slide_content.append("\\textbf{\\small %s}\\\\[0.5ex]" % text)
+            continue
+        latex = render_block(block)
+        if latex is not None:
+            slide_content.append(latex)
+    flush_slide()
+
+    return BEAMER_TEMPLATE % (escape_latex(document.title), "\n".join(slides))
+
+def render_article(document):
+    """Documento a artículo LaTeX con secciones."""
+    body = []
+    for block in document.blocks:
+        if isinstance(block, Heading):
+            command = ARTICLE_SECTIONS.get(block.level, "paragraph")
+            body.append("\\%s{%s}" % (command, render_spans(block.spans)))
+            continue
+        latex = render_block(block)
+        if latex is not None:
+            body.append(latex)
+    return ARTICLE_TEMPLATE % (escape_latex(document.title), "\n\n".join(body))
+
+def save_latex_report(content, filename_base):
+    """Guarda el informe en formato LaTeX."""
+    reports_dir = "reports"
+    if not os.path.exists(reports_dir):
+        os.makedirs(reports_dir)
 
-    lines = content.split('\n')
-    title = lines[0].replace('#', '').strip() if lines else "Informe"
-    latex_content = md_to_latex(content)
-    latex_doc = latex_template % (title, latex_content)
+    latex_doc = render_article(as_document(content))
 
     output_file = f"{reports_dir}/{filename_base}.tex"
     with open(output_file, 'w', encoding='utf-8') as f:
         f.write(latex_doc)
-    return output_file
\ No newline at end of file
+    return output_file
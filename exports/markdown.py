@@ -1,4 +1,49 @@
 import os
+from exports.document import (Heading, Paragraph, ListBlock, Table, CodeBlock, Rule,
+                              BOLD, ITALIC)
+
+_MARKERS = {"": "", BOLD: "**", ITALIC: "*", BOLD + ITALIC: "***"}
+
+def render_spans(spans):
+    """Fragmentos de texto de vuelta a Markdown."""
+    return "".join(f"{_MARKERS[style]}{text}{_MARKERS[style]}" for text, style in spans)
+
+def _render_row(cells):
+    return "| " + " | ".join(render_spans(cell) for cell in cells) + " |"
+
+def render_markdown(document):
+    """Serializa un Document a Markdown normalizado."""
+    parts = []
+    for block in document.blocks:
+        if isinstance(block, Heading):
+            parts.append("#" * block.level + " " + render_spans(block.spans))
+        elif isinstance(block, Paragraph):
+            parts.append(render_spans(block.spans))
+        elif isinstance(block, ListBlock):
+            lines, number = [], 0
+            for depth, spans in block.items:
+                if depth == 0:
+                    number += 1
+                marker = f"{number}. " if block.ordered and depth == 0 else "- "
+                lines.append("  " * depth + marker + render_spans(spans))
+            parts.append("\n".join(lines))
+        elif isinstance(block, Table):
+            lines = [_render_row(block.header), "|" + "---|" * len(block.header)]
+            lines.extend(_render_row(row) for row in block.rows)
+            parts.append("\n".join(lines))
+        elif isinstance(block, CodeBlock):
+            parts.append(f"```\n{block.text}\n```")
+        elif isinstance(block, Rule):
+            parts.append("---")
+    return "\n\n".join(parts) + "\n"
+
+def markdown_text(content):
+    """Markdown a guardar: el texto original tal cual; solo se serializa un Document sin origen."""
+    if isinstance(content, str):
+        return content
+    if content.source is not None:
+        return content.source
+    return render_markdown(content)
 
 def save_markdown_report(content, filename_base):
     """Guarda el informe en formato Markdown."""
@@ -7,5 +52,5 @@ def save_markdown_report(content, filename_base):
         os.makedirs(reports_dir)
     output_file = f"{reports_dir}/{filename_base}.md"
     with open(output_file, "w", encoding="utf-8") as f:
-        f.write(content)
-    return output_file
\ No newline at end of file
+        f.write(markdown_text(content))
+    return output_file
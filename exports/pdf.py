@@ -1,101 +1,154 @@
 import os
 from fpdf import FPDF
-import re
+from exports.document import (Heading, Paragraph, ListBlock, Table, CodeBlock, Rule,
+                              BOLD, ITALIC, plain_text, as_document)
+
+# Estilos de página: "basico" es el formato de siempre del exportador (Arial,
+# márgenes de 1 cm, sin pie de página) y "apa" el de normas APA básicas (Times,
+# márgenes de una pulgada y número de página). Medidas en mm; headings: nivel ->
+# (tamaño, alto de línea)
+PDF_STYLES = {
+    "basico": {"font": "Arial", "margin": 10, "bottom_margin": 20, "line_height": 5,
+               "title_size": 16, "headings": {1: (15, 10), 2: (14, 10), 3: (14, 10)},
+               "center_h1": False, "page_numbers": False},
+    "apa": {"font": "Times", "margin": 25.4, "bottom_margin": 25.4, "line_height": 7,
+            "title_size": 12, "headings": {1: (16, 10), 2: (14, 8), 3: (12, 7)},
+            "center_h1": True, "page_numbers": True},
+}
+# A partir de estas unidades (filas de tabla, elementos de lista, líneas de código...) se usa
+# el escritor por páginas (exports/pdf_stream.py): la memoria de fpdf crece con el documento
+STREAMING_MIN_UNITS = 10_000
+
+# Las fuentes estándar de PDF solo cubren Latin-1
+_LATIN1_REPLACEMENTS = str.maketrans({
+    "‘": "'", "’": "'", "“": '"', "”": '"',
+    "–": "-", "—": "-", "•": "-", "…": "...", "€": "EUR",
+})
+
+def to_latin1(text):
+    """Adapta el texto a Latin-1, sustituyendo lo que no se pueda representar."""
+    return text.translate(_LATIN1_REPLACEMENTS).encode("latin-1", "replace").decode("latin-1")
+
+def font_style(style):
+    return ("B" if BOLD in style else "") + ("I" if ITALIC in style else "")
+
+class ReportPDF(FPDF):
+    """FPDF con el título en la primera página y el estilo de PDF_STYLES."""
+
+    def __init__(self, style="basico", title=""):
+        super().__init__()
+        self.layout = PDF_STYLES[style]
+        self.report_title = title
+        margin = self.layout["margin"]
+        self.set_margins(margin, margin, margin)
 
-class APA_PDF(FPDF):
     def header(self):
-        self.set_margins(25.4, 25.4, 25.4)
-        self.set_font("Times", "B", 12)
-        if hasattr(self, 'apa_title') and self.page_no() == 1:
-            self.cell(0, 10, self.apa_title, ln=True, align="C")
+        if self.report_title and self.page_no() == 1:
+            self.set_font(self.layout["font"], "B", self.layout["title_size"])
+            self.cell(0, 10, self.report_title, ln=True, align="C")
             self.ln(10)
 
     def footer(self):
-        self.set_y(-15)
-        self.set_font("Times", "I", 10)
-        self.cell(0, 10, f'Página {self.page_no()}', align='C')
-
-def handle_title(pdf, line, i):
-    title = line.replace("# ", "").strip()
-    pdf.apa_title = title
-    if i != 0:
-        pdf.set_font("Times", "B", 16)
-        pdf.cell(0, 10, title, ln=True, align="C")
-        pdf.ln(5)
-    pdf.set_font("Times", size=12)
-
-def handle_subtitle(pdf, line, *_):
-    subtitle = line.replace("## ", "").strip()
-    pdf.set_font("Times", "B", 14)
-    pdf.cell(0, 8, subtitle, ln=True)
+        if self.layout["page_numbers"]:
+            self.set_y(-15)
+            self.set_font(self.layout["font"], "I", 10)
+            self.cell(0, 10, to_latin1(f'Página {self.page_no()}'), align='C')
+
+def write_spans(pdf, spans, size=12):
+    for text, style in spans:
+        pdf.set_font(pdf.layout["font"], font_style(style), size)
+        pdf.write(pdf.layout["line_height"], to_latin1(text))
+    pdf.set_font(pdf.layout["font"], "", size)
+    pdf.ln(pdf.layout["line_height"])
+
+def write_heading(pdf, heading):
+    headings = pdf.layout["headings"]
+    size, height = headings.get(heading.level, headings[3])
+    pdf.set_font(pdf.layout["font"], "B", size)
+    centered = heading.level == 1 and pdf.layout["center_h1"]
+    pdf.multi_cell(0, height, to_latin1(plain_text(heading.spans)), align="C" if centered else "L")
     pdf.ln(2)
-    pdf.set_font("Times", size=12)
-
-def handle_subsubtitle(pdf, line, *_):
-    subsubtitle = line.replace("### ", "").strip()
-    pdf.set_font("Times", "B", 12)
-    pdf.cell(0, 7, subsubtitle, ln=True)
-    pdf.set_font("Times", size=12)
-
-def handle_bold(pdf, line, *_):
-    bold_text = line.replace("**", "")
-    pdf.set_font("Times", "B", 12)
-    pdf.multi_cell(0, 7, bold_text)
-    pdf.set_font("Times", size=12)
-
-def handle_list(pdf, line, *_):
-    pdf.cell(5)
-    pdf.multi_cell(0, 7, "- " + line[2:])
-
-def handle_default(pdf, line, *_):
-    if "**" in line:
-        parts = re.split(r'(\*\*.*?\*\*)', line)
-        for part in parts:
-            if part.startswith("**") and part.endswith("**"):
-                pdf.set_font("Times", "B", 12)
-                pdf.write(7, part[2:-2])
-                pdf.set_font("Times", size=12)
-            else:
-                pdf.write(7, part)
-        pdf.ln(7)
-    else:
-        pdf.multi_cell(0, 7, line)
+    pdf.set_font(pdf.layout["font"], "", 12)
 
-def save_pdf_report(content, filename_base):
-    """Guarda el informe en formato PDF siguiendo normas APA básicas."""
-    reports_dir = "reports"
-    if not os.path.exists(reports_dir):
-        os.makedirs(reports_dir)
+def write_list(pdf, block):
+    number = 0
+    for depth, spans in block.items:
+        if depth == 0:
+            number += 1
+        pdf.cell(5 + 5 * depth)
+        pdf.write(pdf.layout["line_height"], f"{number}. " if block.ordered and depth == 0 else "- ")
+        write_spans(pdf, spans)
 
-    pdf = APA_PDF()
+def _fit_cell(pdf, text, width):
+    text = to_latin1(text)
+    while text and pdf.get_string_width(text) > width - 2:
+        text = text[:-1]
+    return text
+
+def write_table(pdf, table):
+    columns = max([len(table.header)] + [len(row) for row in table.rows])
+    width = (pdf.w - pdf.l_margin - pdf.r_margin) / max(columns, 1)
+    pdf.set_font(pdf.layout["font"], "B", 10)
+    for cell in table.header:
+        pdf.cell(width, pdf.layout["line_height"], _fit_cell(pdf, plain_text(cell), width), border=1)
+    pdf.ln(pdf.layout["line_height"])
+    pdf.set_font(pdf.layout["font"], "", 10)
+    for row in table.rows:
+        for cell in row:
+            pdf.cell(width, pdf.layout["line_height"], _fit_cell(pdf, plain_text(cell), width), border=1)
+        pdf.ln(pdf.layout["line_height"])
+    pdf.set_font(pdf.layout["font"], "", 12)
+    pdf.ln(3)
+
+def render_pdf(document, output_file, streaming=None, style="basico"):
+    """Escribe el documento como PDF con uno de los estilos de PDF_STYLES.
+
+    Con streaming=True (o None y un documento de STREAMING_MIN_UNITS
+    unidades o más, ver Document.render_units) las páginas se escriben al
+    archivo según se completan, con memoria constante; si no, se compone
+    el documento entero con fpdf.
+    """
+    if streaming is None:
+        streaming = document.render_units() >= STREAMING_MIN_UNITS
+    if streaming:
+        from exports.pdf_stream import render_pdf_stream
+        return render_pdf_stream(document, output_file, style)
+
+    pdf = ReportPDF(style, to_latin1(document.title))
+    pdf.set_auto_page_break(auto=True, margin=pdf.layout["bottom_margin"])
     pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=25.4)
-    pdf.set_font("Times", size=12)
-    pdf.apa_title = ""
-
-    handlers = {
-        "# ": handle_title,
-        "## ": handle_subtitle,
-        "### ": handle_subsubtitle,
-        "**": handle_bold,
-        "- ": handle_list
-    }
-
-    lines = content.split("\n")
-    for i, line in enumerate(lines):
-        line = line.strip()
-        if not line:
-            pdf.ln(5)
-            continue
+    pdf.set_font(pdf.layout["font"], size=12)
+
+    blocks = document.blocks
+    # El título ya aparece al principio de la primera página
+    if blocks and isinstance(blocks[0], Heading) and plain_text(blocks[0].spans) == document.title:
+        blocks = blocks[1:]
 
-        # Switch-like logic
-        for prefix, handler in handlers.items():
-            if line.startswith(prefix):
-                handler(pdf, line, i)
-                break
-        else:
-            handle_default(pdf, line, i)
+    for block in blocks:
+        if isinstance(block, Heading):
+            write_heading(pdf, block)
+        elif isinstance(block, Paragraph):
+            write_spans(pdf, block.spans)
+            pdf.ln(2)
+        elif isinstance(block, ListBlock):
+            write_list(pdf, block)
+            pdf.ln(2)
+        elif isinstance(block, Table):
+            write_table(pdf, block)
+        elif isinstance(block, CodeBlock):
+            pdf.set_font("Courier", "", 10)
+            pdf.multi_cell(0, 5, to_latin1(block.text))
+            pdf.set_font(pdf.layout["font"], "", 12)
+            pdf.ln(2)
+        elif isinstance(block, Rule):
+            pdf.ln(5)
 
-    output_file = f"{reports_dir}/{filename_base}.pdf"
     pdf.output(output_file)
-    return output_file
\ No newline at end of file
+    return output_file
+
+def save_pdf_report(content, filename_base):
+    """Guarda el informe en formato PDF siguiendo normas APA básicas."""
+    reports_dir = "reports"
+    if not os.path.exists(reports_dir):
+        os.makedirs(reports_dir)
+    return render_pdf(as_document(content), f"{reports_dir}/{filename_base}.pdf", style="apa")
@@ -0,0 +1,366 @@
+import zlib
+from exports.document import (Heading, Paragraph, ListBlock, Table, CodeBlock, Rule,
+                              BOLD, ITALIC, plain_text)
+from exports.pdf import to_latin1, PDF_STYLES
+
+try:
+    from fpdf.fonts import CORE_FONTS_CHARWIDTHS as CHAR_WIDTHS
+except ImportError:
+    from fpdf.fonts import fpdf_charwidths as CHAR_WIDTHS
+
+# Página A4 en puntos; los márgenes salen del estilo (PDF_STYLES, en mm)
+PAGE_WIDTH = 595.28
+PAGE_HEIGHT = 841.89
+POINTS_PER_MM = 72 / 25.4
+FOOTER_BASELINE = 30
+BODY_SIZE = 12
+TABLE_SIZE = 10
+CODE_SIZE = 10
+LINE_SPACING = 1.45
+CELL_PADDING = 3
+# Anchos de palabra memorizados; se vacía al llegar al límite para acotar la memoria
+WIDTH_CACHE_SIZE = 10_000
+
+# Fuentes estándar por familia del estilo: recurso PDF, nombre base y clave de métricas en fpdf
+FONT_FAMILIES = {
+    "Times": {
+        "": ("F1", "Times-Roman", "times"),
+        BOLD: ("F2", "Times-Bold", "timesB"),
+        ITALIC: ("F3", "Times-Italic", "timesI"),
+        BOLD + ITALIC: ("F4", "Times-BoldItalic", "timesBI"),
+        "code": ("F5", "Courier", "courier"),
+    },
+    # Arial es un alias de Helvetica entre las fuentes estándar
+    "Arial": {
+        "": ("F1", "Helvetica", "helvetica"),
+        BOLD: ("F2", "Helvetica-Bold", "helveticaB"),
+        ITALIC: ("F3", "Helvetica-Oblique", "helveticaI"),
+        BOLD + ITALIC: ("F4", "Helvetica-BoldOblique", "helveticaBI"),
+        "code": ("F5", "Courier", "courier"),
+    },
+}
+
+def _width_table(widths):
+    """Anchos de los 256 caracteres WinAnsi, admitiendo las tablas de fpdf 1.x y fpdf2."""
+    if isinstance(widths, dict):
+        return [widths.get(chr(code), 500) for code in range(256)]
+    return list(widths)
+
+WIDTHS = {family: {style: _width_table(CHAR_WIDTHS[key]) for style, (_, _, key) in fonts.items()}
+          for family, fonts in FONT_FAMILIES.items()}
+
+# Objetos fijos: catálogo, árbol de páginas, información y fuentes
+CATALOG_ID, PAGES_ID, INFO_ID = 1, 2, 3
+FIRST_FONT_ID = 4
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+class StreamingPDFWriter:
+    """Escritor PDF que vuelca cada página al archivo en cuanto se completa.
+
+    Solo conserva en memoria el contenido de la página actual y los
+    desplazamientos de los objetos ya escritos, de modo que el consumo de
+    memoria no crece con el número de páginas. Usa las fuentes estándar
+    de la familia del estilo (y Courier) con codificación WinAnsi, como las
+    fuentes core de fpdf.
+    """
+
+    def __init__(self, output_file, title="", style="basico"):
+        self.layout = PDF_STYLES[style]
+        self.fonts = FONT_FAMILIES[self.layout["font"]]
+        self.widths = WIDTHS[self.layout["font"]]
+        self.margin = self.layout["margin"] * POINTS_PER_MM
+        self.bottom_margin = self.layout["bottom_margin"] * POINTS_PER_MM
+        self.file = open(output_file, "wb")
+        self.output_file = output_file
+        self.title = to_latin1(title)
+        self.position = 0
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = FIRST_FONT_ID + len(self.fonts)
+        self.page = None
+        self.y = 0
+        self._widths = {}
+
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        for n, (_, base_font, _) in enumerate(self.fonts.values()):
+            self._object(FIRST_FONT_ID + n,
+                         f"<< /Type /Font /Subtype /Type1 /BaseFont /{base_font} "
+                         f"/Encoding /WinAnsiEncoding >>")
+
+    # Escritura de bajo nivel
+
+    def _write(self, data):
+        self.file.write(data)
+        self.position += len(data)
+
+    def _object(self, object_id, body):
+        self.offsets[object_id] = self.position
+        if isinstance(body, str):
+            body = body.encode("latin-1")
+        self._write(f"{object_id} 0 obj\n".encode("latin-1") + body + b"\nendobj\n")
+
+    def _new_id(self):
+        object_id = self.next_id
+        self.next_id += 1
+        return object_id
+
+    # Páginas
+
+    def new_page(self):
+        """Cierra la página actual (si la hay) y empieza otra con su cabecera."""
+        if self.page is not None:
+            self._flush_page()
+        self.page = []
+        self.y = self.margin
+        if len(self.page_ids) == 0 and self.title:
+            self.text_line([(self.title, BOLD)], self.layout["title_size"], align="C")
+            self.y += 28
+
+    def _flush_page(self):
+        if self.layout["page_numbers"]:
+            footer = to_latin1(f"Página {len(self.page_ids) + 1}")
+            width = self.text_width(footer, ITALIC, 10)
+            self._draw_text((PAGE_WIDTH - width) / 2, FOOTER_BASELINE, footer, ITALIC, 10)
+
+        stream = zlib.compress("\n".join(self.page).encode("latin-1"))
+        content_id, page_id = self._new_id(), self._new_id()
+        self._object(content_id, f"<< /Length {len(stream)} /Filter /FlateDecode >>\nstream\n"
+                     .encode("latin-1") + stream + b"\nendstream")
+        self._object(page_id, f"<< /Type /Page /Parent {PAGES_ID} 0 R "
+                              f"/MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                              f"/Resources << /Font {self._font_resources()} >> "
+                              f"/Contents {content_id} 0 R >>")
+        self.page_ids.append(page_id)
+        self.page = None
+
+    def _font_resources(self):
+        fonts = " ".join(f"/{resource} {FIRST_FONT_ID + n} 0 R"
+                         for n, (resource, _, _) in enumerate(self.fonts.values()))
+        return f"<< {fonts} >>"
+
+    def ensure_space(self, height):
+        """Salta de página si no caben height puntos más antes del margen inferior."""
+        if self.page is None or self.y + height > PAGE_HEIGHT - self.bottom_margin:
+            self.new_page()
+
+    def close(self):
+        """Escribe la última página, el árbol de páginas y la tabla de referencias."""
+        if self.page is None and not self.page_ids:
+            self.new_page()
+        if self.page is not None:
+            self._flush_page()
+
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.page_ids)
+        self._object(PAGES_ID, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>")
+        self._object(CATALOG_ID, f"<< /Type /Catalog /Pages {PAGES_ID} 0 R >>")
+        self._object(INFO_ID, f"<< /Title ({_escape(self.title)}) /Producer (Report Generator AI) >>")
+
+        xref_position = self.position
+        count = self.next_id
+        lines = [f"xref\n0 {count}\n", "0000000000 65535 f \n"]
+        lines.extend(f"{self.offsets[object_id]:010d} 00000 n \n" for object_id in range(1, count))
+        lines.append(f"trailer\n<< /Size {count} /Root {CATALOG_ID} 0 R /Info {INFO_ID} 0 R >>\n"
+                     f"startxref\n{xref_position}\n%%EOF\n")
+        self._write("".join(lines).encode("latin-1"))
+        self.file.close()
+        return self.output_file
+
+    # Texto
+
+    def text_width(self, text, style, size):
+        units = self._widths.get((text, style))
+        if units is None:
+            if len(self._widths) >= WIDTH_CACHE_SIZE:
+                self._widths.clear()
+            widths = self.widths[style]
+            units = sum(widths[code] for code in text.encode("latin-1", "replace"))
+            self._widths[(text, style)] = units
+        return units * size / 1000
+
+    def _draw_text(self, x, baseline, text, style, size):
+        resource = self.fonts[style][0]
+        self.page.append(f"BT /{resource} {size} Tf {x:.2f} {baseline:.2f} Td ({_escape(text)}) Tj ET")
+
+    def wrap(self, spans, size, width):
+        """Reparte los fragmentos en líneas de como máximo width puntos.
+
+        Devuelve una lista de líneas; cada línea es una lista de (texto, estilo).
+        Las palabras más largas que la línea se cortan por caracteres.
+        """
+        lines = [[]]
+        line_width = 0
+        for text, style in spans:
+            text = to_latin1(text)
+            space = self.text_width(" ", style, size)
+            for n, segment in enumerate(text.split("\n")):
+                if n:
+                    lines.append([])
+                    line_width = 0
+                for m, word in enumerate(segment.split(" ")):
+                    if m and lines[-1]:
+                        lines[-1].append((" ", style))
+                        line_width += space
+                    if not word:
+                        continue
+                    word_width = self.text_width(word, style, size)
+                    while word_width > width:
+                        cut = len(word) - 1
+                        while cut > 1 and self.text_width(word[:cut], style, size) > width:
+                            cut = cut * 3 // 4
+                        lines.append([(word[:cut], style)])
+                        lines.append([])
+                        word = word[cut:]
+                        word_width = self.text_width(word, style, size)
+                        line_width = 0
+                    if line_width + word_width > width and lines[-1]:
+                        while lines[-1] and lines[-1][-1][0] == " ":
+                            lines[-1].pop()
+                        lines.append([])
+                        line_width = 0
+                    lines[-1].append((word, style))
+                    line_width += word_width
+        return [line for line in lines if line] or [[]]
+
+    def text_line(self, runs, size, x=None, width=None, align="L"):
+        """Dibuja una línea ya repartida en la posición actual y avanza."""
+        x = x if x is not None else self.margin
+        width = width if width is not None else PAGE_WIDTH - 2 * self.margin
+        height = size * LINE_SPACING
+        self.ensure_space(height)
+        if align == "C":
+            used = sum(self.text_width(text, style, size) for text, style in runs)
+            x += (width - used) / 2
+        baseline = PAGE_HEIGHT - self.y - size
+        for text, style in _merge_runs(runs):
+            self._draw_text(x, baseline, text, style, size)
+            x += self.text_width(text, style, size)
+        self.y += height
+
+    def paragraph(self, spans, size=BODY_SIZE, indent=0, align="L", prefix=None):
+        width = PAGE_WIDTH - 2 * self.margin - indent
+        lines = self.wrap(spans, size, width)
+        if prefix:
+            lines[0] = [(prefix, "")] + lines[0]
+        for line in lines:
+            self.text_line(line, size, self.margin + indent, width, align)
+
+    def space(self, height):
+        if self.page is not None:
+            self.y += height
+
+    def rule(self):
+        self.ensure_space(10)
+        y = PAGE_HEIGHT - self.y - 5
+        self.page.append(f"0.5 w {self.margin:.2f} {y:.2f} m {PAGE_WIDTH - self.margin:.2f} {y:.2f} l S")
+        self.y += 10
+
+    # Tablas
+
+    def _table_row(self, cells, widths, style):
+        wrapped = [self.wrap([(plain_text(cell), style)], TABLE_SIZE, width - 2 * CELL_PADDING)
+                   for cell, width in zip(cells, widths)]
+        line_height = TABLE_SIZE * LINE_SPACING
+        height = max(len(lines) for lines in wrapped) * line_height + 2 * CELL_PADDING
+        return wrapped, height
+
+    def _draw_row(self, wrapped, widths, height):
+        line_height = TABLE_SIZE * LINE_SPACING
+        x = self.margin
+        top = PAGE_HEIGHT - self.y
+        for lines, width in zip(wrapped, widths):
+            self.page.append(f"0.5 w {x:.2f} {top - height:.2f} {width:.2f} {height:.2f} re S")
+            for n, line in enumerate(lines):
+                baseline = top - CELL_PADDING - n * line_height - TABLE_SIZE
+                cell_x = x + CELL_PADDING
+                for text, style in _merge_runs(line):
+                    self._draw_text(cell_x, baseline, text, style, TABLE_SIZE)
+                    cell_x += self.text_width(text, style, TABLE_SIZE)
+            x += width
+        self.y += height
+
+    def table(self, table):
+        """Dibuja una tabla fila a fila, repitiendo la cabecera en cada página nueva.
+
+        Las filas más altas que una página se recortan al espacio disponible.
+        """
+        columns = max([len(table.header)] + [len(row) for row in table.rows])
+        width = (PAGE_WIDTH - 2 * self.margin) / max(columns, 1)
+        widths = [width] * columns
+        header = self._table_row(table.header + [[]] * (columns - len(table.header)), widths, BOLD)
+        max_height = PAGE_HEIGHT - self.margin - self.bottom_margin - header[1] - 40
+
+        self.ensure_space(header[1] * 2)
+        self._draw_row(header[0], widths, header[1])
+        for row in table.rows:
+            wrapped, height = self._table_row(row + [[]] * (columns - len(row)), widths, "")
+            if height > max_height:
+                lines = int((max_height - 2 * CELL_PADDING) // (TABLE_SIZE * LINE_SPACING))
+                wrapped = [cell_lines[:lines] for cell_lines in wrapped]
+                height = max_height
+            if self.y + height > PAGE_HEIGHT - self.bottom_margin:
+                self.new_page()
+                self._draw_row(header[0], widths, header[1])
+            self._draw_row(wrapped, widths, height)
+        self.y += 6
+
+    def code(self, text):
+        width = PAGE_WIDTH - 2 * self.margin
+        for line in text.split("\n"):
+            for wrapped in self.wrap([(line, "code")], CODE_SIZE, width):
+                self.text_line(wrapped, CODE_SIZE)
+
+def _merge_runs(runs):
+    """Une fragmentos contiguos del mismo estilo para emitir menos operadores de texto."""
+    merged = []
+    for text, style in runs:
+        if merged and merged[-1][1] == style:
+            merged[-1] = (merged[-1][0] + text, style)
+        else:
+            merged.append((text, style))
+    return merged
+
+def render_pdf_stream(document, output_file, style="basico"):
+    """Escribe el documento como PDF (estilo de PDF_STYLES) volcando las páginas a medida que se completan."""
+    writer = StreamingPDFWriter(output_file, document.title, style)
+    try:
+        _write_blocks(writer, document)
+    except Exception:
+        writer.file.close()
+        raise
+    return writer.close()
+
+def _write_blocks(writer, document):
+    writer.new_page()
+
+    blocks = document.blocks
+    # El título ya aparece al principio de la primera página
+    if blocks and isinstance(blocks[0], Heading) and plain_text(blocks[0].spans) == document.title:
+        blocks = blocks[1:]
+
+    for block in blocks:
+        if isinstance(block, Heading):
+            size = writer.layout["headings"].get(block.level, writer.layout["headings"][3])[0]
+            writer.ensure_space(size * LINE_SPACING * 3)
+            writer.paragraph([(plain_text(block.spans), BOLD)], size,
+                             align="C" if block.level == 1 and writer.layout["center_h1"] else "L")
+            writer.space(4)
+        elif isinstance(block, Paragraph):
+            writer.paragraph(block.spans)
+            writer.space(4)
+        elif isinstance(block, ListBlock):
+            number = 0
+            for depth, spans in block.items:
+                if depth == 0:
+                    number += 1
+                marker = f"{number}. " if block.ordered and depth == 0 else "- "
+                writer.paragraph(spans, indent=14 + 14 * depth, prefix=marker)
+            writer.space(4)
+        elif isinstance(block, Table):
+            writer.table(block)
+        elif isinstance(block, CodeBlock):
+            writer.code(block.text)
+            writer.space(4)
+        elif isinstance(block, Rule):
+            writer.rule()
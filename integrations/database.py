@@ -1,7 +1,10 @@
 import os
-import pandas as pd
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import sqlalchemy
 from dotenv import load_dotenv
+from services.tracing import traced, record
 
 load_dotenv()
 
@@ -11,57 +14,459 @@ DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_USER = os.getenv("DB_USER")
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT", "5432") 
+# Conexiones del pool; también es el número de tablas que se muestrean a la vez
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+# Tiempo máximo de cada consulta de muestreo (solo PostgreSQL)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "10000"))
+# Filas de ejemplo por tabla en el resumen
+SAMPLE_ROWS = 5
+# Esquema y valores más frecuentes por columna del resumen de estadísticas del catálogo
+DB_SCHEMA = os.getenv("DB_SCHEMA", "public")
+MOST_COMMON_VALUES = 5
+MAX_VALUE_CHARS = 60
+OVERVIEW_MODES = ("sample", "catalog")
+
+# Resumen por estadísticas del catálogo de PostgreSQL: una consulta por tipo de
+# dato para todo el esquema, sin leer filas de las tablas.
+_CATALOG_TABLES_SQL = """
+    SELECT c.relname, c.relkind, c.reltuples::bigint, s.n_live_tup,
+           pg_total_relation_size(c.oid), obj_description(c.oid, 'pg_class'),
+           greatest(s.last_analyze, s.last_autoanalyze)
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    WHERE n.nspname = :schema AND c.relkind IN ('r', 'p', 'm', 'v', 'f') {tables}
+    ORDER BY c.relname
+"""
+_CATALOG_COLUMNS_SQL = """
+    SELECT table_name, column_name, data_type, is_nullable = 'YES', column_default
+    FROM information_schema.columns
+    WHERE table_schema = :schema {tables}
+    ORDER BY table_name, ordinal_position
+"""
+_CATALOG_STATS_SQL = """
+    SELECT tablename, attname, null_frac, n_distinct, avg_width, correlation,
+           most_common_vals::text, most_common_freqs[1:{limit}]
+    FROM pg_stats
+    WHERE schemaname = :schema AND NOT inherited {tables}
+"""
+_CATALOG_CONSTRAINTS_SQL = """
+    SELECT c.relname, k.contype, pg_get_constraintdef(k.oid)
+    FROM pg_constraint k
+    JOIN pg_class c ON c.oid = k.conrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = :schema AND k.contype IN ('p', 'f', 'u') {tables}
+    ORDER BY c.relname, k.contype
+"""
+_RELATION_KINDS = {"r": "tabla", "p": "tabla particionada", "m": "vista materializada",
+                   "v": "vista", "f": "tabla externa"}
+_CONSTRAINT_KINDS = {"p": "primary_key", "f": "foreign_key", "u": "unique"}
+
+_engines = {}
+_engine_slots = {}
+_engines_lock = threading.Lock()
 
 def build_postgres_url():
     """Construye la URL de conexión para PostgreSQL en RDS."""
     return f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+def get_engine(db_url, pool_size=DB_POOL_SIZE):
+    """Engine compartido por URL dentro del proceso, con pool de pool_size conexiones.
+
+    pool_pre_ping descarta las conexiones cerradas por el servidor antes de
+    usarlas. La clave incluye el PID para no reutilizar en un proceso hijo
+    las conexiones heredadas del padre. Los hilos que consultan en paralelo
+    piden turno con connection_slots.
+    """
+    key = (db_url, pool_size, os.getpid())
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = sqlalchemy.create_engine(
+                db_url,
+                pool_size=pool_size,
+                max_overflow=0,
+                pool_pre_ping=True,
+                pool_recycle=1800,
+            )
+            _engines[key] = engine
+            _engine_slots[engine] = threading.BoundedSemaphore(pool_size)
+    return engine
+
+def connection_slots(engine):
+    """Semáforo con tantos turnos como conexiones tiene el pool del engine, compartido en el proceso.
+
+    Los trabajos de un lote comparten el engine: sin este límite, sus hilos
+    de muestreo y extracción esperarían en el QueuePool hasta agotar su
+    tiempo y el fallo se anotaría como error de la tabla.
+    """
+    with _engines_lock:
+        size = getattr(engine.pool, "size", lambda: DB_POOL_SIZE)()
+        return _engine_slots.setdefault(engine, threading.BoundedSemaphore(size))
+
+def _parse_pg_array(literal):
+    """Elementos de primer nivel de un literal de array de PostgreSQL ('{a,"b c",NULL}').
+
+    Los subarrays (columnas de tipo array) se conservan como texto.
+    """
+    if not literal or literal[0] != "{" or literal == "{}":
+        return []
+    items, current, depth, quoted, escaped, was_quoted = [], [], 0, False, False, False
+    for char in literal[1:-1]:
+        if escaped:
+            current.append(char)
+            escaped = False
+        elif char == "\\":
+            escaped = True
+            if depth:
+                current.append(char)
+        elif char == '"':
+            quoted = not quoted
+            was_quoted = True
+            if depth:
+                current.append(char)
+        elif quoted:
+            current.append(char)
+        elif char == "{":
+            depth += 1
+            current.append(char)
+        elif char == "}":
+            depth -= 1
+            current.append(char)
+        elif char == "," and not depth:
+            value = "".join(current)
+            items.append(None if value == "NULL" and not was_quoted else value)
+            current, was_quoted = [], False
+        else:
+            current.append(char)
+    value = "".join(current)
+    items.append(None if value == "NULL" and not was_quoted else value)
+    return items
+
+def _print_progress(done, total, table, seconds, error):
+    status = "❌" if error else "✅"
+    print(f"   {status} [{done}/{total}] {table} ({seconds:.2f}s)")
+
 class DatabaseIntegration:
-    def __init__(self):
-        self.db_url = build_postgres_url()
+    def __init__(self, db_url=None, pool_size=DB_POOL_SIZE, statement_timeout_ms=DB_STATEMENT_TIMEOUT_MS):
+        self.db_url = db_url or build_postgres_url()
+        self.pool_size = pool_size
+        self.statement_timeout_ms = statement_timeout_ms
         self.engine = None
+        # Tiempos del último resumen: {"total", "tables": {tabla: segundos}}
+        self.last_timings = None
 
     def verify_connection(self):
-        """Verifica la conexión a la base de datos."""
+        """Verifica la conexión a la base de datos (reutilizando el engine del proceso)."""
         try:
-            self.engine = sqlalchemy.create_engine(self.db_url)
+            self.engine = get_engine(self.db_url, self.pool_size)
             with self.engine.connect() as conn:
                 conn.execute(sqlalchemy.text("SELECT 1"))
             return True, "Conexión exitosa a la base de datos."
         except Exception as e:
             return False, f"Error de conexión: {e}"
 
-    def fetch_database_overview(self):
+    def get_schema(self):
+        """Tablas del esquema con columnas, tipos, claves y filas estimadas.
+
+        Se sirven de la caché en disco (integrations/database_schema.py) si
+        la huella del esquema no ha cambiado, con una sola consulta.
         """
-        Obtiene un resumen general de la base de datos: nombres de tablas y las primeras filas de cada una.
+        from integrations.database_schema import schema_cache
+        if self.engine is None:
+            self.engine = get_engine(self.db_url, self.pool_size)
+        return schema_cache.load(self.engine, self.db_url)
+
+    def sample_table(self, table, rows=SAMPLE_ROWS):
+        """Columnas y primeras filas (como texto) de una tabla, con límite de tiempo.
+
+        El nombre se cita con las reglas del dialecto, por lo que admite
+        mayúsculas, espacios o palabras reservadas.
+        """
+        quoted = self.engine.dialect.identifier_preparer.quote(table)
+        with self.engine.connect() as conn:
+            if self.engine.dialect.name == "postgresql" and self.statement_timeout_ms:
+                # SET LOCAL solo afecta a esta transacción; la conexión vuelve al pool sin cambios
+                conn.execute(sqlalchemy.text(f"SET LOCAL statement_timeout = {int(self.statement_timeout_ms)}"))
+            result = conn.execute(sqlalchemy.text(f"SELECT * FROM {quoted} LIMIT :rows"), {"rows": rows})
+            columns = list(result.keys())
+            sample_rows = [{column: str(value) for column, value in zip(columns, row)}
+                           for row in result.fetchall()]
+        return {"columns": columns, "sample_rows": sample_rows}
+
+    def fetch_catalog_overview(self, tables=None, schema=DB_SCHEMA):
+        """Resumen del esquema a partir de las estadísticas del catálogo de PostgreSQL.
+
+        Con cuatro consultas para todo el esquema (pg_class,
+        information_schema.columns, pg_stats y pg_constraint) obtiene por
+        tabla las filas estimadas, el tamaño, las columnas con su tipo y,
+        si la tabla se ha analizado, la fracción de nulos, los valores
+        distintos estimados y los valores más frecuentes, además de las
+        claves. No lee filas, por lo que el coste no depende del tamaño de
+        las tablas y el número de consultas no depende de cuántas haya.
         """
         try:
-            inspector = sqlalchemy.inspect(self.engine)
-            tables = inspector.get_table_names()
+            if self.engine is None:
+                self.engine = get_engine(self.db_url, self.pool_size)
+            if self.engine.dialect.name != "postgresql":
+                return None, f"El resumen por estadísticas solo está disponible en PostgreSQL ({self.engine.dialect.name})."
+            start = time.perf_counter()
+            params = {"schema": schema}
+            if tables:
+                params["tables"] = list(tables)
+
+            def query(conn, sql, column):
+                condition = f"AND {column} = ANY(:tables)" if tables else ""
+                return conn.execute(sqlalchemy.text(sql.format(tables=condition, limit=MOST_COMMON_VALUES)),
+                                    params).fetchall()
+
+            with self.engine.connect() as conn:
+                if self.statement_timeout_ms:
+                    conn.execute(sqlalchemy.text(f"SET LOCAL statement_timeout = {int(self.statement_timeout_ms)}"))
+                table_rows = query(conn, _CATALOG_TABLES_SQL, "c.relname")
+                column_rows = query(conn, _CATALOG_COLUMNS_SQL, "table_name")
+                stats_rows = query(conn, _CATALOG_STATS_SQL, "tablename")
+                constraint_rows = query(conn, _CATALOG_CONSTRAINTS_SQL, "c.relname")
+
             overview = {}
-            for table in tables:
+            for name, kind, reltuples, live_tuples, total_bytes, comment, analyzed in table_rows:
+                # reltuples es -1 (o 0 en versiones antiguas) si la tabla nunca se ha analizado
+                estimate = reltuples if reltuples and reltuples > 0 else live_tuples
+                entry = {
+                    "type": _RELATION_KINDS.get(kind, kind),
+                    "row_estimate": int(estimate) if estimate is not None else None,
+                    "total_bytes": total_bytes,
+                    "columns": [],
+                }
+                if comment:
+                    entry["comment"] = comment
+                entry["last_analyzed"] = analyzed.isoformat(timespec="seconds") if analyzed else None
+                overview[name] = entry
+
+            columns = {}
+            for table, column, data_type, nullable, default in column_rows:
+                if table not in overview:
+                    continue
+                info = {"name": column, "type": data_type, "nullable": nullable}
+                if default is not None:
+                    info["default"] = default
+                overview[table]["columns"].append(info)
+                columns[(table, column)] = info
+
+            for table, column, null_frac, n_distinct, avg_width, correlation, values, freqs in stats_rows:
+                info = columns.get((table, column))
+                if info is None:
+                    continue
+                rows = overview[table]["row_estimate"] or 0
+                info["null_frac"] = round(null_frac, 4)
+                # n_distinct negativo es una fracción del número de filas
+                info["n_distinct"] = int(n_distinct) if n_distinct >= 0 else int(round(-n_distinct * rows))
+                info["avg_width"] = avg_width
+                if correlation is not None:
+                    info["correlation"] = round(correlation, 3)
+                if values:
+                    values = _parse_pg_array(values)[:MOST_COMMON_VALUES]
+                    info["most_common"] = [[value[:MAX_VALUE_CHARS] if value is not None else None,
+                                            round(freq, 4)]
+                                           for value, freq in zip(values, freqs or [])]
+
+            for table, kind, definition in constraint_rows:
+                if table in overview:
+                    overview[table].setdefault("constraints", []).append(
+                        {"type": _CONSTRAINT_KINDS.get(kind, kind), "definition": definition}
+                    )
+
+            total = time.perf_counter() - start
+            self.last_timings = {"total": total, "tables": {}}
+            record(mode="catalog", tables=len(overview))
+            return overview, f"Estadísticas de {len(overview)} tablas obtenidas del catálogo en {total:.1f}s."
+        except Exception as e:
+            return None, f"Error al obtener las estadísticas del catálogo: {e}"
+
+    @traced("database.overview")
+    def fetch_database_overview(self, tables=None, progress=_print_progress, mode="sample"):
+        """
+        Obtiene un resumen general de la base de datos: nombres de tablas y las primeras filas de cada una.
+        Con tables se limita el resumen a las tablas indicadas.
+
+        Las tablas se muestrean en paralelo con tantas conexiones como tenga
+        el pool, compartidas con el resto de trabajos del proceso (ver
+        connection_slots), cada consulta con su límite de tiempo. progress(hechas,
+        total, tabla, segundos, error) se llama al terminar cada tabla (None
+        para no informar); los tiempos quedan en self.last_timings.
+
+        Con mode="catalog" se usa en su lugar fetch_catalog_overview.
+        """
+        if mode == "catalog":
+            return self.fetch_catalog_overview(tables)
+        if mode not in OVERVIEW_MODES:
+            return None, f"Tipo de resumen desconocido: {mode}"
+        try:
+            if self.engine is None:
+                self.engine = get_engine(self.db_url, self.pool_size)
+            start = time.perf_counter()
+            tables = [t for t in self.get_schema() if not tables or t in tables]
+
+            def sample(table):
+                with connection_slots(self.engine):
+                    table_start = time.perf_counter()
+                    try:
+                        return self.sample_table(table), time.perf_counter() - table_start
+                    except Exception as e:
+                        return ({"columns": [], "sample_rows": [], "error": str(e)},
+                                time.perf_counter() - table_start)
+
+            results = {}
+            table_timings = {}
+            with ThreadPoolExecutor(max_workers=max(1, min(self.pool_size, len(tables)))) as executor:
+                futures = {executor.submit(sample, table): table for table in tables}
+                for done, future in enumerate(as_completed(futures), 1):
+                    table = futures[future]
+                    results[table], table_timings[table] = future.result()
+                    if progress:
+                        progress(done, len(tables), table, table_timings[table], results[table].get("error"))
+
+            total = time.perf_counter() - start
+            self.last_timings = {"total": total, "tables": table_timings}
+            overview = {table: results[table] for table in tables}
+            failed = sum(1 for result in results.values() if "error" in result)
+            record(mode=mode, tables=len(tables), failed=failed,
+                   rows=sum(len(result.get("sample_rows", [])) for result in results.values()))
+            message = f"Resumen de {len(tables)} tablas obtenido correctamente en {total:.1f}s."
+            if failed:
+                message += f" {failed} tablas con error."
+            return overview, message
+        except Exception as e:
+            return None, f"Error al obtener resumen de la base de datos: {e}"
+
+    @traced("database.extract")
+    def extract_tables(self, tables, max_age=None, progress=_print_progress):
+        """Vuelca tablas a Parquet locales en streaming (ver integrations/database_extract.py).
+
+        Cada elemento de tables es un nombre o {"table", "columns", "where",
+        "schema"}. Un extracto de la misma consulta con menos de max_age
+        segundos (DB_EXTRACT_MAX_AGE por defecto) se reutiliza. Las tablas se
+        extraen en paralelo con las conexiones del pool. Devuelve
+        ({tabla: {"path", "rows", "bytes", "seconds", "reused", "table",
+        "schema", "columns", "where"}}, mensaje); las tablas que fallan
+        llevan "error". Si una tabla aparece en varias especificaciones, la
+        segunda y siguientes se guardan como "tabla#2", "tabla#3"...
+        """
+        from integrations.database_extract import (extract_query, extract_path, stream_to_parquet,
+                                                   table_column_types, DB_EXTRACT_MAX_AGE)
+        max_age = DB_EXTRACT_MAX_AGE if max_age is None else max_age
+        try:
+            if self.engine is None:
+                self.engine = get_engine(self.db_url, self.pool_size)
+            start = time.perf_counter()
+            specs = [{"table": spec} if isinstance(spec, str) else spec for spec in tables]
+            keys = []
+            for spec in specs:
+                key, copy = spec["table"], 1
+                while key in keys:
+                    copy += 1
+                    key = f"{spec['table']}#{copy}"
+                keys.append(key)
+
+            def extract(spec):
+                table_start = time.perf_counter()
+                # La definición permite saber qué métricas se pueden calcular con el extracto
+                definition = {"table": spec["table"], "schema": spec.get("schema"),
+                              "columns": spec.get("columns"), "where": spec.get("where")}
                 try:
-                    df = pd.read_sql(f"SELECT * FROM {table} LIMIT 5", self.engine)
-                    df = df.astype(str)
-                    overview[table] = {
-                        "columns": list(df.columns),
-                        "sample_rows": df.to_dict(orient="records")
-                    }
+                    query = extract_query(spec["table"], spec.get("columns"), spec.get("where"),
+                                          spec.get("schema"))
+                    path = extract_path(self.db_url, query, label=spec["table"])
+                    reused = os.path.exists(path) and time.time() - os.path.getmtime(path) < max_age
+                    if reused:
+                        import pyarrow.parquet as pq
+                        rows = pq.ParquetFile(path).metadata.num_rows
+                    else:
+                        column_types = table_column_types(self.engine, spec["table"], spec.get("schema"))
+                        rows = stream_to_parquet(self.engine, query, path,
+                                                 statement_timeout_ms=self.statement_timeout_ms,
+                                                 column_types=column_types)
                 except Exception as e:
-                    overview[table] = {
-                        "columns": [],
-                        "sample_rows": [],
-                        "error": str(e)
-                    }
-            return overview, f"Resumen de {len(tables)} tablas obtenido correctamente."
+                    # Solo el mensaje del servidor, sin el SQL de SQLAlchemy
+                    error = str(getattr(e, "orig", None) or e).strip().split("\n")[0]
+                    return {"error": error, "seconds": time.perf_counter() - table_start, **definition}
+                return {"path": path, "rows": rows, "bytes": os.path.getsize(path),
+                        "seconds": time.perf_counter() - table_start, "reused": reused, **definition}
+
+            def extract_with_slot(spec):
+                with connection_slots(self.engine):
+                    return extract(spec)
+
+            extracts = {}
+            with ThreadPoolExecutor(max_workers=max(1, min(self.pool_size, len(specs)))) as executor:
+                futures = {executor.submit(extract_with_slot, spec): key for key, spec in zip(keys, specs)}
+                for done, future in enumerate(as_completed(futures), 1):
+                    table = futures[future]
+                    extracts[table] = future.result()
+                    if progress:
+                        progress(done, len(specs), table, extracts[table]["seconds"], extracts[table].get("error"))
+
+            extracts = {key: extracts[key] for key in keys}
+            failed = sum(1 for extract in extracts.values() if "error" in extract)
+            rows = sum(extract.get("rows", 0) for extract in extracts.values())
+            record(tables=len(extracts), failed=failed, rows=rows,
+                   bytes=sum(extract.get("bytes", 0) for extract in extracts.values()),
+                   reused=sum(1 for extract in extracts.values() if extract.get("reused")))
+            message = f"{len(extracts)} tablas extraídas ({rows} filas) en {time.perf_counter() - start:.1f}s."
+            if failed:
+                message += f" {failed} con error."
+            return extracts, message
         except Exception as e:
-            return None, f"Error al obtener resumen de la base de datos: {e}"
+            return None, f"Error al extraer las tablas: {e}"
+
+    def profile_extracts(self, extracts):
+        """Perfil estadístico de cada extracto, recorrido por bloques con memory map."""
+        from integrations.excel_cache import iter_frames
+        from integrations.excel_profile import profile_chunks, CHUNK_ROWS
+        return {table: profile_chunks(iter_frames(extract["path"], CHUNK_ROWS))
+                for table, extract in extracts.items() if "error" not in extract}
+
+    @traced("database.metrics")
+    def fetch_metrics(self, metrics, extracts=None):
+        """Calcula en la base de datos las métricas declaradas (ver integrations/database_metrics.py).
 
-    def generate_report_data(self, data):
-        """Solicita contexto al usuario y prepara los datos para el informe."""
-        print("\nDescribe brevemente el contexto del informe que deseas generar sobre la base de datos:")
-        context = input("Contexto: ")
-        return {
-            "contexto_usuario": context,
-            "resumen_bd": data
-        }
\ No newline at end of file
+        Solo viajan los resultados agregados; cada consulta pasa por el límite
+        de coste de EXPLAIN y por statement_timeout. Las métricas de tablas
+        con extracto (extract_tables) se calculan sobre el Parquet local.
+        """
+        from integrations.database_metrics import run_metrics
+        try:
+            if self.engine is None:
+                self.engine = get_engine(self.db_url, self.pool_size)
+            start = time.perf_counter()
+            extracts = {table: extract for table, extract in (extracts or {}).items() if "error" not in extract}
+            results = run_metrics(self.engine, metrics, self.statement_timeout_ms, extracts=extracts)
+            failed = sum(1 for result in results.values() if "error" in result)
+            record(metrics=len(results), failed=failed,
+                   rows=sum(len(result.get("rows", [])) for result in results.values()))
+            message = f"{len(results)} métricas calculadas en {time.perf_counter() - start:.1f}s."
+            if failed:
+                message += f" {failed} con error."
+            return results, message
+        except Exception as e:
+            return None, f"Error al calcular las métricas: {e}"
+
+    @traced("database.prepare")
+    def generate_report_data(self, data, context=None, metrics=None, profiles=None):
+        """Solicita contexto al usuario (si no se indica) y prepara los datos para el informe.
+
+        Con metrics (resultado de fetch_metrics) el informe se basa en las
+        métricas agregadas en "metricas_bd"; data puede ser None. profiles
+        (resultado de profile_extracts) se añade como "perfil_tablas".
+        """
+        if context is None:
+            print("\nDescribe brevemente el contexto del informe que deseas generar sobre la base de datos:")
+            context = input("Contexto: ")
+        report_data = {"contexto_usuario": context}
+        if data is not None:
+            report_data["resumen_bd"] = data
+        if metrics is not None:
+            report_data["metricas_bd"] = metrics
+        if profiles is not None:
+            report_data["perfil_tablas"] = profiles
+        return report_data
\ No newline at end of file
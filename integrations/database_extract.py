@@ -0,0 +1,309 @@
+import os
+import re
+import json
+import time
+import hashlib
+import sqlalchemy
+from integrations.database_metrics import (MetricError, build_condition, MAX_GROUPS, TIME_UNITS,
+                                           json_value)
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pc = None
+    pq = None
+
+# Carpeta de los extractos y filas por lote (memoria acotada durante la extracción)
+DB_EXTRACT_DIR = os.getenv("DB_EXTRACT_DIR", os.path.join(".cache", "db_extracts"))
+EXTRACT_BATCH_ROWS = int(os.getenv("DB_EXTRACT_BATCH_ROWS", "50000"))
+# Antigüedad máxima (segundos) para reutilizar un extracto en lugar de volver a consultar
+DB_EXTRACT_MAX_AGE = int(os.getenv("DB_EXTRACT_MAX_AGE", "3600"))
+
+_ARROW_AGGREGATES = {"count": "count", "count_distinct": "count_distinct", "sum": "sum",
+                     "avg": "mean", "min": "min", "max": "max"}
+
+# Filtros de "where" como expresiones de pyarrow (mismos operadores que database_metrics)
+_ARROW_OPERATORS = {
+    "=": lambda field, value: field == value,
+    "!=": lambda field, value: field != value,
+    ">": lambda field, value: field > value,
+    ">=": lambda field, value: field >= value,
+    "<": lambda field, value: field < value,
+    "<=": lambda field, value: field <= value,
+    "in": lambda field, value: field.isin(value),
+    "not_in": lambda field, value: ~field.isin(value),
+    "is_null": lambda field, value: field.is_null() if value else field.is_valid(),
+}
+
+def _require_pyarrow():
+    if pa is None:
+        raise MetricError("La biblioteca pyarrow no está instalada. Instálala con: pip install pyarrow")
+
+def extract_query(table, columns=None, where=None, schema=None):
+    """SELECT de las columnas indicadas (todas si no se indican) con los filtros de "where"."""
+    where = where or {}
+    if columns:
+        source = sqlalchemy.table(table, *[sqlalchemy.column(name) for name in set(columns) | set(where)],
+                                  schema=schema)
+        query = sqlalchemy.select(*[source.c[name] for name in columns])
+    else:
+        source = sqlalchemy.table(table, *[sqlalchemy.column(name) for name in where], schema=schema)
+        query = sqlalchemy.select(sqlalchemy.text("*")).select_from(source)
+    for column, value in where.items():
+        query = query.where(build_condition(source, column, value))
+    return query
+
+def extract_path(db_url, query, directory=DB_EXTRACT_DIR, label="extract"):
+    """Ruta del extracto: nombre legible más el hash de la URL (sin credenciales) y la consulta."""
+    url = sqlalchemy.engine.make_url(db_url).render_as_string(hide_password=True)
+    compiled = query.compile()
+    params = json.dumps(compiled.params, sort_keys=True, default=str)
+    key = hashlib.sha256(f"{url}\n{compiled}\n{params}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(directory, f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', label)}-{key}.parquet")
+
+def table_column_types(engine, table, schema=None):
+    """Tipos de SQLAlchemy de las columnas de una tabla, reflejados con el inspector ({columna: tipo})."""
+    return {column["name"]: column["type"]
+            for column in sqlalchemy.inspect(engine).get_columns(table, schema=schema)}
+
+def _arrow_type(sql_type, dialect):
+    """Tipo de Arrow para un tipo de SQLAlchemy, o None si se deduce de los datos.
+
+    SQLite no tiene decimales, fechas ni horas nativos: el driver devuelve
+    float o texto, así que sus NUMERIC(p, s) se guardan como float64 y sus
+    TIME como texto. Un NUMERIC sin escala en SQLite es también el tipo de
+    los nombres de tipo que no reconoce (afinidad NUMERIC) y se deduce.
+    """
+    if isinstance(sql_type, sqlalchemy.Boolean):
+        return pa.bool_()
+    if isinstance(sql_type, sqlalchemy.Integer):
+        return pa.int64()
+    if isinstance(sql_type, sqlalchemy.Float):
+        return pa.float64()
+    if isinstance(sql_type, sqlalchemy.Numeric):
+        if dialect == "sqlite":
+            return None if sql_type.scale is None else pa.float64()
+        if sql_type.scale is None:
+            return pa.float64()
+        return pa.decimal128(38, sql_type.scale)
+    if isinstance(sql_type, sqlalchemy.DateTime):
+        return pa.timestamp("us", tz="UTC" if sql_type.timezone else None)
+    if isinstance(sql_type, sqlalchemy.Date):
+        return pa.date32()
+    if isinstance(sql_type, sqlalchemy.Time):
+        return pa.string() if dialect == "sqlite" else pa.time64("us")
+    if isinstance(sql_type, sqlalchemy.String):
+        return pa.string()
+    if isinstance(sql_type, sqlalchemy.LargeBinary):
+        return pa.binary()
+    return None
+
+def _as_text(values):
+    return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+def _column_array(name, values, arrow_type):
+    """Array de Arrow de una columna; un valor que no cabe en arrow_type sin pérdida es un error."""
+    try:
+        array = pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        if arrow_type is not None and not pa.types.is_string(arrow_type):
+            raise MetricError(f"La columna {name} tiene valores que no se pueden guardar como {arrow_type}")
+        return _as_text(values)
+    if arrow_type is None:
+        # Columna sin tipo conocido y vacía en el primer lote: se guarda como texto
+        return array.cast(pa.string()) if pa.types.is_null(array.type) else array
+    try:
+        # Conversión segura: falla en lugar de truncar (1.5 -> int64) o redondear decimales
+        return array.cast(arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+        if pa.types.is_string(arrow_type):
+            return _as_text(values)
+        raise MetricError(f"La columna {name} tiene valores que no caben en {arrow_type} sin pérdida: {e}")
+
+def _batch_table(columns, rows, types):
+    values = list(zip(*rows)) if rows else [[] for _ in columns]
+    arrays = [_column_array(name, column_values, arrow_type)
+              for name, column_values, arrow_type in zip(columns, values, types)]
+    return pa.Table.from_arrays(arrays, names=columns)
+
+def stream_to_parquet(engine, query, path, batch_rows=EXTRACT_BATCH_ROWS, statement_timeout_ms=None,
+                      column_types=None):
+    """Escribe el resultado de query en un Parquet, lote a lote, con un cursor del servidor.
+
+    Con stream_results (yield_per) el driver no descarga el resultado
+    completo: se piden batch_rows filas, se escriben como un grupo de filas
+    del Parquet y se descartan, de modo que la memoria no depende del
+    tamaño de la tabla. El esquema sale de column_types ({columna: tipo de
+    SQLAlchemy}, ver table_column_types); solo las columnas sin tipo conocido
+    se deducen del primer lote. Un valor que no cabe en el tipo de su
+    columna sin pérdida es un MetricError. El archivo se escribe en un
+    temporal y se publica al terminar.
+    """
+    _require_pyarrow()
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    writer = None
+    rows_written = 0
+    try:
+        with engine.connect() as conn:
+            if engine.dialect.name == "postgresql" and statement_timeout_ms:
+                conn.execute(sqlalchemy.text(f"SET LOCAL statement_timeout = {int(statement_timeout_ms)}"))
+            result = conn.execution_options(yield_per=batch_rows).execute(query)
+            columns = list(result.keys())
+            types = [_arrow_type((column_types or {}).get(name), engine.dialect.name) for name in columns]
+            for partition in result.partitions():
+                table = _batch_table(columns, partition, types)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, table.schema)
+                    types = table.schema.types
+                writer.write_table(table)
+                rows_written += len(partition)
+            if writer is None:
+                # Resultado vacío: Parquet sin filas (texto en las columnas sin tipo conocido)
+                table = _batch_table(columns, [], types)
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+                writer.write_table(table)
+        writer.close()
+        writer = None
+        os.replace(tmp_path, path)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return rows_written
+
+def read_extract(path, columns=None, filters=None):
+    """Tabla de Arrow de un extracto, leída con memory map."""
+    _require_pyarrow()
+    return pq.read_table(path, columns=columns, filters=filters, memory_map=True)
+
+def _arrow_operand(column, field_type, value):
+    """Operando de un filtro convertido al tipo de la columna en el extracto ("2024-01-01" en un timestamp)."""
+    operand = pa.array(list(value)) if isinstance(value, (list, tuple, set)) else pa.scalar(value)
+    if operand.type == field_type:
+        return operand
+    if pa.types.is_integer(field_type) and pa.types.is_floating(operand.type):
+        # Un decimal sobre una columna entera se compara como número, sin truncarlo
+        return operand
+    try:
+        return operand.cast(field_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+        raise MetricError(f"El valor {value!r} no es comparable con la columna {column} ({field_type}): {e}")
+
+def _arrow_filter(where, schema):
+    """Expresión de filtro de pyarrow equivalente al "where" de una métrica (None si no hay).
+
+    Los operandos se convierten al tipo de su columna en schema, el del
+    Parquet: pyarrow no compara, por ejemplo, un timestamp con un texto.
+    """
+    expression = None
+    for column, value in (where or {}).items():
+        if column not in schema.names:
+            raise MetricError(f"Columna del filtro que no está en el extracto: {column}")
+        field = pc.field(column)
+        field_type = schema.field(column).type
+        conditions = []
+        if isinstance(value, dict):
+            for operator, operand in value.items():
+                if operator not in _ARROW_OPERATORS:
+                    raise MetricError(f"Operador desconocido en {column}: {operator}")
+                if operator != "is_null" and operand is not None:
+                    operand = _arrow_operand(column, field_type, operand)
+                conditions.append(_ARROW_OPERATORS[operator](field, operand))
+        elif isinstance(value, list):
+            conditions.append(_ARROW_OPERATORS["in"](field, _arrow_operand(column, field_type, value)))
+        elif value is None:
+            conditions.append(field.is_null())
+        else:
+            conditions.append(field == _arrow_operand(column, field_type, value))
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+    return expression
+
+def aggregate_extract(path, metric):
+    """Calcula una métrica (misma definición que en database_metrics) sobre un extracto local.
+
+    Solo se leen, con memory map, las columnas que usa la métrica; el
+    resultado tiene la misma forma que run_metric.
+    """
+    _require_pyarrow()
+    start = time.perf_counter()
+    aggregates = metric.get("aggregates") or ["count"]
+    group_by = list(metric.get("group_by") or [])
+    bucket = metric.get("time_bucket")
+    where = metric.get("where") or {}
+
+    specs = []
+    for spec in aggregates:
+        spec = {spec: None} if isinstance(spec, str) else dict(spec)
+        label = spec.pop("as", None)
+        if len(spec) != 1:
+            raise MetricError(f"Agregado no válido: {spec}")
+        (function, column), = spec.items()
+        if function not in _ARROW_AGGREGATES:
+            raise MetricError(f"Agregado desconocido: {function} (válidos: {', '.join(_ARROW_AGGREGATES)})")
+        if column is None and function != "count":
+            raise MetricError(f"El agregado {function} necesita una columna")
+        specs.append((function, column, label or (f"{function}_{column}" if column else function)))
+
+    used = set(group_by) | {column for _, column, _ in specs if column}
+    if bucket:
+        used.add(bucket["column"])
+    schema = pq.read_schema(path, memory_map=True)
+    schema_names = schema.names
+    if not used:
+        used.add(schema_names[0])
+    missing = sorted(used - set(schema_names))
+    if missing:
+        raise MetricError(f"Columnas que no están en el extracto: {', '.join(missing)}")
+    table = read_extract(path, columns=sorted(used), filters=_arrow_filter(where, schema))
+
+    keys = list(group_by)
+    if bucket:
+        unit = bucket.get("unit", "month")
+        if unit not in TIME_UNITS:
+            raise MetricError(f"Unidad de tiempo desconocida: {unit} (válidas: {', '.join(TIME_UNITS)})")
+        values = table[bucket["column"]]
+        if not pa.types.is_temporal(values.type):
+            values = pc.cast(values, pa.timestamp("us"))
+        label = bucket.get("as", unit)
+        table = table.append_column(label, pc.floor_temporal(values, unit=unit, week_starts_monday=True))
+        keys.insert(0, label)
+
+    any_column = sorted(used)[0]
+    arrow_aggregates = []
+    for function, column, _ in specs:
+        if column is None:
+            arrow_aggregates.append((any_column, "count", pc.CountOptions(mode="all")))
+        else:
+            arrow_aggregates.append((column, _ARROW_AGGREGATES[function]))
+    grouped = table.group_by(keys).aggregate(arrow_aggregates)
+    # Según la versión de pyarrow las claves van antes o después de los agregados
+    if grouped.column_names[:len(keys)] != keys:
+        grouped = grouped.select(list(range(len(specs), len(specs) + len(keys))) + list(range(len(specs))))
+    grouped = grouped.rename_columns(keys + [label for _, _, label in specs])
+
+    order_by = metric.get("order_by")
+    if order_by:
+        name = order_by.lstrip("-")
+        if name not in grouped.column_names:
+            raise MetricError(f"order_by debe ser una columna o agregado de la métrica: {name}")
+        grouped = grouped.sort_by([(name, "descending" if order_by.startswith("-") else "ascending")])
+    elif keys:
+        grouped = grouped.sort_by([(key, "ascending") for key in keys])
+
+    limit = min(int(metric.get("limit") or MAX_GROUPS), MAX_GROUPS)
+    rows = [[json_value(value) for value in row.values()] for row in grouped.slice(0, limit).to_pylist()]
+    return {
+        "columns": grouped.column_names,
+        "rows": rows,
+        "truncated": grouped.num_rows > limit,
+        "seconds": round(time.perf_counter() - start, 3),
+        "source": "extract",
+    }
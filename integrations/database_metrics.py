@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import datetime
+from decimal import Decimal
+import sqlalchemy
+
+# Coste máximo estimado por el planificador (EXPLAIN) para ejecutar una métrica
+DB_METRIC_MAX_COST = float(os.getenv("DB_METRIC_MAX_COST", "10000000"))
+# Grupos devueltos como máximo por métrica
+MAX_GROUPS = 500
+
+AGGREGATES = {
+    "count": lambda column: sqlalchemy.func.count(column) if column is not None else sqlalchemy.func.count(),
+    "count_distinct": lambda column: sqlalchemy.func.count(sqlalchemy.distinct(column)),
+    "sum": sqlalchemy.func.sum,
+    "avg": sqlalchemy.func.avg,
+    "min": sqlalchemy.func.min,
+    "max": sqlalchemy.func.max,
+}
+TIME_UNITS = ("hour", "day", "week", "month", "quarter", "year")
+# Formatos de strftime de SQLite equivalentes a date_trunc
+_SQLITE_BUCKETS = {
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d",
+    "month": "%Y-%m-01",
+    "year": "%Y-01-01",
+}
+
+def _param(value):
+    """Parámetro sin tipo: la base de datos lo convierte al tipo de la columna (p. ej. fechas en texto)."""
+    if isinstance(value, list):
+        return [_param(item) for item in value]
+    return sqlalchemy.bindparam(None, value, type_=sqlalchemy.types.NullType())
+
+_OPERATORS = {
+    "=": lambda column, value: column == _param(value),
+    "!=": lambda column, value: column != _param(value),
+    ">": lambda column, value: column > _param(value),
+    ">=": lambda column, value: column >= _param(value),
+    "<": lambda column, value: column < _param(value),
+    "<=": lambda column, value: column <= _param(value),
+    "in": lambda column, value: column.in_(_param(list(value))),
+    "not_in": lambda column, value: column.not_in(_param(list(value))),
+    "is_null": lambda column, value: column.is_(None) if value else column.is_not(None),
+}
+
+class MetricError(Exception):
+    """Definición de métrica no válida o rechazada por el límite de coste."""
+
+def load_metrics(path):
+    """Carga definiciones de métricas de un archivo YAML o JSON (lista o {"metrics": [...]})."""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise MetricError("La biblioteca PyYAML no está instalada. Instálala con: pip install pyyaml")
+            metrics = yaml.safe_load(f)
+        else:
+            metrics = json.load(f)
+    if isinstance(metrics, dict):
+        metrics = metrics.get("metrics", [])
+    return metrics
+
+def _time_bucket(dialect, column, unit):
+    if unit not in TIME_UNITS:
+        raise MetricError(f"Unidad de tiempo desconocida: {unit} (válidas: {', '.join(TIME_UNITS)})")
+    # unit y los formatos son valores fijos: van como literales para que el
+    # GROUP BY repita exactamente la misma expresión que el SELECT
+    if dialect == "postgresql":
+        return sqlalchemy.func.date_trunc(sqlalchemy.literal_column(f"'{unit}'"), column)
+    if dialect == "sqlite" and unit in _SQLITE_BUCKETS:
+        return sqlalchemy.func.strftime(sqlalchemy.literal_column(f"'{_SQLITE_BUCKETS[unit]}'"), column)
+    raise MetricError(f"Agrupación por '{unit}' no disponible en {dialect}")
+
+def _aggregate(spec, table):
+    """Expresión de agregado a partir de "count" o {"sum": "importe"} (con "as" opcional)."""
+    if isinstance(spec, str):
+        spec = {spec: None}
+    spec = dict(spec)
+    label = spec.pop("as", None)
+    if len(spec) != 1:
+        raise MetricError(f"Agregado no válido: {spec}")
+    (function, column), = spec.items()
+    if function not in AGGREGATES:
+        raise MetricError(f"Agregado desconocido: {function} (válidos: {', '.join(AGGREGATES)})")
+    if column is None and function != "count":
+        raise MetricError(f"El agregado {function} necesita una columna")
+    expression = AGGREGATES[function](table.c[column] if column is not None else None)
+    return expression.label(label or (f"{function}_{column}" if column else function))
+
+def build_condition(table, column, value):
+    """Filtro de "where": valor (igualdad), lista (IN) o {operador: valor}."""
+    if isinstance(value, dict):
+        conditions = []
+        for operator, operand in value.items():
+            if operator not in _OPERATORS:
+                raise MetricError(f"Operador desconocido en {column}: {operator}")
+            conditions.append(_OPERATORS[operator](table.c[column], operand))
+        return sqlalchemy.and_(*conditions)
+    if isinstance(value, list):
+        return _OPERATORS["in"](table.c[column], value)
+    if value is None:
+        return table.c[column].is_(None)
+    return _OPERATORS["="](table.c[column], value)
+
+def metric_columns(metric):
+    """Columnas que usa una métrica: agrupación, franja temporal, filtros y agregados."""
+    used = set(metric.get("group_by") or []) | set(metric.get("where") or {})
+    bucket = metric.get("time_bucket")
+    if bucket:
+        used.add(bucket["column"])
+    for spec in metric.get("aggregates") or ["count"]:
+        if isinstance(spec, dict):
+            used.update(column for key, column in spec.items() if key != "as" and column is not None)
+    return used
+
+def compile_metric(metric, dialect="postgresql"):
+    """Construye la consulta SELECT ... GROUP BY de una métrica declarativa.
+
+    metric es un dict con:
+      - table: tabla (con "schema" opcional)
+      - aggregates: lista de "count" o {función: columna}, con "as" opcional
+      - group_by: columnas de agrupación (opcional)
+      - time_bucket: {"column", "unit"} para agrupar por hora/día/semana/mes/trimestre/año
+      - where: {columna: valor | [valores] | {operador: valor}} (opcional)
+      - order_by: etiqueta de un agregado o columna; con "-" delante, descendente
+      - limit: grupos como máximo (por defecto y como tope, MAX_GROUPS)
+
+    Los identificadores se citan y los valores van como parámetros, nunca
+    interpolados en el SQL.
+    """
+    if not metric.get("table"):
+        raise MetricError("La métrica necesita 'table'")
+    aggregates = metric.get("aggregates") or ["count"]
+    group_by = list(metric.get("group_by") or [])
+    bucket = metric.get("time_bucket")
+    where = metric.get("where") or {}
+
+    # Tabla ligera con las columnas usadas; la base de datos valida que existan
+    used = metric_columns(metric)
+    table = sqlalchemy.table(metric["table"], *[sqlalchemy.column(name) for name in sorted(used)],
+                             schema=metric.get("schema"))
+
+    keys = []
+    if bucket:
+        keys.append(_time_bucket(dialect, table.c[bucket["column"]], bucket.get("unit", "month"))
+                    .label(bucket.get("as", f"{bucket.get('unit', 'month')}")))
+    keys.extend(table.c[column] for column in group_by)
+    selected = keys + [_aggregate(spec, table) for spec in aggregates]
+
+    query = sqlalchemy.select(*selected).select_from(table)
+    for column, value in where.items():
+        query = query.where(build_condition(table, column, value))
+    if keys:
+        query = query.group_by(*keys)
+
+    order_by = metric.get("order_by")
+    if order_by:
+        labels = {column.name: column for column in selected}
+        name = order_by.lstrip("-")
+        if name not in labels:
+            raise MetricError(f"order_by debe ser una columna o agregado de la métrica: {name}")
+        column = labels[name]
+        query = query.order_by(column.desc() if order_by.startswith("-") else column.asc())
+    elif keys:
+        query = query.order_by(*keys)
+
+    limit = min(int(metric.get("limit") or MAX_GROUPS), MAX_GROUPS)
+    # Se pide un grupo más para saber si el resultado está recortado
+    return query.limit(limit + 1), limit
+
+def json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+def explain_cost(conn, query):
+    """Coste total estimado por el planificador de PostgreSQL para la consulta."""
+    compiled = query.compile(dialect=conn.dialect)
+    plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]["Total Cost"]
+
+def run_metric(engine, metric, statement_timeout_ms=None, max_cost=DB_METRIC_MAX_COST):
+    """Ejecuta una métrica en la base de datos y devuelve solo el resultado agregado.
+
+    En PostgreSQL, antes de ejecutarla se consulta su coste con EXPLAIN y se
+    rechaza si supera max_cost; la ejecución tiene statement_timeout.
+    """
+    query, limit = compile_metric(metric, engine.dialect.name)
+    start = time.perf_counter()
+    result = {}
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            if statement_timeout_ms:
+                conn.execute(sqlalchemy.text(f"SET LOCAL statement_timeout = {int(statement_timeout_ms)}"))
+            cost = explain_cost(conn, query)
+            result["estimated_cost"] = cost
+            if max_cost and cost > max_cost:
+                raise MetricError(f"Coste estimado {cost:,.0f} superior al límite {max_cost:,.0f}; "
+                                  "añade filtros o reduce la agrupación")
+        rows = conn.execute(query)
+        columns = list(rows.keys())
+        data = [[json_value(value) for value in row] for row in rows.fetchall()]
+    result.update({
+        "columns": columns,
+        "rows": data[:limit],
+        "truncated": len(data) > limit,
+        "seconds": round(time.perf_counter() - start, 3),
+    })
+    return result
+
+def find_extract(metric, extracts):
+    """Extracto con el que se puede calcular la métrica, o None.
+
+    Solo sirve un extracto de la tabla completa: de la misma tabla y
+    esquema, sin "where" y con todas las columnas que usa la métrica (ver
+    DatabaseIntegration.extract_tables). Con un extracto filtrado el
+    resultado sería distinto del de la base de datos.
+    """
+    used = metric_columns(metric)
+    for extract in (extracts or {}).values():
+        if (extract.get("table") != metric.get("table") or extract.get("schema") != metric.get("schema")
+                or extract.get("where")):
+            continue
+        if extract.get("columns") is None or used <= set(extract["columns"]):
+            return extract
+    return None
+
+def run_metrics(engine, metrics, statement_timeout_ms=None, max_cost=DB_METRIC_MAX_COST, extracts=None):
+    """Ejecuta varias métricas: {nombre: resultado}; los errores quedan en "error" por métrica.
+
+    Las métricas que se pueden calcular con uno de extracts (ver
+    find_extract e integrations/database_extract.py) se calculan sobre el
+    Parquet local sin volver a consultar la base de datos; el resto, en la
+    base de datos.
+    """
+    results = {}
+    for i, metric in enumerate(metrics, 1):
+        name = metric.get("name") or f"metrica_{i}"
+        try:
+            extract = find_extract(metric, extracts)
+            if extract is not None:
+                from integrations.database_extract import aggregate_extract
+                results[name] = aggregate_extract(extract["path"], metric)
+            else:
+                results[name] = run_metric(engine, metric, statement_timeout_ms, max_cost)
+        except sqlalchemy.exc.SQLAlchemyError as e:
+            # Solo el mensaje del servidor, sin el SQL ni los parámetros
+            results[name] = {"error": str(getattr(e, "orig", None) or e).strip().split("\n")[0]}
+        except (MetricError, KeyError, ValueError, NotImplementedError) as e:
+            results[name] = {"error": str(e)}
+        results[name]["definition"] = {key: value for key, value in metric.items() if key != "name"}
+    return results
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import sqlalchemy
+
+# Carpeta de la caché de metadatos reflejados
+DB_SCHEMA_CACHE_DIR = os.getenv("DB_SCHEMA_CACHE_DIR", os.path.join(".cache", "db_schema"))
+
+# Huella de la estructura del esquema en PostgreSQL: relaciones, columnas y
+# restricciones. Cambia con cualquier DDL (CREATE/ALTER/DROP) y se calcula en
+# una sola consulta al catálogo, sin leer las tablas.
+_POSTGRES_FINGERPRINT_SQL = """
+    SELECT md5(coalesce(string_agg(item, ',' ORDER BY item), '')) FROM (
+        SELECT concat_ws(':', c.oid, c.relname, c.relkind, a.attnum, a.attname, a.atttypid,
+                         a.atttypmod, a.attnotnull) AS item
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+        WHERE n.nspname = :schema AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+        UNION ALL
+        SELECT concat_ws(':', k.conrelid, k.conname, k.contype, k.confrelid)
+        FROM pg_constraint k
+        JOIN pg_namespace n ON n.oid = k.connamespace
+        WHERE n.nspname = :schema
+    ) items
+"""
+_POSTGRES_ROW_ESTIMATES_SQL = """
+    SELECT c.relname, c.reltuples::bigint
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = :schema AND c.relkind IN ('r', 'p', 'm', 'f')
+"""
+_SQLITE_FINGERPRINT_SQL = """
+    SELECT group_concat(type || name || coalesce(sql, ''), char(10))
+    FROM (SELECT type, name, sql FROM sqlite_master ORDER BY type, name)
+"""
+
+_lock = threading.Lock()
+
+def schema_fingerprint(conn, schema=None):
+    """Huella barata de la estructura del esquema, o None si el dialecto no la admite.
+
+    PostgreSQL: hash de pg_class, pg_attribute y pg_constraint. SQLite:
+    PRAGMA schema_version más un hash de las definiciones de sqlite_master;
+    schema_version sola no basta porque se puede reescribir (o coincidir
+    tras recrear el archivo) con un esquema distinto.
+    """
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        return conn.execute(sqlalchemy.text(_POSTGRES_FINGERPRINT_SQL),
+                            {"schema": schema or "public"}).scalar()
+    if dialect == "sqlite":
+        version = conn.exec_driver_sql("PRAGMA schema_version").scalar()
+        definitions = conn.exec_driver_sql(_SQLITE_FINGERPRINT_SQL).scalar() or ""
+        return f"{version}-{hashlib.sha256(definitions.encode('utf-8')).hexdigest()[:16]}"
+    return None
+
+def _row_estimates(conn, schema=None):
+    if conn.dialect.name != "postgresql":
+        return {}
+    rows = conn.execute(sqlalchemy.text(_POSTGRES_ROW_ESTIMATES_SQL), {"schema": schema or "public"})
+    # reltuples es -1 (o 0 en versiones antiguas) si la tabla nunca se ha analizado
+    return {name: estimate if estimate and estimate > 0 else None for name, estimate in rows}
+
+def reflect_schema(conn, schema=None):
+    """Refleja tablas, columnas, tipos, claves y filas estimadas con las consultas por lotes del inspector.
+
+    Devuelve {tabla: {"columns": [{"name", "type", "nullable"}], "primary_key",
+    "foreign_keys": [{"columns", "referred_table", "referred_columns"}], "row_estimate"}}.
+    """
+    inspector = sqlalchemy.inspect(conn)
+    table_names = inspector.get_table_names(schema=schema)
+    # get_multi_* resuelve todo el esquema en unas pocas consultas en lugar de varias por tabla
+    columns = inspector.get_multi_columns(schema=schema, filter_names=table_names)
+    primary_keys = inspector.get_multi_pk_constraint(schema=schema, filter_names=table_names)
+    foreign_keys = inspector.get_multi_foreign_keys(schema=schema, filter_names=table_names)
+    estimates = _row_estimates(conn, schema)
+
+    tables = {}
+    for name in table_names:
+        key = (schema, name)
+        tables[name] = {
+            "columns": [
+                {"name": column["name"], "type": str(column["type"]), "nullable": column.get("nullable", True)}
+                for column in columns.get(key, [])
+            ],
+            "primary_key": (primary_keys.get(key) or {}).get("constrained_columns", []),
+            "foreign_keys": [
+                {
+                    "columns": fk["constrained_columns"],
+                    "referred_table": fk["referred_table"],
+                    "referred_columns": fk["referred_columns"],
+                }
+                for fk in foreign_keys.get(key, [])
+            ],
+            "row_estimate": estimates.get(name),
+        }
+    return tables
+
+class SchemaCache:
+    """Caché en disco de los metadatos reflejados de una base de datos.
+
+    Hay un JSON por URL (sin contraseña) y esquema con la huella con la que
+    se reflejó. Con el esquema sin cambios, load() cuesta dos consultas: la
+    de la huella y la de las filas estimadas, que cambian sin DDL y por eso
+    no se guardan. Si la huella difiere, o el dialecto no permite calcularla,
+    se vuelve a reflejar y se guarda el resultado.
+    """
+
+    def __init__(self, directory=DB_SCHEMA_CACHE_DIR):
+        self.directory = directory
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _path(self, db_url, schema):
+        url = sqlalchemy.engine.make_url(db_url).render_as_string(hide_password=True)
+        key = hashlib.sha256(json.dumps([url, schema]).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, path, entry):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def load(self, engine, db_url, schema=None):
+        """Metadatos del esquema (ver reflect_schema), de la caché si la huella no ha cambiado."""
+        path = self._path(db_url, schema)
+        with engine.connect() as conn:
+            fingerprint = schema_fingerprint(conn, schema)
+            entry = self._read(path)
+            if fingerprint is not None and entry and entry.get("fingerprint") == fingerprint:
+                with _lock:
+                    self.stats["hits"] += 1
+                tables = entry["tables"]
+                estimates = _row_estimates(conn, schema)
+                for name, table in tables.items():
+                    table["row_estimate"] = estimates.get(name)
+                return tables
+
+            with _lock:
+                self.stats["misses"] += 1
+            tables = reflect_schema(conn, schema)
+        if fingerprint is not None:
+            # Solo la estructura: las filas estimadas se leen de nuevo en cada carga
+            cached = {name: {**table, "row_estimate": None} for name, table in tables.items()}
+            self._write(path, {"fingerprint": fingerprint, "reflected_at": time.time(), "tables": cached})
+        return tables
+
+schema_cache = SchemaCache()
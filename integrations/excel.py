@@ -1,55 +1,248 @@
 import os
+import re
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
 import pandas as pd
+from integrations.excel_catalog import ExcelCatalog, CATALOG_PATH
+from services.tracing import traced, record
 
 DATA_DIR = "data"
 MAX_SHEETS = 10
+# Filas de cada hoja que se envían en el informe
+MAX_ROWS = 100
+# Bytes del inicio de cada hoja en los que se busca la etiqueta <dimension>
+DIMENSION_PROBE_BYTES = 4096
+
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_DIMENSION = re.compile(rb'<(?:\w+:)?dimension ref="([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?"')
+
+def _column_number(letters):
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - 64
+    return number
+
+def xlsx_sheet_dimensions(file_path):
+    """Nombres y dimensiones de las hojas de un .xlsx leyendo solo los metadatos.
+
+    Lee workbook.xml y los primeros bytes de cada hoja, donde Excel declara
+    su rango (<dimension>), sin descomprimir ni analizar las celdas.
+    Devuelve [{"name", "rows", "columns"}]; rows excluye la cabecera y es
+    None (igual que columns) si la hoja no declara su rango.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+        relations = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+        targets = {rel.get("Id"): rel.get("Target") for rel in relations.iter(f"{_PACKAGE_REL_NS}Relationship")}
+
+        sheets = []
+        for sheet in workbook.iter(f"{_MAIN_NS}sheet"):
+            target = targets.get(sheet.get(f"{_REL_NS}id"), "")
+            path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+            rows = columns = None
+            try:
+                with archive.open(path) as sheet_file:
+                    match = _DIMENSION.search(sheet_file.read(DIMENSION_PROBE_BYTES))
+            except KeyError:
+                match = None
+            if match:
+                first_column, first_row, last_column, last_row = match.groups()
+                last_column, last_row = last_column or first_column, last_row or first_row
+                rows = int(last_row) - int(first_row)
+                columns = _column_number(last_column.decode()) - _column_number(first_column.decode()) + 1
+            sheets.append({"name": sheet.get("name"), "rows": rows, "columns": columns})
+    return sheets
+
+def _column_names(header):
+    """Nombres de columna a partir de la fila de cabecera, como los genera pandas."""
+    names = []
+    seen = {}
+    for i, value in enumerate(header):
+        name = f"Unnamed: {i}" if value is None else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def _sheet_records(worksheet, max_rows=None):
+    rows = worksheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = _column_names(header)
+    count = 0
+    for row in rows:
+        if max_rows is not None and count >= max_rows:
+            break
+        if all(value is None for value in row):
+            continue
+        yield dict(zip(columns, row))
+        count += 1
+
+def _open_workbook(file_path):
+    from openpyxl import load_workbook
+    return load_workbook(file_path, read_only=True, data_only=True)
+
+def iter_sheet_rows(file_path, sheet_name, max_rows=None):
+    """Recorre las filas de una hoja .xlsx como diccionarios, sin cargar el libro.
+
+    Usa el modo de solo lectura de openpyxl, que analiza el XML de la hoja
+    a medida que se avanza; con max_rows la lectura se detiene en cuanto
+    se han obtenido esas filas. Las filas vacías se omiten.
+    """
+    workbook = _open_workbook(file_path)
+    try:
+        if sheet_name not in workbook.sheetnames:
+            raise KeyError(sheet_name)
+        yield from _sheet_records(workbook[sheet_name], max_rows)
+    finally:
+        workbook.close()
+
+def read_sheets(file_path, sheet_names, max_rows=None):
+    """Lee las primeras max_rows filas de varias hojas .xlsx abriendo el libro una sola vez."""
+    workbook = _open_workbook(file_path)
+    try:
+        data = {}
+        for sheet_name in sheet_names:
+            if sheet_name not in workbook.sheetnames:
+                raise KeyError(sheet_name)
+            data[sheet_name] = list(_sheet_records(workbook[sheet_name], max_rows))
+        return data
+    finally:
+        workbook.close()
 
 class ExcelIntegration:
     def __init__(self, config=None):
         self.config = config
+        self.catalog_path = (config or {}).get("catalog_path") or CATALOG_PATH
+        self.catalog = None
+
+    def _catalog(self):
+        if self.catalog is None:
+            self.catalog = ExcelCatalog(DATA_DIR, self.catalog_path)
+        return self.catalog
 
     def verify_connection(self):
-        """Verifica si la carpeta de datos existe."""
+        """Verifica si la carpeta de datos existe y actualiza su catálogo.
+
+        La actualización es incremental: solo se leen los archivos nuevos o
+        modificados desde la anterior (ver integrations/excel_catalog.py).
+        """
         if not os.path.exists(DATA_DIR):
             os.makedirs(DATA_DIR)
-        files = [f for f in os.listdir(DATA_DIR) if f.endswith(('.xlsx', '.xls'))]
-        if files:
-            return True, "Conexión exitosa a la carpeta de datos."
+        counts = self._catalog().refresh()
+        if counts["total"]:
+            return True, (f"Conexión exitosa a la carpeta de datos ({counts['total']} archivos, "
+                          f"{counts['added'] + counts['updated']} nuevos o modificados).")
         else:
             return True, "Carpeta de datos lista, pero no se encontraron archivos Excel."
 
-    def get_files(self):
-        """Lista los archivos Excel en la carpeta 'data'."""
+    def get_files(self, pattern=None, modified_after=None, modified_before=None, sheet=None):
+        """Lista los archivos Excel de la carpeta 'data' y sus subcarpetas según el catálogo.
+
+        Devuelve rutas relativas a la carpeta. Los filtros son los de
+        ExcelCatalog.find: patrón glob del nombre o la ruta, fechas de
+        modificación y nombre de hoja. Llamar antes a verify_connection para
+        que el catálogo esté al día.
+        """
         if not os.path.exists(DATA_DIR):
             os.makedirs(DATA_DIR)
-        files = [f for f in os.listdir(DATA_DIR) if f.endswith(('.xlsx', '.xls'))]
+        entries = self._catalog().find(pattern, modified_after, modified_before, sheet)
+        files = [entry["path"] for entry in entries]
         if files:
             return files, "Archivos Excel encontrados."
         else:
             return [], "No se encontraron archivos Excel en la carpeta 'data'."
 
-    def fetch_data(self, file_name):
-        """Lee hasta 10 hojas de un archivo Excel y retorna un dict con los datos."""
+    def list_sheets(self, file_name):
+        """Lista las hojas de un archivo con sus dimensiones, sin leer las celdas.
+
+        Devuelve ([{"name", "rows", "columns"}], mensaje). En .xlsx las
+        dimensiones salen de los metadatos de cada hoja y pueden ser None si
+        el archivo no las declara; en .xls solo se obtienen los nombres. Si el
+        archivo está al día en el catálogo, no se abre.
+        """
+        file_path = os.path.join(DATA_DIR, file_name)
+        if not os.path.exists(file_path):
+            return None, "Archivo no encontrado."
+        catalogued = self._catalog().sheets(file_name)
+        if catalogued is not None:
+            return catalogued, "Hojas encontradas."
+        try:
+            if not file_path.endswith(".xlsx"):
+                names = pd.ExcelFile(file_path).sheet_names
+                return [{"name": name, "rows": None, "columns": None} for name in names], "Hojas encontradas."
+            return xlsx_sheet_dimensions(file_path), "Hojas encontradas."
+        except Exception as e:
+            return None, f"Error al leer el archivo: {e}"
+
+    @traced("excel.fetch")
+    def fetch_data(self, file_name, sheets=None, max_rows=MAX_ROWS):
+        """Lee las primeras max_rows filas de las hojas indicadas y retorna un dict con los datos.
+
+        Sin sheets se leen las MAX_SHEETS primeras hojas. Solo se analizan
+        las hojas pedidas y la lectura de cada una se detiene tras max_rows
+        filas, por lo que el tamaño total del libro no influye. Las hojas
+        guardadas en la caché columnar (integrations/excel_cache.py) se leen
+        de ella.
+        """
         file_path = os.path.join(DATA_DIR, file_name)
         if not os.path.exists(file_path):
             return None, "Archivo no encontrado."
         try:
-            xls = pd.ExcelFile(file_path)
-            sheets = {}
-            for i, sheet_name in enumerate(xls.sheet_names):
-                if i >= MAX_SHEETS:
-                    break
-                df = xls.parse(sheet_name)
-                sheets[sheet_name] = df.head(100).to_dict(orient="records")
-            return sheets, "Datos leídos correctamente."
+            if sheets is None:
+                available, message = self.list_sheets(file_name)
+                if available is None:
+                    return None, message
+                sheets = [sheet["name"] for sheet in available[:MAX_SHEETS]]
+
+            # Las hojas con copia en caché se leen del Parquet; el resto, del libro
+            from integrations.excel_cache import sheet_cache, read_records
+            cached = {sheet_name: sheet_cache.get(file_path, sheet_name) for sheet_name in sheets}
+            pending = [sheet_name for sheet_name in sheets if cached[sheet_name] is None]
+
+            if not pending:
+                data = {}
+            elif file_path.endswith(".xlsx"):
+                data = read_sheets(file_path, pending, max_rows)
+            else:
+                data = {}
+                for sheet_name in pending:
+                    df = pd.read_excel(file_path, sheet_name=sheet_name, nrows=max_rows)
+                    data[sheet_name] = df.to_dict(orient="records")
+            data = {sheet_name: data[sheet_name] if cached[sheet_name] is None
+                    else read_records(cached[sheet_name], max_rows)
+                    for sheet_name in sheets}
+            record(file=file_name, bytes=os.path.getsize(file_path), sheets=len(sheets),
+                   cached_sheets=len(sheets) - len(pending), rows=sum(len(rows) for rows in data.values()))
+            return data, "Datos leídos correctamente."
+        except KeyError as e:
+            return None, f"La hoja '{e.args[0]}' no existe en {file_name}"
         except Exception as e:
             return None, f"Error al leer el archivo: {e}"
 
-    def generate_report_data(self, data):
-        """Solicita contexto al usuario y prepara los datos para el informe."""
-        print("\nPor favor, describe brevemente el contexto del archivo Excel y la información relevante que contiene:")
-        context = input("Contexto: ")
-        return {
+    @traced("excel.prepare")
+    def generate_report_data(self, data, context=None, file_name=None, sheets=None):
+        """Solicita contexto al usuario (si no se indica) y prepara los datos para el informe.
+
+        Con file_name se añade "perfil_hojas": un perfil estadístico de las
+        hojas completas indicadas en sheets (integrations/excel_profile.py),
+        ya que "hojas" solo contiene sus primeras filas.
+        """
+        if context is None:
+            print("\nPor favor, describe brevemente el contexto del archivo Excel y la información relevante que contiene:")
+            context = input("Contexto: ")
+        report_data = {
             "contexto_usuario": context,
             "hojas": data
-        }
\ No newline at end of file
+        }
+        if file_name and sheets and (self.config or {}).get("profile", True):
+            from integrations.excel_profile import profile_workbook
+            report_data["perfil_hojas"] = profile_workbook(os.path.join(DATA_DIR, file_name), sheets)
+        return report_data
\ No newline at end of file
@@ -0,0 +1,166 @@
+import os
+import json
+import hashlib
+import threading
+from config import EXCEL_CONFIG
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+class SidecarSchemaError(Exception):
+    """Un bloque de la hoja tiene tipos mezclados o no encaja en los tipos del primer bloque."""
+
+class SheetCache:
+    """Caché columnar (Parquet) de las hojas de Excel ya leídas.
+
+    Cada hoja se guarda en un archivo cuyo nombre es el SHA-256 de la ruta
+    absoluta, el tamaño y la fecha de modificación del libro y el nombre de
+    la hoja: si el libro cambia, la clave cambia y la entrada antigua deja
+    de usarse hasta que la elimina el límite de tamaño (LRU según la fecha
+    de modificación del archivo, que se actualiza en cada acierto).
+    Los archivos se leen con memory map.
+    """
+
+    def __init__(self, directory, max_bytes, enabled=True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled and pa is not None
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    def _path(self, file_path, sheet_name):
+        stat = os.stat(file_path)
+        canonical = json.dumps([os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, sheet_name],
+                               ensure_ascii=False)
+        key = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{key}.parquet")
+
+    def get(self, file_path, sheet_name):
+        """Ruta del Parquet de la hoja si está en caché y al día, o None."""
+        if not self.enabled:
+            return None
+        path = self._path(file_path, sheet_name)
+        try:
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        with self._lock:
+            self.stats["hits"] += 1
+        return path
+
+    def writer(self, file_path, sheet_name):
+        """Escritor por bloques para guardar una hoja en caché (None si la caché está desactivada)."""
+        if not self.enabled:
+            return None
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+        return SheetCacheWriter(self, self._path(file_path, sheet_name))
+
+    def evict(self):
+        """Elimina las hojas usadas hace más tiempo hasta cumplir max_bytes."""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".parquet"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            entries.sort()
+            total_bytes = sum(size for _, size, _ in entries)
+            while entries and total_bytes > self.max_bytes:
+                _, size, path = entries.pop(0)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total_bytes -= size
+
+class SheetCacheWriter:
+    """Escribe una hoja en Parquet bloque a bloque mientras se recorre.
+
+    Los tipos de las columnas se fijan con el primer bloque (las columnas
+    vacías se guardan como texto). Una columna con tipos mezclados no se
+    puede guardar sin cambiar sus valores, así que la hoja no se guarda: si
+    un bloque tiene una o no encaja en los tipos del primero, la escritura
+    se abandona sin dejar archivo.
+    """
+
+    def __init__(self, cache, path):
+        self.cache = cache
+        self.path = path
+        self.tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        self.schema = None
+        self.parquet = None
+
+    def _first_table(self, frame):
+        arrays = []
+        for column in frame.columns:
+            try:
+                array = pa.array(frame[column], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                raise SidecarSchemaError(f"columna {column} con tipos mezclados: {e}")
+            if pa.types.is_null(array.type):
+                array = array.cast(pa.string())
+            arrays.append(array)
+        return pa.Table.from_arrays(arrays, names=[str(column) for column in frame.columns])
+
+    def _next_table(self, frame):
+        arrays = []
+        for field in self.schema:
+            try:
+                arrays.append(pa.array(frame[field.name], type=field.type, from_pandas=True))
+            except (pa.ArrowInvalid, pa.ArrowTypeError, KeyError) as e:
+                raise SidecarSchemaError(f"columna {field.name}: {e}")
+        return pa.Table.from_arrays(arrays, schema=self.schema)
+
+    def write(self, frame):
+        """Añade un bloque (DataFrame) de la hoja."""
+        if self.schema is None:
+            table = self._first_table(frame)
+            self.schema = table.schema
+            self.parquet = pq.ParquetWriter(self.tmp_path, self.schema)
+        else:
+            table = self._next_table(frame)
+        self.parquet.write_table(table)
+
+    def commit(self):
+        """Publica el archivo completo en la caché y aplica el límite de tamaño."""
+        if self.parquet is None:
+            return
+        self.parquet.close()
+        os.replace(self.tmp_path, self.path)
+        self.cache.evict()
+
+    def abort(self):
+        if self.parquet is not None:
+            self.parquet.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+def read_records(path, max_rows=None):
+    """Primeras max_rows filas de una hoja en caché como lista de diccionarios."""
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    if max_rows is None:
+        return parquet_file.read().to_pylist()
+    for batch in parquet_file.iter_batches(batch_size=max_rows):
+        return batch.to_pylist()
+    return []
+
+def iter_frames(path, chunk_rows):
+    """Recorre una hoja en caché en DataFrames de chunk_rows filas."""
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+        yield batch.to_pandas()
+
+sheet_cache = SheetCache(
+    EXCEL_CONFIG["cache_dir"],
+    EXCEL_CONFIG["cache_max_bytes"],
+    enabled=EXCEL_CONFIG["cache_enabled"],
+)
@@ -0,0 +1,233 @@
+import os
+import fnmatch
+import hashlib
+import sqlite3
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+CATALOG_PATH = os.path.join(".cache", "excel_catalog.sqlite")
+EXCEL_EXTENSIONS = (".xlsx", ".xls")
+# Hilos para leer los archivos nuevos o modificados (útil en unidades de red)
+INDEX_WORKERS = 4
+HASH_BLOCK_BYTES = 1024 * 1024
+
+def _content_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _sheet_dimensions(file_path):
+    if file_path.endswith(".xlsx"):
+        from integrations.excel import xlsx_sheet_dimensions
+        return xlsx_sheet_dimensions(file_path)
+    with pd.ExcelFile(file_path) as workbook:
+        return [{"name": name, "rows": None, "columns": None} for name in workbook.sheet_names]
+
+def _inspect(file_path):
+    """Hash y hojas de un archivo; los errores de lectura se guardan en el catálogo."""
+    try:
+        content_hash = _content_hash(file_path)
+    except OSError as e:
+        return None, [], str(e)
+    try:
+        return content_hash, _sheet_dimensions(file_path), None
+    except Exception as e:
+        return content_hash, [], str(e)
+
+def _timestamp(value):
+    """Acepta datetime, fecha ISO o segundos y devuelve nanosegundos desde la época."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        value = value.timestamp()
+    return int(value * 1_000_000_000)
+
+class ExcelCatalog:
+    """Catálogo persistente (SQLite) de los libros de Excel de la carpeta de datos.
+
+    Recorre la carpeta de forma recursiva y guarda, por archivo, su tamaño,
+    fecha de modificación, hash SHA-256 del contenido y sus hojas con sus
+    dimensiones. refresh() solo vuelve a leer los archivos cuyo tamaño o
+    fecha de modificación han cambiado, y find() consulta el catálogo sin
+    recorrer la carpeta.
+    """
+
+    def __init__(self, data_dir, path=CATALOG_PATH):
+        self.data_dir = data_dir
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                root TEXT NOT NULL,
+                path TEXT NOT NULL,
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                hash TEXT,
+                error TEXT,
+                PRIMARY KEY (root, path)
+            );
+            CREATE TABLE IF NOT EXISTS sheets (
+                root TEXT NOT NULL,
+                path TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                rows INTEGER,
+                columns INTEGER,
+                PRIMARY KEY (root, path, position)
+            );
+            CREATE INDEX IF NOT EXISTS files_mtime ON files (root, mtime_ns);
+            CREATE INDEX IF NOT EXISTS sheets_name ON sheets (root, name COLLATE NOCASE);
+        """)
+        self.conn.commit()
+        self.root = os.path.abspath(data_dir)
+
+    def _scan(self):
+        """Rutas relativas (con "/") de los libros de la carpeta con su os.stat."""
+        found = {}
+        for directory, subdirectories, files in os.walk(self.data_dir):
+            subdirectories[:] = [name for name in subdirectories if not name.startswith(".")]
+            for name in files:
+                # "~$..." son los archivos de bloqueo que deja Excel abiertos
+                if not name.lower().endswith(EXCEL_EXTENSIONS) or name.startswith("~$"):
+                    continue
+                file_path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                relative = os.path.relpath(file_path, self.data_dir).replace(os.sep, "/")
+                found[relative] = stat
+        return found
+
+    def refresh(self):
+        """Sincroniza el catálogo con la carpeta y devuelve el recuento de cambios.
+
+        Los archivos con el mismo tamaño y fecha de modificación no se abren.
+        Si solo cambió la fecha pero el hash es el mismo, se conservan sus hojas.
+        """
+        found = self._scan()
+        known = {
+            path: (size, mtime_ns, content_hash)
+            for path, size, mtime_ns, content_hash in self.conn.execute(
+                "SELECT path, size, mtime_ns, hash FROM files WHERE root = ?", (self.root,)
+            )
+        }
+        changed = [path for path, stat in found.items()
+                   if known.get(path, (None, None))[:2] != (stat.st_size, stat.st_mtime_ns)]
+        removed = [path for path in known if path not in found]
+
+        with ThreadPoolExecutor(max_workers=INDEX_WORKERS) as executor:
+            inspected = list(executor.map(
+                lambda path: _inspect(os.path.join(self.data_dir, path)), changed
+            ))
+
+        counts = {"total": len(found), "added": 0, "updated": 0, "removed": len(removed)}
+        with self.conn:
+            for path, (content_hash, sheets, error) in zip(changed, inspected):
+                stat = found[path]
+                counts["updated" if path in known else "added"] += 1
+                same_content = path in known and content_hash is not None and known[path][2] == content_hash
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO files (root, path, name, size, mtime_ns, hash, error) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (self.root, path, path.rsplit("/", 1)[-1], stat.st_size, stat.st_mtime_ns,
+                     content_hash, error)
+                )
+                if same_content:
+                    continue
+                self.conn.execute("DELETE FROM sheets WHERE root = ? AND path = ?", (self.root, path))
+                self.conn.executemany(
+                    "INSERT INTO sheets (root, path, position, name, rows, columns) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(self.root, path, i, sheet["name"], sheet["rows"], sheet["columns"])
+                     for i, sheet in enumerate(sheets)]
+                )
+            for path in removed:
+                self.conn.execute("DELETE FROM files WHERE root = ? AND path = ?", (self.root, path))
+                self.conn.execute("DELETE FROM sheets WHERE root = ? AND path = ?", (self.root, path))
+        return counts
+
+    def find(self, pattern=None, modified_after=None, modified_before=None, sheet=None):
+        """Archivos del catálogo que cumplen los filtros, ordenados por ruta.
+
+        pattern es un patrón de tipo glob sobre la ruta relativa o el nombre
+        ("ventas_*.xlsx", "2024/*"), sin distinguir mayúsculas. Las fechas
+        aceptan datetime, texto ISO o segundos. sheet filtra por nombre de
+        hoja exacto (sin distinguir mayúsculas). Devuelve dicts con "path",
+        "size", "modified", "hash", "error" y "sheets".
+        """
+        conditions = ["root = ?"]
+        params = [self.root]
+        if modified_after is not None:
+            conditions.append("mtime_ns >= ?")
+            params.append(_timestamp(modified_after))
+        if modified_before is not None:
+            conditions.append("mtime_ns < ?")
+            params.append(_timestamp(modified_before))
+        if sheet is not None:
+            conditions.append("path IN (SELECT path FROM sheets WHERE root = ? AND name = ? COLLATE NOCASE)")
+            params.extend([self.root, sheet])
+        rows = self.conn.execute(
+            f"SELECT path, size, mtime_ns, hash, error FROM files WHERE {' AND '.join(conditions)} ORDER BY path",
+            params
+        ).fetchall()
+        if pattern is not None:
+            pattern = pattern.lower()
+            rows = [row for row in rows
+                    if fnmatch.fnmatchcase(row[0].lower(), pattern)
+                    or fnmatch.fnmatchcase(row[0].rsplit("/", 1)[-1].lower(), pattern)]
+
+        sheets = {}
+        paths = [row[0] for row in rows]
+        # Por lotes para no superar el límite de parámetros de SQLite
+        for start in range(0, len(paths), 500):
+            batch = paths[start:start + 500]
+            for path, name, sheet_rows, columns in self.conn.execute(
+                f"SELECT path, name, rows, columns FROM sheets WHERE root = ? "
+                f"AND path IN ({', '.join('?' * len(batch))}) ORDER BY path, position",
+                [self.root, *batch]
+            ):
+                sheets.setdefault(path, []).append({"name": name, "rows": sheet_rows, "columns": columns})
+        return [
+            {
+                "path": path,
+                "size": size,
+                "modified": datetime.fromtimestamp(mtime_ns / 1_000_000_000).isoformat(timespec="seconds"),
+                "hash": content_hash,
+                "error": error,
+                "sheets": sheets.get(path, []),
+            }
+            for path, size, mtime_ns, content_hash, error in rows
+        ]
+
+    def sheets(self, path):
+        """Hojas catalogadas de un archivo, o None si no está en el catálogo o no está al día."""
+        file_path = os.path.join(self.data_dir, path)
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, error FROM files WHERE root = ? AND path = ?", (self.root, path)
+        ).fetchone()
+        if row is None or row[:2] != (stat.st_size, stat.st_mtime_ns) or row[2]:
+            return None
+        return [
+            {"name": name, "rows": rows, "columns": columns}
+            for name, rows, columns in self.conn.execute(
+                "SELECT name, rows, columns FROM sheets WHERE root = ? AND path = ? ORDER BY position",
+                (self.root, path)
+            )
+        ]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,272 @@
+from collections import Counter
+from itertools import islice
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+from integrations.excel_cache import sheet_cache, iter_frames, SidecarSchemaError
+
+# Filas por bloque al recorrer una hoja completa
+CHUNK_ROWS = 50_000
+# Valores numéricos retenidos por columna para cuantiles e histograma (muestreo uniforme)
+SAMPLE_SIZE = 20_000
+# Valores distintos que se cuentan por columna de texto antes de podar los menos frecuentes
+MAX_DISTINCT = 10_000
+TOP_K = 5
+HISTOGRAM_BINS = 10
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+# Proporción mínima de valores convertibles para tratar una columna de texto como número o fecha
+COERCE_THRESHOLD = 0.95
+# Valores del primer bloque usados para decidir el tipo de la columna
+DETECT_SAMPLE = 1_000
+
+def _round(value, digits=4):
+    value = float(value)
+    return round(value, digits) if np.isfinite(value) else None
+
+class ColumnProfile:
+    """Resumen acumulativo de una columna, actualizado bloque a bloque.
+
+    El tipo se decide con el primer bloque que tiene valores; los bloques
+    siguientes se convierten a ese tipo. Los cuantiles y el histograma se
+    calculan sobre una muestra uniforme de SAMPLE_SIZE valores.
+    """
+
+    def __init__(self, seed=0):
+        self.kind = None
+        self.rows = 0
+        self.invalid = 0
+        # Numéricas
+        self.count = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.sample = np.empty(0)
+        self.sample_keys = np.empty(0)
+        self.rng = np.random.default_rng(seed)
+        # Fechas
+        self.date_format = None
+        self.months = Counter()
+        # Texto y booleanos
+        self.values = Counter()
+        self.pruned = False
+        self.lengths = 0
+
+    def _detect_kind(self, values):
+        if pd.api.types.is_bool_dtype(values):
+            return "booleano"
+        if pd.api.types.is_numeric_dtype(values):
+            return "numérico"
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return "fecha"
+        values = values.head(DETECT_SAMPLE)
+        # Booleanos con nulos llegan como object: pd.to_numeric los convertiría a 0/1
+        if values.map(lambda value: isinstance(value, (bool, np.bool_))).all():
+            return "booleano"
+        numbers = pd.to_numeric(values, errors="coerce")
+        if numbers.notna().mean() >= COERCE_THRESHOLD:
+            return "numérico"
+        text = values.astype(str)
+        dates = pd.to_datetime(text, errors="coerce", format="mixed")
+        if dates.notna().mean() >= COERCE_THRESHOLD:
+            # Con un formato fijo la conversión del resto de bloques es vectorizada
+            self.date_format = guess_datetime_format(text.iloc[0])
+            return "fecha"
+        return "texto"
+
+    def update(self, values):
+        """Incorpora un bloque de valores (pandas.Series)."""
+        self.rows += len(values)
+        values = values.dropna()
+        if values.empty:
+            return
+        if self.kind is None:
+            self.kind = self._detect_kind(values)
+        if self.kind == "numérico":
+            self._update_numeric(values)
+        elif self.kind == "fecha":
+            self._update_dates(values)
+        else:
+            self._update_values(values)
+
+    def _update_numeric(self, values):
+        numbers = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+        valid = numbers[np.isfinite(numbers)]
+        self.invalid += len(numbers) - len(valid)
+        if not len(valid):
+            return
+        self.count += len(valid)
+        self.total += valid.sum()
+        self.total_squares += np.square(valid).sum()
+        low, high = valid.min(), valid.max()
+        self.minimum = low if self.minimum is None else min(self.minimum, low)
+        self.maximum = high if self.maximum is None else max(self.maximum, high)
+
+        # Muestreo por claves aleatorias: conservar las SAMPLE_SIZE claves menores
+        # equivale a una muestra uniforme de todos los valores vistos.
+        keys = self.rng.random(len(valid))
+        sample = np.concatenate([self.sample, valid])
+        sample_keys = np.concatenate([self.sample_keys, keys])
+        if len(sample) > SAMPLE_SIZE:
+            keep = np.argpartition(sample_keys, SAMPLE_SIZE)[:SAMPLE_SIZE]
+            sample, sample_keys = sample[keep], sample_keys[keep]
+        self.sample, self.sample_keys = sample, sample_keys
+
+    def _update_dates(self, values):
+        if pd.api.types.is_datetime64_any_dtype(values):
+            dates = values
+        else:
+            text = values.astype(str)
+            dates = pd.to_datetime(text, errors="coerce", format=self.date_format or "mixed")
+            if self.date_format and dates.isna().any():
+                missing = dates.isna()
+                dates[missing] = pd.to_datetime(text[missing], errors="coerce", format="mixed")
+        valid = dates.dropna()
+        self.invalid += len(dates) - len(valid)
+        if valid.empty:
+            return
+        self.count += len(valid)
+        low, high = valid.min(), valid.max()
+        self.minimum = low if self.minimum is None else min(self.minimum, low)
+        self.maximum = high if self.maximum is None else max(self.maximum, high)
+        months = (valid.dt.year * 100 + valid.dt.month).value_counts()
+        self.months.update({f"{key // 100}-{key % 100:02d}": int(count) for key, count in months.items()})
+
+    def _update_values(self, values):
+        text = values.astype(str)
+        self.count += len(text)
+        self.lengths += int(text.str.len().sum())
+        self.values.update(text.value_counts().to_dict())
+        if len(self.values) > MAX_DISTINCT:
+            # Se conservan los más frecuentes; los recuentos pasan a ser aproximados
+            self.values = Counter(dict(self.values.most_common(MAX_DISTINCT // 2)))
+            self.pruned = True
+
+    def summary(self):
+        """Resumen compacto de la columna para el informe."""
+        nulls = self.rows - self.count - self.invalid
+        summary = {
+            "tipo": self.kind or "vacía",
+            "nulos": _round(nulls / self.rows) if self.rows else 0,
+        }
+        if self.invalid:
+            summary["no_convertibles"] = self.invalid
+        if not self.count:
+            return summary
+
+        if self.kind == "numérico":
+            mean = self.total / self.count
+            variance = max(self.total_squares / self.count - mean ** 2, 0.0)
+            summary.update({
+                "min": _round(self.minimum),
+                "max": _round(self.maximum),
+                "media": _round(mean),
+                "desviacion": _round(np.sqrt(variance)),
+            })
+            if self.minimum == self.maximum:
+                return summary
+            counts, edges = np.histogram(self.sample, bins=HISTOGRAM_BINS,
+                                         range=(self.minimum, self.maximum))
+            scale = self.count / len(self.sample)
+            summary["cuantiles"] = {f"p{int(q * 100)}": _round(v)
+                                    for q, v in zip(QUANTILES, np.quantile(self.sample, QUANTILES))}
+            summary["histograma"] = {
+                "bordes": [_round(edge, 2) for edge in edges],
+                "conteos": [int(round(count * scale)) for count in counts],
+            }
+            if scale > 1:
+                summary["muestra"] = len(self.sample)
+        elif self.kind == "fecha":
+            summary.update({
+                "desde": self.minimum.isoformat(),
+                "hasta": self.maximum.isoformat(),
+                "por_mes": dict(sorted(self.months.items())),
+            })
+            if len(self.months) > 24:
+                years = Counter()
+                for month, count in self.months.items():
+                    years[month[:4]] += count
+                summary["por_año"] = dict(sorted(years.items()))
+                del summary["por_mes"]
+        else:
+            summary.update({
+                "distintos": len(self.values),
+                "top": [[value, count] for value, count in self.values.most_common(TOP_K)],
+                "longitud_media": _round(self.lengths / self.count, 1),
+            })
+            if self.pruned:
+                summary["distintos"] = f">{MAX_DISTINCT}"
+        return summary
+
+def iter_chunks(rows, chunk_rows=CHUNK_ROWS):
+    """Agrupa un iterador de filas (diccionarios) en DataFrames de chunk_rows filas."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_rows))
+        if not chunk:
+            return
+        yield pd.DataFrame.from_records(chunk).infer_objects()
+
+def profile_chunks(chunks):
+    """Perfil de una hoja a partir de sus bloques: {"filas", "columnas": {nombre: resumen}}."""
+    profiles = {}
+    rows = 0
+    for chunk in chunks:
+        for column in chunk.columns:
+            if column not in profiles:
+                profiles[column] = ColumnProfile(seed=len(profiles))
+                # Columnas que aparecen tarde: las filas anteriores cuentan como nulas
+                profiles[column].rows = rows
+            profiles[column].update(chunk[column])
+        for column, profile in profiles.items():
+            if column not in chunk.columns:
+                profile.rows += len(chunk)
+        rows += len(chunk)
+    return {
+        "filas": rows,
+        "columnas": {str(column): profile.summary() for column, profile in profiles.items()},
+    }
+
+def _caching(chunks, writer):
+    """Pasa los bloques a la vez al escritor de la caché; si alguno no encaja, deja de guardar."""
+    for chunk in chunks:
+        if writer is not None:
+            try:
+                writer.write(chunk)
+            except SidecarSchemaError as e:
+                print(f"⚠️ La hoja no se guardará en caché: {e}")
+                writer.abort()
+                writer = None
+        yield chunk
+    if writer is not None:
+        writer.commit()
+
+def profile_sheet(file_path, sheet_name, chunk_rows=CHUNK_ROWS):
+    """Recorre una hoja completa por bloques y devuelve su perfil estadístico.
+
+    Si la hoja está en la caché columnar se lee de ella; si no, se lee del
+    libro y en la misma pasada se guarda en la caché para las siguientes
+    ejecuciones.
+    """
+    cached = sheet_cache.get(file_path, sheet_name)
+    if cached is not None:
+        return profile_chunks(iter_frames(cached, chunk_rows))
+
+    if file_path.endswith(".xlsx"):
+        from integrations.excel import iter_sheet_rows
+        chunks = iter_chunks(iter_sheet_rows(file_path, sheet_name), chunk_rows)
+    else:
+        frame = pd.read_excel(file_path, sheet_name=sheet_name)
+        chunks = (frame.iloc[start:start + chunk_rows] for start in range(0, len(frame), chunk_rows))
+
+    writer = sheet_cache.writer(file_path, sheet_name)
+    try:
+        return profile_chunks(_caching(chunks, writer))
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+
+def profile_workbook(file_path, sheet_names):
+    """Perfiles de varias hojas de un libro: {hoja: perfil}."""
+    return {sheet_name: profile_sheet(file_path, sheet_name) for sheet_name in sheet_names}
@@ -1,9 +1,16 @@
 import os
+import json
+import time
 import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 import base64
 from jira import JIRA
+from jira.resources import Issue
 from integrations.base import BaseIntegration
+from integrations.jira_store import JiraIssueStore, STORE_PATH
+from services.tracing import traced, record
 
 # Cargar variables de entorno
 load_dotenv()
@@ -12,18 +19,99 @@ JIRA_SERVER = os.getenv("JIRA_SERVER")
 JIRA_USERNAME = os.getenv("JIRA_USERNAME")
 JIRA_API_TOKEN = os.getenv("JIRA_API_TOKEN")
 
+# Paginación de búsquedas
+PAGE_SIZE = 100
+MAX_WORKERS = 8
+PROJECTION_SAMPLE = 20
+
+# Margen de solapamiento de la sincronización incremental (minutos)
+SYNC_OVERLAP_MINUTES = 5
+
+# Campos personalizados que lee el informe
+SPRINT_FIELD = "customfield_10020"
+EPIC_FIELD = "customfield_10014"
+
+# Campos del informe: nombre -> (ruta de atributo en issue.fields, valor por defecto)
+FIELD_PATHS = {
+    "summary": ("summary", ''),
+    "status": ("status.name", ''),
+    "assignee": ("assignee.displayName", 'Sin asignar'),
+    "reporter": ("reporter.displayName", 'Desconocido'),
+    "created": ("created", ''),
+    "priority": ("priority.name", 'No definida'),
+    "description": ("description", 'Sin descripción'),
+    "type": ("issuetype.name", 'Tarea'),
+}
+
+# Campos del informe con una lista de valores por incidencia
+LIST_FIELDS = {"labels"}
+
+def get_report_fields():
+    """Deriva de FIELD_PATHS la lista exacta de campos de Jira que usa el informe."""
+    fields = [path.split('.')[0] for path, _ in FIELD_PATHS.values()]
+    fields += ["labels", SPRINT_FIELD, EPIC_FIELD]
+    return list(dict.fromkeys(fields))
+
+# Usar diccionario para mapear estados de sprint a JQL
+SPRINT_STATE_MAPPING = {
+    'active': "sprint in openSprints()",
+    'closed': "sprint in closedSprints()",
+    'future': "sprint in futureSprints()"
+}
+
+def build_jql(project_key=None, jql=None, sprint_id=None, sprint_state=None):
+    """Construye la consulta JQL a partir del proyecto y el sprint, o usa el JQL personalizado."""
+    # Construir JQL con componentes
+    jql_components = []
+    
+    if project_key:
+        jql_components.append(f"project = {project_key}")
+        
+    if sprint_id:
+        jql_components.append(f"sprint = {sprint_id}")
+    elif sprint_state in SPRINT_STATE_MAPPING:
+        jql_components.append(SPRINT_STATE_MAPPING[sprint_state])
+    
+    # Usar el JQL personalizado o construir uno con los componentes
+    return jql if jql else " AND ".join(jql_components)
+
+def extract_sprint(issue):
+    """Extrae el nombre del primer sprint de una incidencia."""
+    try:
+        sprints = getattr(issue.fields, SPRINT_FIELD, None)
+        if isinstance(sprints, list) and sprints:
+            sprint_info = sprints[0]
+            if isinstance(sprint_info, str) and "name=" in sprint_info:
+                return sprint_info.split("name=")[1].split(",")[0]
+            return str(sprint_info)
+        return "No asignado"
+    except:
+        return "No asignado"
+
 class JiraIntegration(BaseIntegration):
     def __init__(self, config):
         super().__init__(config)
         self.server = config["server"]
         self.username = config["username"]
         self.token = config["token"]
+        self.store_path = config.get("store_path") or STORE_PATH
         self.client = None
-    
+        self.store = None
+        # Peticiones y bytes recibidos de Jira por este cliente (para las trazas)
+        self.transfer = {"requests": 0, "bytes": 0}
+        self._transfer_lock = threading.Lock()
+
+    def _count_response(self, response, *args, **kwargs):
+        """Hook de requests: acumula las respuestas recibidas y su tamaño."""
+        with self._transfer_lock:
+            self.transfer["requests"] += 1
+            self.transfer["bytes"] += len(response.content or b"")
+
     def verify_connection(self):
         """Verifica la conexión con Jira."""
         try:
             self.client = JIRA(server=self.server, basic_auth=(self.username, self.token))
+            self.client._session.hooks["response"].append(self._count_response)
             user = self.client.myself()
             return True, f"Conexión exitosa como: {user.get('displayName')}"
         except Exception as e:
@@ -42,46 +130,185 @@ class JiraIntegration(BaseIntegration):
         except Exception as e:
             return [], f"Error al obtener proyectos: {str(e)}"
     
+    @traced("jira.fetch")
     def fetch_data(self, project_key=None, jql=None, max_results=50, 
                    sprint_id=None, sprint_state=None, include_epics=True, 
-                   include_labels=True):
-        """Obtiene incidencias de Jira según criterios especificados."""
+                   include_labels=True, fetch_all=False, page_size=PAGE_SIZE,
+                   max_workers=MAX_WORKERS, fields=None, report_savings=False,
+                   use_store=False):
+        """Obtiene incidencias de Jira según criterios especificados.
+
+        Con fetch_all=True se ignora max_results y se recorren todas las
+        páginas del resultado en paralelo (ver _search_all). Por defecto solo
+        se solicitan los campos que usa generate_report_data; fields="*all"
+        recupera la incidencia completa.
+
+        Con use_store=True, las consultas de proyecto completo se sirven desde
+        el almacén local tras una sincronización incremental (ver _sync_store).
+        Los filtros de sprint y el JQL personalizado se consultan siempre en vivo.
+        """
         if not self.client:
             self.verify_connection()
         
-        # Usar diccionario para mapear estados de sprint a JQL
-        sprint_state_mapping = {
-            'active': "sprint in openSprints()",
-            'closed': "sprint in closedSprints()",
-            'future': "sprint in futureSprints()"
-        }
-        
-        # Construir JQL con componentes
-        jql_components = []
-        
-        if project_key:
-            jql_components.append(f"project = {project_key}")
-            
-        if sprint_id:
-            jql_components.append(f"sprint = {sprint_id}")
-        elif sprint_state in sprint_state_mapping:
-            jql_components.append(sprint_state_mapping[sprint_state])
+        jql_query = build_jql(project_key, jql, sprint_id, sprint_state)
         
-        # Usar el JQL personalizado o construir uno con los componentes
-        jql_query = jql if jql else " AND ".join(jql_components)
+        if fields is None:
+            fields = get_report_fields()
         
+        transferred = dict(self.transfer)
         try:
             print(f"Ejecutando consulta JQL: {jql_query}")
-            issues = self.client.search_issues(jql_query, maxResults=max_results)
+            if report_savings and fields != "*all":
+                self._report_projection_savings(jql_query, fields)
+            if use_store and project_key and not (jql or sprint_id or sprint_state):
+                issues = self._sync_store(project_key, page_size, max_workers, fields)
+            elif fetch_all:
+                issues = self._search_all(jql_query, page_size, max_workers, fields)
+            else:
+                issues = self.client.search_issues(jql_query, maxResults=max_results, fields=fields)
+            record(jql=jql_query, issues=len(issues),
+                   requests=self.transfer["requests"] - transferred["requests"],
+                   bytes=self.transfer["bytes"] - transferred["bytes"])
             return issues, len(issues)
         except Exception as e:
             return [], f"Error al buscar incidencias: {str(e)}"
     
-    def generate_report_data(self, issues):
-        """Prepara los datos de las incidencias para el informe."""
+    def _search_all(self, jql_query, page_size=PAGE_SIZE, max_workers=MAX_WORKERS, fields=None):
+        """Recorre todas las páginas de una consulta JQL usando startAt.
+
+        La primera página indica el total; el resto se solicita en paralelo
+        con un pool de hilos acotado y se reensambla en orden.
+        """
+        # Un orden estable evita duplicados u omisiones entre páginas
+        if "order by" not in jql_query.lower():
+            jql_query = f"{jql_query} ORDER BY key ASC"
+
+        start = time.perf_counter()
+        first_page = self.client.search_issues(jql_query, startAt=0, maxResults=page_size,
+                                               fields=fields)
+        total = first_page.total
+        # El servidor puede limitar el tamaño de página por debajo del solicitado
+        if 0 < len(first_page) < min(page_size, total):
+            page_size = len(first_page)
+
+        pages = {0: list(first_page)}
+        fetched = len(first_page)
+        print(f"📥 Descargando {total} incidencias en páginas de {page_size}...")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self.client.search_issues, jql_query,
+                                startAt=offset, maxResults=page_size,
+                                fields=fields): offset
+                for offset in range(fetched, total, page_size)
+            }
+            for future in as_completed(futures):
+                page = future.result()
+                pages[futures[future]] = list(page)
+                fetched += len(page)
+                print(f"   {fetched}/{total} incidencias ({fetched * 100 // max(total, 1)}%)")
+
+        issues = [issue for offset in sorted(pages) for issue in pages[offset]]
+        elapsed = time.perf_counter() - start
+        rate = len(issues) / elapsed if elapsed else float(len(issues))
+        print(f"⏱️ {len(issues)} incidencias en {elapsed:.2f}s ({rate:.0f} incidencias/s)")
+        return issues
+
+    def _sync_store(self, project_key, page_size=PAGE_SIZE, max_workers=MAX_WORKERS, fields=None):
+        """Sincroniza el proyecto con el almacén local y devuelve sus incidencias.
+
+        fields admite una lista, una cadena separada por comas o "*all". La
+        primera vez (o si cambian los campos solicitados) se descarga el
+        proyecto completo. Después solo se piden las incidencias con
+        `updated` posterior a la última sincronización y se reconcilian las
+        eliminaciones comparando el total del servidor con el almacenado.
+        """
+        if self.store is None:
+            self.store = JiraIssueStore(self.store_path)
+
+        if isinstance(fields, str) and fields.startswith("*"):
+            # "*all" o "*navigable" ya incluyen updated y se envían tal cual
+            signature = fields
+        else:
+            if isinstance(fields, str):
+                fields = [field.strip() for field in fields.split(",") if field.strip()]
+            fields = list(dict.fromkeys(list(fields or get_report_fields()) + ["updated"]))
+            signature = ",".join(sorted(fields))
+        base_jql = f"project = {project_key}"
+        sync_start = time.time()
+        state = self.store.get_sync_state(self.server, project_key)
+
+        if state and state[1] == signature:
+            # Fecha relativa en minutos: evita depender de la zona horaria del usuario en Jira
+            minutes = int((sync_start - state[0]) // 60) + SYNC_OVERLAP_MINUTES
+            changed = self._search_all(f'{base_jql} AND updated >= "-{minutes}m"',
+                                       page_size, max_workers, fields)
+            self.store.upsert(self.server, project_key, [issue.raw for issue in changed])
+            print(f"🔁 Sincronización incremental: {len(changed)} incidencias actualizadas")
+            self._reconcile_deletions(project_key, base_jql, page_size, max_workers)
+        else:
+            issues = self._search_all(base_jql, page_size, max_workers, fields)
+            self.store.replace(self.server, project_key, [issue.raw for issue in issues])
+            print(f"💾 Carga completa: {len(issues)} incidencias guardadas en el almacén local")
+
+        self.store.mark_synced(self.server, project_key, sync_start, signature)
+        options = getattr(self.client, "_options", {"server": self.server})
+        session = getattr(self.client, "_session", None)
+        return [Issue(options, session, raw=raw)
+                for raw in self.store.load(self.server, project_key)]
+
+    def _reconcile_deletions(self, project_key, base_jql, page_size=PAGE_SIZE,
+                             max_workers=MAX_WORKERS):
+        """Elimina del almacén las incidencias que ya no existen en el servidor.
+
+        Solo si el total del servidor no coincide con el almacenado se
+        descarga la lista de claves (sin campos) para calcular la diferencia.
+        """
+        remote_total = self.client.search_issues(base_jql, maxResults=1, fields=["key"]).total
+        if remote_total == self.store.count(self.server, project_key):
+            return 0
+
+        remote_keys = {issue.key for issue in
+                       self._search_all(base_jql, page_size, max_workers, ["key"])}
+        removed = self.store.keys(self.server, project_key) - remote_keys
+        self.store.delete(self.server, project_key, removed)
+        if removed:
+            print(f"🗑️ {len(removed)} incidencias eliminadas del almacén local")
+        return len(removed)
+
+    def _report_projection_savings(self, jql_query, fields, sample_size=PROJECTION_SAMPLE):
+        """Compara el tamaño de una muestra con y sin proyección de campos."""
+        try:
+            full = self.client.search_issues(jql_query, maxResults=sample_size,
+                                             fields="*all", json_result=True)
+            projected = self.client.search_issues(jql_query, maxResults=sample_size,
+                                                  fields=fields, json_result=True)
+        except Exception as e:
+            print(f"⚠️ No se pudo medir la proyección de campos: {e}")
+            return None
+
+        full_bytes = len(json.dumps(full.get("issues", [])).encode("utf-8"))
+        projected_bytes = len(json.dumps(projected.get("issues", [])).encode("utf-8"))
+        if not full_bytes:
+            return None
+        saved = 1 - projected_bytes / full_bytes
+        print(f"📉 Proyección de {len(fields)} campos: {projected_bytes} de {full_bytes} bytes "
+              f"en la muestra ({saved:.0%} menos)")
+        return saved
+
+    @traced("jira.prepare")
+    def generate_report_data(self, issues, crosstabs=None):
+        """Prepara los datos de las incidencias para el informe.
+
+        crosstabs añade tablas cruzadas entre campos de valor único, p. ej.
+        crosstabs=[("status", "assignee")], en statistics["crosstabs"] como
+        {fila: {columna: n}}. Los campos con listas (labels) no se admiten.
+        """
         if not issues:
             return {"error": "No hay incidencias para generar informe"}
         
+        record(issues=len(issues))
+        
         # Función auxiliar para extraer datos seguros de un campo
         def safe_get(obj, attr, default=''):
             try:
@@ -94,19 +321,6 @@ class JiraIntegration(BaseIntegration):
             except:
                 return default
         
-        # Función para extraer sprint info
-        def extract_sprint(issue):
-            try:
-                sprints = getattr(issue.fields, 'customfield_10020', None)
-                if isinstance(sprints, list) and sprints:
-                    sprint_info = sprints[0]
-                    if isinstance(sprint_info, str) and "name=" in sprint_info:
-                        return sprint_info.split("name=")[1].split(",")[0]
-                    return str(sprint_info)
-                return "No asignado"
-            except:
-                return "No asignado"
-        
         # Extraer datos de las incidencias
         issues_data = []
         label_counts = {}
@@ -115,20 +329,22 @@ class JiraIntegration(BaseIntegration):
         assignee_counts = {}
         epic_issues = {}
         
-        # Mapeo de campos clave
-        field_mapping = {
-            "key": lambda i: i.key,
-            "summary": lambda i: safe_get(i.fields, 'summary'),
-            "status": lambda i: safe_get(i.fields, 'status.name'),
-            "assignee": lambda i: safe_get(i.fields, 'assignee.displayName', 'Sin asignar'),
-            "reporter": lambda i: safe_get(i.fields, 'reporter.displayName', 'Desconocido'),
-            "created": lambda i: safe_get(i.fields, 'created'),
-            "priority": lambda i: safe_get(i.fields, 'priority.name', 'No definida'),
-            "description": lambda i: safe_get(i.fields, 'description', 'Sin descripción'),
-            "type": lambda i: safe_get(i.fields, 'issuetype.name', 'Tarea'),
-            "sprint": extract_sprint,
-            "labels": lambda i: getattr(i.fields, 'labels', [])
-        }
+        # Mapeo de campos clave (derivado de FIELD_PATHS)
+        field_mapping = {"key": lambda i: i.key}
+        for field, (path, default) in FIELD_PATHS.items():
+            field_mapping[field] = lambda i, path=path, default=default: safe_get(i.fields, path, default)
+        field_mapping["sprint"] = extract_sprint
+        field_mapping["labels"] = lambda i: getattr(i.fields, 'labels', None) or []
+        
+        # Tablas cruzadas: solo entre campos del mapeo con un valor por incidencia
+        crosstabs = [tuple(pair) for pair in crosstabs or []]
+        for row, column in crosstabs:
+            for name in (row, column):
+                if name not in field_mapping:
+                    raise ValueError(f"Campo desconocido para tabla cruzada: {name}")
+                if name in LIST_FIELDS:
+                    raise ValueError(f"El campo {name} contiene listas y no admite tablas cruzadas")
+        crosstab_counts = {pair: {} for pair in crosstabs}
         
         # Procesar cada incidencia
         for issue in issues:
@@ -143,13 +359,16 @@ class JiraIntegration(BaseIntegration):
             status_counts[status] = status_counts.get(status, 0) + 1
             assignee_counts[assignee] = assignee_counts.get(assignee, 0) + 1
             type_counts[issue_type] = type_counts.get(issue_type, 0) + 1
+            for (row, column), table in crosstab_counts.items():
+                cells = table.setdefault(issue_data[row], {})
+                cells[issue_data[column]] = cells.get(issue_data[column], 0) + 1
             
             # Contar etiquetas
             for label in issue_data["labels"]:
                 label_counts[label] = label_counts.get(label, 0) + 1
             
             # Capturar relaciones jerárquicas (épicas)
-            epic_key = safe_get(issue.fields, 'customfield_10014')
+            epic_key = safe_get(issue.fields, EPIC_FIELD)
             if epic_key:
                 issue_data["epic"] = epic_key
                 epic_issues.setdefault(epic_key, []).append(issue.key)
@@ -157,16 +376,20 @@ class JiraIntegration(BaseIntegration):
             issues_data.append(issue_data)
         
         # Construir estructura de informe
+        statistics = {
+            "by_status": status_counts,
+            "by_assignee": assignee_counts,
+            "by_type": type_counts,
+            "by_label": label_counts,
+            "by_epic": {epic: len(issues) for epic, issues in epic_issues.items()}
+        }
+        if crosstab_counts:
+            statistics["crosstabs"] = {f"{row}_x_{column}": table
+                                       for (row, column), table in crosstab_counts.items()}
         return {
             "total_issues": len(issues_data),
             "issues": issues_data,
-            "statistics": {
-                "by_status": status_counts,
-                "by_assignee": assignee_counts,
-                "by_type": type_counts,
-                "by_label": label_counts,
-                "by_epic": {epic: len(issues) for epic, issues in epic_issues.items()}
-            },
+            "statistics": statistics,
             "hierarchy": epic_issues
         }
 
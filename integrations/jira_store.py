@@ -0,0 +1,105 @@
+import os
+import json
+import sqlite3
+
+STORE_PATH = os.path.join(".cache", "jira_store.sqlite")
+
+class JiraIssueStore:
+    """Almacén local (SQLite) de incidencias de Jira por servidor y proyecto.
+
+    Guarda el JSON crudo de cada incidencia y la fecha de la última
+    sincronización, de modo que las ejecuciones siguientes solo necesiten
+    descargar las incidencias actualizadas desde entonces.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS issues (
+                server TEXT NOT NULL,
+                project TEXT NOT NULL,
+                key TEXT NOT NULL,
+                updated TEXT,
+                raw TEXT NOT NULL,
+                PRIMARY KEY (server, project, key)
+            );
+            CREATE TABLE IF NOT EXISTS sync_state (
+                server TEXT NOT NULL,
+                project TEXT NOT NULL,
+                last_sync REAL NOT NULL,
+                fields TEXT NOT NULL,
+                PRIMARY KEY (server, project)
+            );
+        """)
+        self.conn.commit()
+
+    def get_sync_state(self, server, project):
+        """Devuelve (last_sync, fields) de la última sincronización o None."""
+        return self.conn.execute(
+            "SELECT last_sync, fields FROM sync_state WHERE server = ? AND project = ?",
+            (server, project)
+        ).fetchone()
+
+    def mark_synced(self, server, project, last_sync, fields):
+        """Registra el instante de inicio de la sincronización completada."""
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sync_state (server, project, last_sync, fields) VALUES (?, ?, ?, ?)",
+                (server, project, last_sync, fields)
+            )
+
+    def upsert(self, server, project, raw_issues):
+        """Inserta o actualiza incidencias a partir de su JSON crudo."""
+        rows = [
+            (server, project, raw["key"], raw.get("fields", {}).get("updated"), json.dumps(raw))
+            for raw in raw_issues
+        ]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO issues (server, project, key, updated, raw) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+        return len(rows)
+
+    def replace(self, server, project, raw_issues):
+        """Sustituye todas las incidencias almacenadas del proyecto."""
+        with self.conn:
+            self.conn.execute("DELETE FROM issues WHERE server = ? AND project = ?", (server, project))
+        return self.upsert(server, project, raw_issues)
+
+    def count(self, server, project):
+        """Número de incidencias almacenadas del proyecto."""
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM issues WHERE server = ? AND project = ?", (server, project)
+        ).fetchone()[0]
+
+    def keys(self, server, project):
+        """Conjunto de claves almacenadas del proyecto."""
+        rows = self.conn.execute(
+            "SELECT key FROM issues WHERE server = ? AND project = ?", (server, project)
+        )
+        return {row[0] for row in rows}
+
+    def delete(self, server, project, keys):
+        """Elimina las incidencias indicadas."""
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM issues WHERE server = ? AND project = ? AND key = ?",
+                [(server, project, key) for key in keys]
+            )
+
+    def load(self, server, project):
+        """Devuelve el JSON crudo de todas las incidencias del proyecto."""
+        rows = self.conn.execute(
+            "SELECT raw FROM issues WHERE server = ? AND project = ? ORDER BY key",
+            (server, project)
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def close(self):
+        self.conn.close()
@@ -1,13 +1,103 @@
 import os
+import sys
+import argparse
 import config
 from datetime import datetime
 from integrations.jira import JiraIntegration
 from integrations.excel import ExcelIntegration
 from integrations.database import DatabaseIntegration  
-from services.openai import generate_report
-from services.exports import convert_report
+from services.openai import stream_report
+from services.exports import convert_report_formats, MarkdownStreamWriter
+from services.pipeline import (run_report_job, load_manifest, run_manifest, print_summary,
+                               DEFAULT_WORKERS)
+from services.tracing import span, tracer
 
-def main():
+def main(argv=None):
+    args = parse_args(argv)
+    if getattr(args, "profile", None):
+        tracer.configure(profile_dir=args.profile)
+    if args.command == "run":
+        return run_headless(args)
+    if args.command == "batch":
+        return run_batch(args)
+    run_interactive()
+    return 0
+
+def parse_args(argv=None):
+    """Define la línea de comandos. Sin subcomando se usa el modo interactivo."""
+    parser = argparse.ArgumentParser(description=f"{config.APP_NAME} v{config.VERSION}")
+    subparsers = parser.add_subparsers(dest="command")
+
+    run = subparsers.add_parser("run", help="Genera un informe sin interacción")
+    run.add_argument("--integration", required=True, choices=config.AVAILABLE_INTEGRATIONS)
+    run.add_argument("--project", help="Clave del proyecto de Jira")
+    run.add_argument("--file", help="Archivo Excel dentro de la carpeta de datos")
+    run.add_argument("--sheet", help="Hoja del archivo Excel (por defecto, todas)")
+    run.add_argument("--table", action="append", dest="tables", help="Tabla de la base de datos (repetible)")
+    run.add_argument("--overview", choices=["sample", "catalog"],
+                     help="Resumen de base de datos: filas de ejemplo o estadísticas del catálogo (PostgreSQL)")
+    run.add_argument("--extract", action="store_true",
+                     help="Extrae las tablas (--table) a Parquet y calcula el perfil y las métricas en local")
+    run.add_argument("--metrics", help="Archivo YAML/JSON con métricas a calcular en la base de datos")
+    run.add_argument("--report-focus", help="Enfoque del informe (p. ej. general, sprint_activo)")
+    run.add_argument("--context", default="", help="Contexto del informe para Excel y base de datos")
+    run.add_argument("--formats", nargs="+", default=["md"], help="Formatos de salida: md pdf excel latex")
+    run.add_argument("--output", help="Nombre base del archivo de salida")
+    run.add_argument("--profile", metavar="CARPETA", help="Guarda un perfil de cProfile por etapa en CARPETA")
+
+    batch = subparsers.add_parser("batch", help="Ejecuta los informes de un manifiesto YAML/JSON")
+    batch.add_argument("manifest", help="Ruta del manifiesto")
+    batch.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Informes en paralelo")
+    batch.add_argument("--async", dest="use_async", action="store_true",
+                       help="Usa el pipeline asyncio (clientes asíncronos de Jira y OpenAI)")
+    batch.add_argument("--jira-concurrency", type=int,
+                       help="Peticiones simultáneas a Jira (solo con --async)")
+    batch.add_argument("--openai-concurrency", type=int,
+                       help="Peticiones simultáneas a OpenAI (solo con --async)")
+    batch.add_argument("--profile", metavar="CARPETA",
+                       help="Guarda un perfil de cProfile por etapa en CARPETA")
+
+    return parser.parse_args(argv)
+
+def run_headless(args):
+    """Ejecuta un único informe con los parámetros de la línea de comandos."""
+    job = {key: value for key, value in {
+        "integration": args.integration,
+        "project": args.project,
+        "file": args.file,
+        "sheet": args.sheet,
+        "tables": args.tables,
+        "overview": args.overview,
+        "metrics": args.metrics,
+        "extract": args.extract or None,
+        "report_focus": args.report_focus,
+        "context": args.context,
+        "formats": args.formats,
+        "output": args.output,
+    }.items() if value is not None}
+    result = run_report_job(job)
+    for output_format, output_file in result["outputs"].items():
+        print(f"✅ Informe guardado como: {output_file} "
+              f"({result['export_timings'][output_format]:.2f}s)")
+    print_summary([result])
+    return 1 if result["error"] else 0
+
+def run_batch(args):
+    """Ejecuta todos los informes de un manifiesto."""
+    jobs = load_manifest(args.manifest)
+    print(f"🚀 Ejecutando {len(jobs)} informes con {args.workers} en paralelo...")
+    if args.use_async:
+        from services.async_pipeline import run_manifest_async
+        concurrency = {"jira_concurrency": args.jira_concurrency,
+                       "openai_concurrency": args.openai_concurrency}
+        results = run_manifest_async(jobs, args.workers,
+                                     **{k: v for k, v in concurrency.items() if v is not None})
+    else:
+        results = run_manifest(jobs, args.workers)
+    print_summary(results)
+    return 1 if any(result["error"] for result in results) else 0
+
+def run_interactive():
     print(f"🚀 Bienvenido a {config.APP_NAME} v{config.VERSION}")
 
     # Mostrar integraciones disponibles con nombres amigables
@@ -35,14 +125,16 @@ def main():
 
     handler = use_cases.get(selected)
     if handler:
-        handler()
+        with span("report", integration=selected, mode="interactive"):
+            handler()
     else:
         print(f"❌ Integración {selected} no implementada.")
 
 def handle_jira_integration():
     """Maneja el flujo de trabajo para integración con Jira."""
     integration = JiraIntegration(config.JIRA_CONFIG)
-    success, message = integration.verify_connection()
+    with span("stage.connect", profile=True):
+        success, message = integration.verify_connection()
     
     if not success:
         print(f"❌ {message}")
@@ -73,11 +165,8 @@ def handle_jira_integration():
     
     # Opciones de informe
     report_options = {
-        1: {"name": "Incidencias actuales (todas)", "focus": "general", "params": {}},
-        2: {"name": "Sprint activo", "focus": "sprint_activo", "params": {"sprint_state": "active"}},
-        3: {"name": "Sprints finalizados", "focus": "sprints_finalizados", "params": {"sprint_state": "closed"}},
-        4: {"name": "Análisis por etiquetas", "focus": "etiquetas", "params": {"include_labels": True}},
-        5: {"name": "Análisis jerárquico", "focus": "jerarquico", "params": {"include_epics": True}}
+        i: {"focus": focus, **option}
+        for i, (focus, option) in enumerate(config.JIRA_REPORT_OPTIONS.items(), 1)
     }
     
     # Mostrar opciones
@@ -94,10 +183,12 @@ def handle_jira_integration():
         report_config = report_options[1]
     
     # Obtener datos para el informe
-    params = {"project_key": selected_project.key, "max_results": 100}
+    params = {"project_key": selected_project.key, "fetch_all": True,
+              "report_savings": config.JIRA_CONFIG["report_savings"], "use_store": True}
     params.update(report_config["params"])
     
-    issues, count = integration.fetch_data(**params)
+    with span("stage.fetch", profile=True):
+        issues, count = integration.fetch_data(**params)
     
     if isinstance(count, str):  # Es un mensaje de error
         print(f"❌ {count}")
@@ -106,29 +197,27 @@ def handle_jira_integration():
     print(f"✅ Se encontraron {count} incidencias")
     
     # Generar datos para el informe
-    report_data = integration.generate_report_data(issues)
+    with span("stage.prepare", profile=True):
+        report_data = integration.generate_report_data(issues, crosstabs=[("status", "assignee")])
     
     # Generar informe con AI
-    print("\n🧠 Generando informe con OpenAI...")
-    report = generate_report(
+    filename_base = f"jira_{selected_project.key}"
+    report, markdown_file = stream_and_save_report(
         report_data, 
         f"Jira - {selected_project.name}", 
+        filename_base,
         report_focus=report_config["focus"]
     )
     
     # Seleccionar formato de salida
-    filename_base = f"jira_{selected_project.key}"
-    output_file = select_and_export_format(report, filename_base)
-    
-    # Mostrar vista previa
-    print("\n📄 Vista previa del informe:\n")
-    print(report[:500] + "...\n")
-    print(f"Informe completo disponible en: {output_file}")
+    output_files = select_and_export_format(report, filename_base, markdown_file)
+    print(f"\nInforme completo disponible en: {', '.join(output_files)}")
 
 def handle_excel_integration():
     """Maneja el flujo de trabajo para integración con Excel local."""
     integration = ExcelIntegration(config.EXCEL_CONFIG)
-    success, message = integration.verify_connection()
+    with span("stage.connect", profile=True):
+        success, message = integration.verify_connection()
     
     if not success:
         print(f"❌ {message}")
@@ -136,8 +225,9 @@ def handle_excel_integration():
     
     print(f"✅ {message}")
     
-    # Obtener archivos disponibles
-    files, message = integration.get_files()
+    # Obtener archivos disponibles del catálogo, opcionalmente filtrados
+    pattern = input("\nFiltrar archivos por nombre (p. ej. ventas_*, Enter para todos): ").strip()
+    files, message = integration.get_files(pattern=pattern or None)
     print(f"\n📁 {message}")
     
     if not files:
@@ -157,62 +247,80 @@ def handle_excel_integration():
         print("❌ Selección inválida.")
         return
     
-    # Leer archivo
-    data, message = integration.fetch_data(file_name=selected_file)
+    # Listar hojas (sin leer sus celdas) y elegir antes de leer datos
+    sheets, message = integration.list_sheets(selected_file)
+    if sheets is None:
+        print(f"❌ {message}")
+        return
+    
+    print("\n📊 Hojas disponibles:")
+    for i, sheet in enumerate(sheets, 1):
+        size = f" ({sheet['rows']} filas × {sheet['columns']} columnas)" if sheet["rows"] is not None else ""
+        print(f"{i}. {sheet['name']}{size}")
+    
+    selected_sheet = None
+    try:
+        sheet_idx = int(input("\nSeleccione una hoja (número) o 0 para todas: ")) - 1
+        if sheet_idx >= 0:
+            selected_sheet = sheets[sheet_idx]["name"]
+            print(f"✅ Seleccionada hoja '{selected_sheet}'")
+        # Si es 0 o negativo, se usan todas las hojas
+    except (ValueError, IndexError):
+        print("❌ Selección inválida, usando todas las hojas.")
+    
+    # Leer solo la hoja seleccionada
+    with span("stage.fetch", profile=True):
+        data, message = integration.fetch_data(
+            file_name=selected_file,
+            sheets=[selected_sheet] if selected_sheet else None
+        )
     print(f"✅ {message}")
     
     if data is None:
         print("❌ No se pudieron leer los datos del archivo.")
         return
     
-    # Si es un archivo con múltiples hojas, permitir elegir
-    if isinstance(data, dict):
-        print("\n📊 Hojas disponibles:")
-        for i, sheet in enumerate(data.keys(), 1):
-            print(f"{i}. {sheet}")
-        
-        try:
-            sheet_idx = int(input("\nSeleccione una hoja (número) o 0 para todas: ")) - 1
-            if sheet_idx >= 0:
-                selected_sheet = list(data.keys())[sheet_idx]
-                data = data[selected_sheet]
-                print(f"✅ Seleccionada hoja '{selected_sheet}'")
-            # Si es 0 o negativo, se usan todas las hojas
-        except (ValueError, IndexError):
-            print("❌ Selección inválida, usando todas las hojas.")
+    profiled_sheets = [selected_sheet] if selected_sheet else list(data)
+    if selected_sheet:
+        data = data[selected_sheet]
     
-    # Generar datos para el informe
-    report_data = integration.generate_report_data(data)
+    # Generar datos para el informe (incluye el perfil de las hojas completas)
+    with span("stage.prepare", profile=True):
+        report_data = integration.generate_report_data(data, file_name=selected_file, sheets=profiled_sheets)
     
     # Generar informe con AI
-    print("\n🧠 Generando informe con OpenAI...")
-    report = generate_report(
+    filename_base = f"excel_{os.path.splitext(os.path.basename(selected_file))[0]}"
+    report, markdown_file = stream_and_save_report(
         report_data, 
-        f"Excel - {os.path.splitext(selected_file)[0]}", 
+        f"Excel - {os.path.splitext(os.path.basename(selected_file))[0]}", 
+        filename_base,
         report_focus="excel_data"
     )
     
     # Seleccionar formato de salida
-    filename_base = f"excel_{os.path.splitext(selected_file)[0]}"
-    output_file = select_and_export_format(report, filename_base)
-    
-    # Mostrar vista previa
-    print("\n📄 Vista previa del informe:\n")
-    print(report[:500] + "...\n")
-    print(f"Informe completo disponible en: {output_file}")
+    output_files = select_and_export_format(report, filename_base, markdown_file)
+    print(f"\nInforme completo disponible en: {', '.join(output_files)}")
 
 def handle_database_integration():
     """Maneja el flujo de trabajo para integración con base de datos."""
     integration = DatabaseIntegration()
-    success, message = integration.verify_connection()
+    with span("stage.connect", profile=True):
+        success, message = integration.verify_connection()
     if not success:
         print(f"❌ {message}")
         return
 
     print(f"✅ {message}")
 
+    # Tipo de resumen: filas de ejemplo por tabla o estadísticas del catálogo
+    print("\n📊 Tipo de resumen:")
+    print("1. Filas de ejemplo de cada tabla")
+    print("2. Estadísticas del catálogo (PostgreSQL: filas estimadas, tipos, nulos, valores frecuentes)")
+    mode = "catalog" if input("\nSeleccione una opción (número): ").strip() == "2" else "sample"
+
     # Obtener datos de la tabla users
-    data, msg = integration.fetch_database_overview()
+    with span("stage.fetch", profile=True):
+        data, msg = integration.fetch_database_overview(mode=mode)
     print(f"\n📁 {msg}")
 
     if not data:
@@ -220,27 +328,45 @@ def handle_database_integration():
         return
 
     # Generar datos para el informe
-    report_data = integration.generate_report_data(data)
+    with span("stage.prepare", profile=True):
+        report_data = integration.generate_report_data(data)
 
     # Generar informe con AI
-    print("\n🧠 Generando informe con OpenAI...")
-    report = generate_report(
+    filename_base = "db_users"
+    report, markdown_file = stream_and_save_report(
         report_data,
         "Base de datos - users",
+        filename_base,
         report_focus="general"
     )
 
     # Seleccionar formato de salida
-    filename_base = "db_users"
-    output_file = select_and_export_format(report, filename_base)
+    output_files = select_and_export_format(report, filename_base, markdown_file)
+    print(f"\nInforme completo disponible en: {', '.join(output_files)}")
+
+def stream_and_save_report(report_data, report_type, filename_base, report_focus="general"):
+    """Genera el informe mostrándolo en consola a medida que llega y guardándolo en Markdown."""
+    print("\n🧠 Generando informe con OpenAI...\n")
+    timings = {}
+    with span("stage.generate", profile=True, report_type=report_type) as current, \
+            MarkdownStreamWriter(filename_base) as writer:
+        for text in stream_report(report_data, report_type, report_focus=report_focus,
+                                  timings=timings):
+            print(text, end="", flush=True)
+            writer.write(text)
+        current.set(first_token_seconds=timings.get("first_token"))
+    
+    print(f"\n\n⏱️ Primer token en {timings.get('first_token', 0):.2f}s, "
+          f"generación total en {timings.get('total', 0):.2f}s")
+    return writer.getvalue(), writer.filename
 
-    # Mostrar vista previa
-    print("\n📄 Vista previa del informe:\n")
-    print(report[:500] + "...\n")
-    print(f"Informe completo disponible en: {output_file}")
+def select_and_export_format(report, filename_base, markdown_file=None):
+    """Permite seleccionar uno o varios formatos de salida y exporta el informe.
 
-def select_and_export_format(report, filename_base):
-    """Permite seleccionar el formato de salida y exporta el informe."""
+    Si el informe ya se guardó en Markdown durante la generación
+    (markdown_file), ese archivo se reutiliza para el formato md. Devuelve
+    la lista de archivos generados.
+    """
     # Formato de salida
     format_options = {
         1: {"name": "Markdown (.md)", "code": "md"},
@@ -253,24 +379,35 @@ def select_and_export_format(report, filename_base):
     print("\n📂 Seleccione el formato de salida:")
     for k, v in format_options.items():
         print(f"{k}. {v['name']}")
+    print("0. Todos")
     
-    # Obtener selección
-    selected_format = "md"  # Valor predeterminado
+    # Obtener selección (uno o varios números separados por comas)
+    selected_formats = ["md"]  # Valor predeterminado
     try:
-        format_choice = int(input("\nSeleccione formato (número): "))
-        format_config = format_options.get(format_choice)
-        if format_config:
-            selected_format = format_config["code"]
-        else:
-            print("❌ Formato no válido, usando Markdown")
+        choices = [int(c) for c in input("\nSeleccione formatos (números separados por comas): ").split(",")]
+        if 0 in choices:
+            choices = list(format_options)
+        selected_formats = [format_options[c]["code"] for c in choices]
     except (ValueError, KeyError):
         print("❌ Formato no válido, usando Markdown")
     
     # Convertir y guardar
-    output_file = convert_report(report, selected_format, filename_base)
-    print(f"\n✅ Informe guardado como: {output_file}")
-    
-    return output_file
+    output_files = []
+    if "md" in selected_formats and markdown_file:
+        selected_formats.remove("md")
+        output_files.append(markdown_file)
+        print(f"\n✅ Informe guardado como: {markdown_file}")
+    
+    with span("stage.export", profile=True, formats=",".join(selected_formats)):
+        results = convert_report_formats(report, selected_formats, filename_base)
+    for output_format, result in results.items():
+        if result.get("error"):
+            print(f"❌ Error al exportar a {output_format}: {result['error']}")
+            continue
+        output_files.append(result["path"])
+        print(f"✅ Informe guardado como: {result['path']} ({result['seconds']:.2f}s)")
+    
+    return output_files
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
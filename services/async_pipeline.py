@@ -0,0 +1,256 @@
+import time
+import asyncio
+import httpx
+from openai import AsyncOpenAI
+from jira.resources import Issue
+import config
+from integrations.jira import JiraIntegration, build_jql, get_report_fields, PAGE_SIZE
+from services.openai import (prepare_report_messages, report_cache_key, response_cache,
+                             generate_report, record_usage)
+from services.prompt import estimate_tokens
+from services.exports import convert_report_formats
+from services.tracing import span, add, record
+from services.pipeline import (DATA_COLLECTORS, ReportJobError, normalize_formats, describe_job,
+                               DEFAULT_WORKERS, collect_exports)
+
+# Concurrencia máxima por servicio externo
+JIRA_CONCURRENCY = 16
+OPENAI_CONCURRENCY = 8
+DATABASE_CONCURRENCY = 4
+HTTP_TIMEOUT = 60
+# Reintentos de Jira ante 429, errores 5xx o de conexión, como la sesión del cliente síncrono
+JIRA_MAX_RETRIES = 3
+JIRA_RETRY_STATUSES = {429, 500, 502, 503, 504}
+JIRA_MAX_RETRY_SECONDS = 60
+
+def _retry_delay(response, attempt):
+    """Espera antes del siguiente intento: Retry-After si el servidor lo indica, si no 1, 2, 4... s."""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    try:
+        delay = float(retry_after)
+    except (TypeError, ValueError):
+        delay = 2 ** attempt
+    return min(max(delay, 0), JIRA_MAX_RETRY_SECONDS)
+
+class AsyncJiraClient:
+    """Cliente mínimo y asíncrono de la API REST de búsqueda de Jira."""
+
+    def __init__(self, server, username, token, semaphore):
+        self.server = server
+        self.semaphore = semaphore
+        self.http = httpx.AsyncClient(
+            base_url=server or "",
+            auth=(username or "", token or ""),
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=JIRA_CONCURRENCY * 2),
+        )
+
+    async def search(self, jql, start_at=0, max_results=PAGE_SIZE, fields=None):
+        """Una página de /rest/api/2/search como JSON.
+
+        Las respuestas 429 y 5xx y los errores de conexión se reintentan
+        hasta JIRA_MAX_RETRIES veces, respetando Retry-After; la espera no
+        ocupa un turno del semáforo.
+        """
+        params = {"jql": jql, "startAt": start_at, "maxResults": max_results}
+        if fields:
+            params["fields"] = ",".join(fields)
+        for attempt in range(JIRA_MAX_RETRIES + 1):
+            response = None
+            try:
+                async with self.semaphore:
+                    response = await self.http.get("/rest/api/2/search", params=params)
+            except httpx.TransportError:
+                if attempt == JIRA_MAX_RETRIES:
+                    raise
+            else:
+                add(requests=1, bytes=len(response.content))
+                if response.status_code not in JIRA_RETRY_STATUSES or attempt == JIRA_MAX_RETRIES:
+                    break
+            add(retries=1)
+            await asyncio.sleep(_retry_delay(response, attempt))
+        response.raise_for_status()
+        return response.json()
+
+    async def search_all(self, jql, fields=None, page_size=PAGE_SIZE):
+        """Todas las páginas de una consulta, solicitadas en paralelo tras la primera.
+
+        Devuelve objetos jira.resources.Issue para que generate_report_data
+        funcione igual que con el cliente síncrono.
+        """
+        if "order by" not in jql.lower():
+            jql = f"{jql} ORDER BY key ASC"
+        first = await self.search(jql, 0, page_size, fields)
+        raw_issues = list(first.get("issues", []))
+        total = first.get("total", len(raw_issues))
+        if 0 < len(raw_issues) < min(page_size, total):
+            page_size = len(raw_issues)
+
+        pages = await asyncio.gather(*(
+            self.search(jql, offset, page_size, fields)
+            for offset in range(len(raw_issues), total, page_size)
+        ))
+        for page in pages:
+            raw_issues.extend(page.get("issues", []))
+        record(issues=len(raw_issues))
+        options = {"server": self.server}
+        return [Issue(options, None, raw=raw) for raw in raw_issues]
+
+    async def aclose(self):
+        await self.http.aclose()
+
+class AsyncBackends:
+    """Clientes compartidos y límites de concurrencia por servicio para un lote."""
+
+    def __init__(self, jira_concurrency=JIRA_CONCURRENCY, openai_concurrency=OPENAI_CONCURRENCY,
+                 database_concurrency=DATABASE_CONCURRENCY):
+        self.jira_semaphore = asyncio.Semaphore(jira_concurrency)
+        self.openai_semaphore = asyncio.Semaphore(openai_concurrency)
+        self.database_semaphore = asyncio.Semaphore(database_concurrency)
+        self.jira = AsyncJiraClient(config.JIRA_CONFIG["server"], config.JIRA_CONFIG["username"],
+                                    config.JIRA_CONFIG["token"], self.jira_semaphore)
+        self.openai = AsyncOpenAI(api_key=config.OPENAI_API_KEY)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.jira.aclose()
+        await self.openai.close()
+
+async def _timed(timings, name, awaitable):
+    start = time.perf_counter()
+    try:
+        # Sin cProfile: las etapas de varios informes se intercalan en el mismo hilo
+        with span(f"stage.{name}"):
+            return await awaitable
+    finally:
+        timings[name] = time.perf_counter() - start
+
+async def collect_jira_data_async(job, backends, timings):
+    """Obtiene y prepara los datos de Jira con el cliente asíncrono.
+
+    No usa el almacén local: cada trabajo consulta Jira directamente.
+    """
+    project_key = job.get("project")
+    if not project_key:
+        raise ReportJobError("Falta 'project' para la integración jira")
+    focus = job.get("report_focus", "general")
+    if focus not in config.JIRA_REPORT_OPTIONS:
+        raise ReportJobError(f"Enfoque de Jira desconocido: {focus}")
+
+    params = config.JIRA_REPORT_OPTIONS[focus]["params"]
+    jql = build_jql(project_key, sprint_state=params.get("sprint_state"))
+    issues = await _timed(timings, "fetch", backends.jira.search_all(jql, get_report_fields()))
+
+    integration = JiraIntegration(config.JIRA_CONFIG)
+    report_data = await _timed(timings, "prepare", asyncio.to_thread(
+        integration.generate_report_data, issues, crosstabs=[("status", "assignee")]
+    ))
+    return {
+        "report_data": report_data,
+        "report_type": f"Jira - {job.get('title', project_key)}",
+        "report_focus": focus,
+        "output": job.get("output", f"jira_{project_key}"),
+    }
+
+async def generate_report_async(backends, report_data, report_type, report_focus="general",
+                                format_type="markdown"):
+    """Genera el informe con el cliente asíncrono de OpenAI, usando la caché de respuestas.
+
+    Si los datos no caben en el presupuesto, la generación por fragmentos
+    se ejecuta en un hilo con el cliente síncrono, ocupando un turno de
+    OpenAI y con sus llamadas de una en una para no superar el límite.
+    """
+    budget = config.OPENAI_PROMPT_TOKEN_BUDGET
+    key = report_cache_key(report_data, report_type, format_type, report_focus, budget, "auto")
+    if response_cache.enabled:
+        cached = response_cache.get(key)
+        if cached is not None:
+            record(cache="hit")
+            return cached
+
+    if estimate_tokens(report_data) > budget:
+        async with backends.openai_semaphore:
+            return await asyncio.to_thread(generate_report, report_data, report_type,
+                                           format_type, report_focus, max_workers=1)
+
+    system_message, user_message, _ = await asyncio.to_thread(
+        prepare_report_messages, report_data, report_type, format_type, report_focus, budget, "single"
+    )
+    with span("openai.complete", model=config.OPENAI_MODEL) as current:
+        async with backends.openai_semaphore:
+            response = await backends.openai.chat.completions.create(
+                model=config.OPENAI_MODEL,
+                messages=[
+                    {"role": "system", "content": system_message},
+                    {"role": "user", "content": user_message}
+                ],
+                temperature=config.OPENAI_TEMPERATURE
+            )
+        record_usage(current, response)
+    report = response.choices[0].message.content
+    if response_cache.enabled and report:
+        response_cache.set(key, report)
+    return report
+
+async def run_report_job_async(job, backends):
+    """Versión asíncrona de services.pipeline.run_report_job, con el mismo resultado."""
+    timings = {}
+    result = {"job": job, "outputs": {}, "timings": timings, "error": None}
+    start = time.perf_counter()
+    with span("report", integration=job.get("integration"), job=describe_job(job), mode="async") as report_span:
+        try:
+            integration = job.get("integration")
+            if integration == "jira":
+                collected = await collect_jira_data_async(job, backends, timings)
+            elif integration == "database":
+                async with backends.database_semaphore:
+                    collected = await asyncio.to_thread(DATA_COLLECTORS[integration], job, timings)
+            elif integration in DATA_COLLECTORS:
+                collected = await asyncio.to_thread(DATA_COLLECTORS[integration], job, timings)
+            else:
+                raise ReportJobError(f"Integración {integration} no implementada.")
+
+            report = await _timed(timings, "generate", generate_report_async(
+                backends, collected["report_data"], collected["report_type"], collected["report_focus"]
+            ))
+            if report.startswith("Error al generar informe"):
+                raise ReportJobError(report)
+
+            exports = await _timed(timings, "export", asyncio.to_thread(
+                convert_report_formats, report, normalize_formats(job.get("formats")), collected["output"]
+            ))
+            collect_exports(result, exports)
+        except Exception as e:
+            result["error"] = report_span.error = str(e)
+        timings["total"] = time.perf_counter() - start
+    return result
+
+async def run_jobs_async(jobs, max_concurrent_reports=DEFAULT_WORKERS, **concurrency):
+    """Ejecuta los trabajos de forma concurrente en un único proceso.
+
+    max_concurrent_reports limita los informes en curso; los límites por
+    servicio (jira_concurrency, openai_concurrency, database_concurrency)
+    acotan las peticiones simultáneas a cada backend.
+    """
+    report_semaphore = asyncio.Semaphore(max_concurrent_reports)
+    results = [None] * len(jobs)
+    done = 0
+
+    async with AsyncBackends(**concurrency) as backends:
+        async def run(i, job):
+            nonlocal done
+            async with report_semaphore:
+                results[i] = await run_report_job_async(job, backends)
+            done += 1
+            status = "❌" if results[i]["error"] else "✅"
+            print(f"{status} [{done}/{len(jobs)}] {describe_job(job)} "
+                  f"({results[i]['timings']['total']:.1f}s)")
+
+        await asyncio.gather(*(run(i, job) for i, job in enumerate(jobs)))
+    return results
+
+def run_manifest_async(jobs, workers=DEFAULT_WORKERS, **concurrency):
+    """Punto de entrada síncrono de run_jobs_async."""
+    return asyncio.run(run_jobs_async(jobs, workers, **concurrency))
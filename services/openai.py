@@ -1,31 +1,133 @@
+import os
 import json
+import time
+import hashlib
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
-from config import OPENAI_API_KEY, OPENAI_MODEL, OPENAI_TEMPERATURE
+from config import (OPENAI_API_KEY, OPENAI_MODEL, OPENAI_TEMPERATURE, OPENAI_PROMPT_TOKEN_BUDGET,
+                    OPENAI_CHUNK_TOKENS, OPENAI_MAX_CONCURRENCY, OPENAI_CACHE_CONFIG)
+from services.prompt import (build_prompt_data, count_tokens, estimate_tokens, split_detail, to_json,
+                            DETAIL_KEYS)
+from services.tracing import span, traced, record, add
 
 # Cliente de OpenAI
 client = OpenAI(api_key=OPENAI_API_KEY)
 
-def generate_report(data, report_type, format_type="markdown", report_focus="general"):
-    """Genera un informe usando OpenAI basado en los datos proporcionados."""
-    
+class ResponseCache:
+    """Caché en disco de respuestas, direccionada por contenido.
+
+    Cada entrada es un JSON cuyo nombre es el SHA-256 de sus parámetros
+    canónicos. Las entradas caducan tras ttl_seconds y, al superar
+    max_entries o max_bytes, se eliminan las usadas hace más tiempo (LRU
+    según la fecha de modificación, que se actualiza en cada acierto).
+    """
+
+    def __init__(self, directory, ttl_seconds, max_entries, max_bytes, enabled=True):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts):
+        """Hash de los parámetros serializados de forma canónica."""
+        canonical = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """Devuelve la respuesta almacenada o None si no existe o ha caducado."""
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        if time.time() - entry.get("created", 0) > self.ttl_seconds:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.stats["hits"] += 1
+        return entry["value"]
+
+    def set(self, key, value):
+        """Guarda una respuesta y aplica los límites de tamaño."""
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"created": time.time(), "value": value}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Elimina las entradas menos usadas hasta cumplir max_entries y max_bytes."""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            entries.sort()
+            total_bytes = sum(size for _, size, _ in entries)
+            while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+                _, size, path = entries.pop(0)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total_bytes -= size
+
+response_cache = ResponseCache(
+    OPENAI_CACHE_CONFIG["dir"],
+    OPENAI_CACHE_CONFIG["ttl_seconds"],
+    OPENAI_CACHE_CONFIG["max_entries"],
+    OPENAI_CACHE_CONFIG["max_bytes"],
+    enabled=OPENAI_CACHE_CONFIG["enabled"],
+)
+
+# Instrucciones específicas según el enfoque
+FOCUS_INSTRUCTIONS = {
+    "general": """Enfócate en dar una visión general de todos los datos, mostrando tendencias y patrones.""",
+    "sprint_activo": """Este es un análisis del sprint activo. Enfócate en el progreso, distribución de incidencias y posibles riesgos.""",
+    "sprints_finalizados": """Analiza los sprints finalizados para identificar tendencias, eficiencia y lecciones aprendidas.""",
+    "etiquetas": """Realiza un análisis detallado de las etiquetas, su relación con otros elementos y recomendaciones.""",
+    "jerarquico": """Analiza la estructura jerárquica, identificando épicas principales, su progreso y dependencias.""",
+    "excel_data": """Analiza los datos de Excel proporcionados, identificando tendencias, valores atípicos y oportunidades de mejora.
+    "hojas" contiene solo las primeras filas de cada hoja; usa "perfil_hojas" (estadísticas de las hojas completas: tipos, nulos, rangos, cuantiles, histogramas y valores más frecuentes) para las conclusiones sobre el conjunto."""
+}
+
+def build_system_message(report_type, report_focus="general"):
+    """Construye las instrucciones de sistema del informe final."""
     # Instrucciones base
     system_base = f"""Eres un analista experto en generación de informes profesionales de {report_type}.
     Tu tarea es crear un informe detallado, claro y ejecutivo basado en los datos proporcionados.
     """
-    
-    # Instrucciones específicas según el enfoque
-    focus_instructions = {
-        "general": """Enfócate en dar una visión general de todos los datos, mostrando tendencias y patrones.""",
-        "sprint_activo": """Este es un análisis del sprint activo. Enfócate en el progreso, distribución de incidencias y posibles riesgos.""",
-        "sprints_finalizados": """Analiza los sprints finalizados para identificar tendencias, eficiencia y lecciones aprendidas.""",
-        "etiquetas": """Realiza un análisis detallado de las etiquetas, su relación con otros elementos y recomendaciones.""",
-        "jerarquico": """Analiza la estructura jerárquica, identificando épicas principales, su progreso y dependencias.""",
-        "excel_data": """Analiza los datos de Excel proporcionados, identificando tendencias, valores atípicos y oportunidades de mejora."""
-    }
-    
+
     # Combinar instrucciones
-    system_message = system_base + focus_instructions.get(report_focus, focus_instructions["general"])
-    
+    system_message = system_base + FOCUS_INSTRUCTIONS.get(report_focus, FOCUS_INSTRUCTIONS["general"])
+
     # Añadir estructura estándar del informe
     system_message += """
     El informe debe incluir:
@@ -35,24 +137,336 @@ def generate_report(data, report_type, format_type="markdown", report_focus="gen
     4. Conclusiones y recomendaciones
     5. Formato profesional y estructurado
     """
-    
+    return system_message
+
+def complete(system_message, user_message, use_cache=True):
+    """Realiza una llamada de chat y devuelve el texto de la respuesta.
+
+    Las respuestas se guardan en response_cache, de modo que repetir una
+    llamada idéntica (p. ej. los fragmentos ya resumidos antes de un fallo)
+    no vuelve a consultar el modelo.
+    """
+    use_cache = use_cache and response_cache.enabled
+    with span("openai.complete", model=OPENAI_MODEL) as current:
+        if use_cache:
+            key = response_cache.make_key(OPENAI_MODEL, OPENAI_TEMPERATURE, system_message, user_message)
+            cached = response_cache.get(key)
+            if cached is not None:
+                current.set(cache="hit")
+                return cached
+
+        response = client.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=[
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": user_message}
+            ],
+            temperature=OPENAI_TEMPERATURE
+        )
+        content = response.choices[0].message.content
+        record_usage(current, response)
+        if use_cache and content:
+            response_cache.set(key, content)
+        return content
+
+def record_usage(current, response):
+    """Anota en el span los tokens del prompt y de la respuesta que informa la API."""
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        current.add(prompt_tokens=getattr(usage, "prompt_tokens", 0),
+                    completion_tokens=getattr(usage, "completion_tokens", 0))
+
+def report_cache_key(data, report_type, format_type="markdown", report_focus="general",
+                     token_budget=OPENAI_PROMPT_TOKEN_BUDGET, strategy="auto"):
+    """Clave de caché de un informe completo a partir de sus parámetros canónicos."""
+    return response_cache.make_key(
+        OPENAI_MODEL, OPENAI_TEMPERATURE, build_system_message(report_type, report_focus),
+        report_focus, format_type, token_budget, strategy, data
+    )
+
+def prepare_report_messages(data, report_type, format_type="markdown", report_focus="general",
+                            token_budget=OPENAI_PROMPT_TOKEN_BUDGET, strategy="auto",
+                            chunk_tokens=OPENAI_CHUNK_TOKENS, max_workers=OPENAI_MAX_CONCURRENCY,
+                            use_cache=True):
+    """Prepara los mensajes de la llamada que redacta el informe.
+
+    Con strategy="single" los datos se ajustan a token_budget (ver
+    services/prompt.build_prompt_data). Con strategy="map_reduce" antes se
+    resume el detalle por fragmentos (ver prepare_map_reduce_messages).
+    strategy="auto" usa map-reduce solo si los datos no caben en el
+    presupuesto según estimate_tokens, que no tokeniza el detalle completo.
+    Devuelve (system_message, user_message, uso).
+    """
+    if strategy == "map_reduce" or (
+            strategy == "auto" and estimate_tokens(data) > token_budget):
+        return prepare_map_reduce_messages(data, report_type, format_type, report_focus,
+                                           token_budget, chunk_tokens, max_workers, use_cache)
+
+    # Ajustar los datos al presupuesto de tokens
+    prompt_data, usage = build_prompt_data(data, token_budget)
+    print_prompt_usage(usage)
+
     user_message = f"""Por favor genera un informe de {report_type} con los siguientes datos:
-    
-    {json.dumps(data, indent=2, ensure_ascii=False)}
-    
+
+    {to_json(prompt_data)}
+
     El informe debe ser en español y en formato {format_type}.
     """
-    
+    return build_system_message(report_type, report_focus), user_message, usage
+
+@traced("openai.generate_report")
+def generate_report(data, report_type, format_type="markdown", report_focus="general",
+                    token_budget=OPENAI_PROMPT_TOKEN_BUDGET, return_usage=False,
+                    strategy="auto", chunk_tokens=OPENAI_CHUNK_TOKENS,
+                    max_workers=OPENAI_MAX_CONCURRENCY, use_cache=True):
+    """Genera un informe usando OpenAI basado en los datos proporcionados.
+
+    Ver prepare_report_messages para las estrategias de envío de datos.
+    Con return_usage=True devuelve (informe, uso).
+
+    Si el mismo informe (modelo, temperatura, instrucciones, enfoque y datos
+    canónicos) ya se generó, se devuelve desde response_cache; use_cache=False
+    fuerza una nueva generación.
+    """
+    use_cache = use_cache and response_cache.enabled
+    if use_cache:
+        report_key = report_cache_key(data, report_type, format_type, report_focus,
+                                      token_budget, strategy)
+        cached = response_cache.get(report_key)
+        if cached is not None:
+            print(f"⚡ Informe recuperado de la caché ({response_cache.stats['hits']} aciertos, "
+                  f"{response_cache.stats['misses']} fallos)")
+            record(cache="hit")
+            return (cached, {"cache": "hit"}) if return_usage else cached
+
+    usage = {}
     try:
-        response = client.chat.completions.create(
+        system_message, user_message, usage = prepare_report_messages(
+            data, report_type, format_type, report_focus, token_budget, strategy,
+            chunk_tokens, max_workers, use_cache
+        )
+        record(strategy=strategy, chunks=usage.get("chunks", 0), prompt_estimate=usage.get("total"))
+        # La respuesta completa se guarda bajo report_key, no por mensaje
+        report = complete(system_message, user_message, use_cache=False)
+        note = omission_note(usage)
+        report += note
+        # Un informe al que le faltan datos no se guarda: se regenerará completo
+        if use_cache and not note:
+            response_cache.set(report_key, report)
+    except Exception as e:
+        report = f"Error al generar informe: {str(e)}"
+        record(error=str(e))
+
+    return (report, usage) if return_usage else report
+
+def stream_report(data, report_type, format_type="markdown", report_focus="general",
+                  token_budget=OPENAI_PROMPT_TOKEN_BUDGET, strategy="auto",
+                  chunk_tokens=OPENAI_CHUNK_TOKENS, max_workers=OPENAI_MAX_CONCURRENCY,
+                  use_cache=True, timings=None):
+    """Genera el informe como generate_report, pero devuelve el texto a medida que llega.
+
+    Es un generador de fragmentos de texto. Si se pasa el diccionario
+    timings, se rellena con "prepare" (preparación del prompt y fase map),
+    "first_token" (tiempo hasta el primer fragmento) y "total", en segundos.
+    """
+    timings = timings if timings is not None else {}
+    start = time.perf_counter()
+    use_cache = use_cache and response_cache.enabled
+    if use_cache:
+        report_key = report_cache_key(data, report_type, format_type, report_focus,
+                                      token_budget, strategy)
+        cached = response_cache.get(report_key)
+        if cached is not None:
+            timings["prepare"] = timings["first_token"] = timings["total"] = time.perf_counter() - start
+            yield cached
+            return
+
+    try:
+        system_message, user_message, usage = prepare_report_messages(
+            data, report_type, format_type, report_focus, token_budget, strategy,
+            chunk_tokens, max_workers, use_cache
+        )
+        timings["prepare"] = time.perf_counter() - start
+        stream = client.chat.completions.create(
             model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": system_message},
                 {"role": "user", "content": user_message}
             ],
-            temperature=OPENAI_TEMPERATURE
+            temperature=OPENAI_TEMPERATURE,
+            stream=True,
+            # El último fragmento trae los tokens consumidos (para las trazas)
+            stream_options={"include_usage": True}
         )
-        
-        return response.choices[0].message.content
+        parts = []
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                add(prompt_tokens=chunk.usage.prompt_tokens, completion_tokens=chunk.usage.completion_tokens)
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if not text:
+                continue
+            if not parts:
+                timings["first_token"] = time.perf_counter() - start
+            parts.append(text)
+            yield text
+        note = omission_note(usage)
+        if note and parts:
+            yield note
+        elif use_cache and parts:
+            response_cache.set(report_key, "".join(parts))
     except Exception as e:
-        return f"Error al generar informe: {str(e)}"
\ No newline at end of file
+        timings.setdefault("first_token", time.perf_counter() - start)
+        yield f"Error al generar informe: {str(e)}"
+    finally:
+        timings["total"] = time.perf_counter() - start
+
+def summarize_chunk(chunk, index, total, report_type, report_focus="general", use_cache=True):
+    """Fase map: resume un fragmento de los datos de detalle."""
+    system_message = f"""Eres un analista experto en datos de {report_type}.
+    Recibes el fragmento {index} de {total} de un conjunto de datos mayor.
+    Extrae de forma concisa los hechos relevantes: cifras, tendencias, valores atípicos,
+    riesgos y elementos destacados, citando claves o identificadores cuando existan.
+    No redactes un informe completo; tu resumen se combinará con los de otros fragmentos.
+    """ + FOCUS_INSTRUCTIONS.get(report_focus, FOCUS_INSTRUCTIONS["general"])
+    user_message = f"""Fragmento {index}/{total}:
+
+    {to_json(chunk)}
+
+    Responde en español con viñetas en Markdown.
+    """
+    return complete(system_message, user_message, use_cache)
+
+def merge_summaries(summaries, report_type, use_cache=True):
+    """Combina varios resúmenes parciales en uno solo (reducción intermedia)."""
+    system_message = f"""Eres un analista experto en datos de {report_type}.
+    Combina los siguientes resúmenes parciales en un único resumen conciso,
+    sin perder cifras, valores atípicos ni riesgos relevantes.
+    """
+    user_message = "\n\n".join(f"### Resumen {i}\n{summary}" for i, summary in enumerate(summaries, 1))
+    return complete(system_message, user_message, use_cache)
+
+def group_by_tokens(summaries, budget):
+    """Agrupa resúmenes consecutivos para combinarlos sin superar budget tokens por llamada.
+
+    Cada grupo lleva al menos dos resúmenes (aunque juntos superen budget)
+    para que cada ronda de reducción avance.
+    """
+    groups, current, current_tokens = [], [], 0
+    for summary in summaries:
+        tokens = count_tokens(summary)
+        if len(current) >= 2 and current_tokens + tokens > budget:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(summary)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+def omission_note(usage):
+    """Nota para el final del informe si parte del detalle se perdió en la generación por fragmentos."""
+    failed, failed_merges = usage.get("failed", 0), usage.get("failed_merges", 0)
+    if not failed and not failed_merges:
+        return ""
+    parts = []
+    if failed:
+        parts.append(f"{failed} de {usage.get('chunks', failed)} fragmentos de los datos no pudieron resumirse")
+    if failed_merges:
+        parts.append(f"{failed_merges} combinaciones de resúmenes parciales fallaron")
+    return (f"\n\n> ⚠️ Nota: {' y '.join(parts)}; esa parte de los datos no está reflejada "
+            "en este informe.\n")
+
+def _run_parallel(func, items, max_workers):
+    """Ejecuta func sobre cada elemento con paralelismo acotado, conservando el orden."""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Cada llamada con una copia del contexto, para que sus spans cuelguen del actual
+        futures = [executor.submit(contextvars.copy_context().run, func, *item) for item in items]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+def prepare_map_reduce_messages(data, report_type, format_type="markdown", report_focus="general",
+                                token_budget=OPENAI_PROMPT_TOKEN_BUDGET,
+                                chunk_tokens=OPENAI_CHUNK_TOKENS,
+                                max_workers=OPENAI_MAX_CONCURRENCY, use_cache=True):
+    """Resume el detalle por fragmentos (map) y prepara la llamada final (reduce).
+
+    Las secciones fijas (statistics, contexto...) van completas a la llamada
+    final; el detalle se divide en fragmentos de chunk_tokens que se resumen
+    con hasta max_workers llamadas simultáneas. Si los resúmenes no caben en
+    el presupuesto se combinan por grupos de hasta token_budget tokens. Los
+    fragmentos y combinaciones que fallan se omiten y se cuentan en
+    usage["failed"] y usage["failed_merges"] (ver omission_note); si fallan
+    todos se lanza la primera excepción.
+    """
+    chunks = split_detail(data, chunk_tokens)
+    total = len(chunks)
+    print(f"🧩 Generación por fragmentos: {total} fragmentos, {max_workers} en paralelo")
+
+    results = _run_parallel(
+        lambda index, chunk: summarize_chunk(chunk, index, total, report_type, report_focus, use_cache),
+        list(enumerate(chunks, 1)), max_workers
+    )
+    errors = [result for result in results if isinstance(result, Exception)]
+    summaries = [result for result in results if not isinstance(result, Exception)]
+    if errors:
+        print(f"⚠️ {len(errors)} de {total} fragmentos no pudieron resumirse: {errors[0]}")
+    if total and not summaries:
+        raise errors[0]
+
+    # Datos fijos + jerarquía ajustados a medio presupuesto; el resto queda para los resúmenes
+    fixed = {}
+    if isinstance(data, dict):
+        fixed = {key: value for key, value in data.items()
+                 if key not in DETAIL_KEYS or key == "hierarchy"}
+    fixed_data, usage = build_prompt_data(fixed, token_budget // 2)
+    usage["budget"] = token_budget
+    summaries_budget = token_budget - usage["total"]
+
+    # Reducción jerárquica mientras los resúmenes no quepan; cada combinación cabe en el presupuesto
+    failed_merges = 0
+    while len(summaries) > 1 and count_tokens("\n\n".join(summaries)) > summaries_budget:
+        groups = group_by_tokens(summaries, token_budget)
+        merged = _run_parallel(lambda group: merge_summaries(group, report_type, use_cache)
+                               if len(group) > 1 else group[0],
+                               [(group,) for group in groups], max_workers)
+        summaries = [result for result in merged if not isinstance(result, Exception)]
+        failed_merges += len(merged) - len(summaries)
+        if not summaries:
+            raise next(result for result in merged if isinstance(result, Exception))
+    if failed_merges:
+        print(f"⚠️ {failed_merges} combinaciones de resúmenes fallaron; sus datos se omiten")
+
+    summaries_text = "\n\n".join(f"### Fragmento {i}\n{summary}" for i, summary in enumerate(summaries, 1))
+    usage["sections"]["resumenes"] = count_tokens(summaries_text)
+    usage["total"] += usage["sections"]["resumenes"]
+    usage["chunks"] = total
+    usage["failed"] = len(errors)
+    usage["failed_merges"] = failed_merges
+    print_prompt_usage(usage)
+
+    user_message = f"""Por favor genera un informe de {report_type} con los siguientes datos agregados:
+
+    {to_json(fixed_data)}
+
+    y con los siguientes resúmenes parciales del detalle:
+
+    {summaries_text}
+
+    El informe debe ser en español y en formato {format_type}.
+    """
+    return build_system_message(report_type, report_focus), user_message, usage
+
+def print_prompt_usage(usage):
+    """Muestra los tokens gastados por sección del prompt."""
+    sections = ", ".join(f"{key}: {tokens}" for key, tokens in usage.get("sections", {}).items())
+    print(f"🧮 Tokens del prompt: {usage.get('total', 0)}/{usage.get('budget', '-')} ({sections})")
+    for key, detail in usage.get("detail", {}).items():
+        if detail["included"] < detail["total"]:
+            print(f"   {key}: {detail['included']} de {detail['total']} elementos incluidos")
\ No newline at end of file
@@ -0,0 +1,264 @@
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import config
+from integrations.jira import JiraIntegration
+from integrations.excel import ExcelIntegration
+from integrations.database import DatabaseIntegration
+from services.openai import generate_report
+from services.exports import convert_report_formats
+from services.tracing import span
+
+DEFAULT_FORMATS = ["md"]
+DEFAULT_WORKERS = 4
+
+# Alias de formatos aceptados en la línea de comandos y en los manifiestos
+FORMAT_ALIASES = {
+    "markdown": "md",
+    "xlsx": "excel",
+    "tex": "latex",
+}
+
+class ReportJobError(Exception):
+    """Error de un trabajo de informe no interactivo."""
+
+def normalize_formats(formats):
+    """Normaliza la lista de formatos de salida (acepta alias y cadenas separadas por comas)."""
+    if not formats:
+        return list(DEFAULT_FORMATS)
+    if isinstance(formats, str):
+        formats = formats.split(",")
+    return [FORMAT_ALIASES.get(f.strip().lower(), f.strip().lower()) for f in formats if f.strip()]
+
+def _stage(timings, name, func, *args, **kwargs):
+    """Ejecuta una etapa dentro de un span (ver services/tracing.py) y anota su duración en timings."""
+    start = time.perf_counter()
+    try:
+        with span(f"stage.{name}", profile=True):
+            return func(*args, **kwargs)
+    finally:
+        timings[name] = time.perf_counter() - start
+
+def collect_jira_data(job, timings):
+    """Obtiene y prepara los datos de un informe de Jira sin interacción.
+
+    Devuelve un diccionario con report_data, report_type, report_focus y output.
+    """
+    project_key = job.get("project")
+    if not project_key:
+        raise ReportJobError("Falta 'project' para la integración jira")
+    focus = job.get("report_focus", "general")
+    if focus not in config.JIRA_REPORT_OPTIONS:
+        raise ReportJobError(f"Enfoque de Jira desconocido: {focus}")
+
+    integration = JiraIntegration(config.JIRA_CONFIG)
+    success, message = _stage(timings, "connect", integration.verify_connection)
+    if not success:
+        raise ReportJobError(message)
+
+    params = {"project_key": project_key, "fetch_all": True, "use_store": job.get("use_store", True)}
+    params.update(config.JIRA_REPORT_OPTIONS[focus]["params"])
+    issues, count = _stage(timings, "fetch", integration.fetch_data, **params)
+    if isinstance(count, str):
+        raise ReportJobError(count)
+
+    report_data = _stage(timings, "prepare", integration.generate_report_data, issues,
+                         crosstabs=[("status", "assignee")])
+    return {
+        "report_data": report_data,
+        "report_type": f"Jira - {job.get('title', project_key)}",
+        "report_focus": focus,
+        "output": job.get("output", f"jira_{project_key}"),
+    }
+
+def collect_excel_data(job, timings):
+    """Obtiene y prepara los datos de un informe de Excel sin interacción."""
+    file_name = job.get("file")
+    if not file_name:
+        raise ReportJobError("Falta 'file' para la integración excel")
+
+    integration = ExcelIntegration(config.EXCEL_CONFIG)
+    sheet = job.get("sheet")
+    data, message = _stage(timings, "fetch", integration.fetch_data, file_name=file_name,
+                           sheets=[sheet] if sheet else None)
+    if data is None:
+        raise ReportJobError(message)
+    if sheet:
+        data = data[sheet]
+
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    report_data = _stage(timings, "prepare", integration.generate_report_data, data,
+                         context=job.get("context", ""), file_name=file_name,
+                         sheets=[sheet] if sheet else list(data))
+    return {
+        "report_data": report_data,
+        "report_type": f"Excel - {stem}",
+        "report_focus": job.get("report_focus", "excel_data"),
+        "output": job.get("output", f"excel_{stem}"),
+    }
+
+def collect_database_data(job, timings):
+    """Obtiene y prepara los datos de un informe de base de datos sin interacción."""
+    integration = DatabaseIntegration()
+    success, message = _stage(timings, "connect", integration.verify_connection)
+    if not success:
+        raise ReportJobError(message)
+
+    tables = job.get("tables") or ([job["table"]] if job.get("table") else None)
+    metrics = job.get("metrics")
+    if metrics:
+        # Métricas declaradas: solo se envían al informe los resultados agregados
+        if isinstance(metrics, str):
+            from integrations.database_metrics import load_metrics, MetricError
+            try:
+                metrics = load_metrics(metrics)
+            except (OSError, ValueError, MetricError) as e:
+                raise ReportJobError(f"No se pudieron cargar las métricas: {e}")
+
+    def check_metrics(metric_results, message):
+        if not metric_results or all("error" in result for result in metric_results.values()):
+            errors = [f"{name}: {result['error']}" for name, result in (metric_results or {}).items()]
+            raise ReportJobError("; ".join(errors) or message)
+
+    data = metric_results = None
+    context = job.get("context", "")
+    extract = job.get("extract")
+    if extract:
+        # Extracto en Parquet: el perfil y las métricas de esas tablas se calculan en local
+        specs = extract if isinstance(extract, list) else tables
+        if not specs:
+            raise ReportJobError("'extract' necesita 'tables' o una lista de tablas")
+        extracts, message = _stage(timings, "fetch", integration.extract_tables, specs, progress=None)
+        if not extracts or all("error" in extract for extract in extracts.values()):
+            errors = [f"{table}: {extract['error']}" for table, extract in (extracts or {}).items()]
+            raise ReportJobError("; ".join(errors) or message)
+
+        def prepare_local():
+            metric_results, message = (integration.fetch_metrics(metrics, extracts=extracts)
+                                       if metrics else (None, None))
+            if metrics:
+                check_metrics(metric_results, message)
+            return integration.generate_report_data(None, context=context, metrics=metric_results,
+                                                    profiles=integration.profile_extracts(extracts))
+
+        report_data = _stage(timings, "prepare", prepare_local)
+    elif metrics:
+        metric_results, message = _stage(timings, "fetch", integration.fetch_metrics, metrics)
+        check_metrics(metric_results, message)
+    else:
+        data, message = _stage(timings, "fetch", integration.fetch_database_overview, tables=tables,
+                               progress=None, mode=job.get("overview", "sample"))
+        if not data:
+            raise ReportJobError(message)
+
+    if not extract:
+        report_data = _stage(timings, "prepare", integration.generate_report_data, data,
+                             context=context, metrics=metric_results)
+    return {
+        "report_data": report_data,
+        "report_type": f"Base de datos - {', '.join(tables) if tables else 'resumen'}",
+        "report_focus": job.get("report_focus", "general"),
+        "output": job.get("output", f"db_{'_'.join(tables)}" if tables else "db_users"),
+    }
+
+DATA_COLLECTORS = {
+    "jira": collect_jira_data,
+    "excel": collect_excel_data,
+    "database": collect_database_data,
+}
+
+def run_report_job(job):
+    """Ejecuta un trabajo de informe completo y devuelve su resultado con tiempos por etapa.
+
+    job es un diccionario con "integration" y los parámetros de esa
+    integración (project, file, sheet, table/tables, report_focus, context,
+    formats, output). Los errores se devuelven en el resultado, no se lanzan.
+    """
+    timings = {}
+    result = {"job": job, "outputs": {}, "timings": timings, "error": None}
+    start = time.perf_counter()
+    with span("report", integration=job.get("integration"), job=describe_job(job)) as report_span:
+        try:
+            collector = DATA_COLLECTORS.get(job.get("integration"))
+            if collector is None:
+                raise ReportJobError(f"Integración {job.get('integration')} no implementada.")
+            collected = collector(job, timings)
+            report = _stage(timings, "generate", generate_report, collected["report_data"],
+                            collected["report_type"], report_focus=collected["report_focus"])
+            if report.startswith("Error al generar informe"):
+                raise ReportJobError(report)
+
+            exports = _stage(timings, "export", convert_report_formats, report,
+                             normalize_formats(job.get("formats")), collected["output"])
+            collect_exports(result, exports)
+        except Exception as e:
+            result["error"] = report_span.error = str(e)
+        timings["total"] = time.perf_counter() - start
+    return result
+
+def collect_exports(result, exports):
+    """Anota en el resultado las rutas y tiempos de cada formato exportado."""
+    result["export_timings"] = {}
+    errors = []
+    for output_format, export in exports.items():
+        if export.get("error"):
+            errors.append(f"{output_format}: {export['error']}")
+            continue
+        result["outputs"][output_format] = export["path"]
+        result["export_timings"][output_format] = export["seconds"]
+    if errors:
+        raise ReportJobError("Error al exportar " + "; ".join(errors))
+
+def load_manifest(path):
+    """Carga un manifiesto YAML o JSON y devuelve la lista de trabajos.
+
+    Formato: {"defaults": {...}, "reports": [{...}, ...]} o directamente
+    una lista de trabajos. Los valores de "defaults" se aplican a cada
+    trabajo que no los defina.
+    """
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ReportJobError("La biblioteca PyYAML no está instalada. Instálala con: pip install pyyaml")
+            manifest = yaml.safe_load(f)
+        else:
+            manifest = json.load(f)
+
+    if isinstance(manifest, list):
+        manifest = {"reports": manifest}
+    defaults = manifest.get("defaults", {})
+    return [{**defaults, **job} for job in manifest.get("reports", [])]
+
+def describe_job(job):
+    """Descripción breve de un trabajo para los resúmenes."""
+    target = job.get("project") or job.get("file") or job.get("table") or ",".join(job.get("tables", [])) or "-"
+    return f"{job.get('integration')}:{target}"
+
+def run_manifest(jobs, workers=DEFAULT_WORKERS):
+    """Ejecuta los trabajos con hasta workers en paralelo y devuelve sus resultados en orden."""
+    results = [None] * len(jobs)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_report_job, job): i for i, job in enumerate(jobs)}
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            results[i] = future.result()
+            status = "❌" if results[i]["error"] else "✅"
+            print(f"{status} [{done}/{len(jobs)}] {describe_job(jobs[i])} "
+                  f"({results[i]['timings']['total']:.1f}s)")
+    return results
+
+def print_summary(results):
+    """Imprime una tabla con los tiempos por etapa de cada trabajo."""
+    stages = ["connect", "fetch", "prepare", "generate", "export", "total"]
+    print("\n📊 Resumen de tiempos (s):")
+    print(f"{'informe':<40}" + "".join(f"{stage:>10}" for stage in stages) + "  estado")
+    for result in results:
+        timings = result["timings"]
+        row = "".join(f"{timings[stage]:>10.2f}" if stage in timings else f"{'-':>10}" for stage in stages)
+        status = f"error: {result['error']}" if result["error"] else "ok"
+        print(f"{describe_job(result['job'])[:40]:<40}{row}  {status}")
+    failed = sum(1 for result in results if result["error"])
+    print(f"\n{len(results) - failed} informes generados, {failed} con errores.")
@@ -0,0 +1,242 @@
+import json
+from config import OPENAI_MODEL
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Aproximación cuando tiktoken no está disponible
+CHARS_PER_TOKEN = 4
+# Longitud máxima de los textos largos (descripciones) antes de recortar
+MAX_TEXT_CHARS = 400
+TRUNCATION_MARK = "…"
+# Registros usados para calibrar la estimación de tokens por registro
+CALIBRATION_SAMPLE = 200
+
+# Secciones de detalle que se recortan para ajustarse al presupuesto, en orden de prioridad.
+# El resto de claves (statistics, total_issues, contexto_usuario...) se conserva siempre.
+DETAIL_KEYS = ["issues", "hojas", "resumen_bd", "hierarchy"]
+
+_encoders = {}
+
+def _get_encoder(model):
+    if tiktoken is None:
+        return None
+    if model not in _encoders:
+        try:
+            _encoders[model] = tiktoken.encoding_for_model(model)
+        except Exception:
+            try:
+                _encoders[model] = tiktoken.get_encoding("o200k_base")
+            except Exception:
+                _encoders[model] = None
+    return _encoders[model]
+
+def count_tokens(text, model=OPENAI_MODEL):
+    """Cuenta los tokens de un texto con tiktoken, o los estima si no está instalado."""
+    encoder = _get_encoder(model)
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def to_json(data):
+    """Serializa los datos para el prompt sin espacios superfluos."""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+
+def truncate_text(value, max_chars=MAX_TEXT_CHARS):
+    """Recorta un texto largo conservando su inicio."""
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars] + TRUNCATION_MARK
+    return value
+
+def _truncate_record(record, max_chars=MAX_TEXT_CHARS):
+    if isinstance(record, dict):
+        return {key: truncate_text(value, max_chars) for key, value in record.items()}
+    return truncate_text(record, max_chars)
+
+def _sample_evenly(items, count):
+    """Selecciona count elementos repartidos uniformemente, conservando el orden."""
+    if count >= len(items):
+        return list(items)
+    if count <= 0:
+        return []
+    step = len(items) / count
+    return [items[int(i * step)] for i in range(count)]
+
+def estimate_costs(items, model=OPENAI_MODEL):
+    """Estima los tokens de cada elemento sin tokenizarlos todos.
+
+    Se calibra la relación tokens/carácter con una muestra uniforme y se
+    aplica a la longitud JSON de cada elemento.
+    """
+    sample_json = to_json(_sample_evenly(items, CALIBRATION_SAMPLE))
+    ratio = count_tokens(sample_json, model) / max(len(sample_json), 1)
+    return [len(to_json(item)) * ratio + 1 for item in items]
+
+def estimate_tokens(data, model=OPENAI_MODEL):
+    """Estima los tokens de to_json(data) sin tokenizarlo entero.
+
+    La relación tokens/carácter se calibra con una muestra uniforme de los
+    elementos de detalle (incidencias, filas, tablas...) y se aplica a la
+    longitud JSON de los datos completos.
+    """
+    if isinstance(data, dict):
+        items = []
+        for key in DETAIL_KEYS:
+            value = data.get(key)
+            if isinstance(value, list):
+                items.extend(value)
+            elif isinstance(value, dict):
+                for item in value.values():
+                    items.extend(item if isinstance(item, list) else [item])
+    else:
+        items = data if isinstance(data, list) else []
+    text = to_json(data)
+    if len(items) <= CALIBRATION_SAMPLE:
+        return count_tokens(text, model)
+    sample_json = to_json(_sample_evenly(items, CALIBRATION_SAMPLE))
+    return len(text) * count_tokens(sample_json, model) / max(len(sample_json), 1)
+
+def fit_records(records, budget, model=OPENAI_MODEL):
+    """Ajusta una lista de registros a un presupuesto de tokens.
+
+    Los registros que caben se devuelven intactos. Si no caben, primero
+    recorta los textos largos; si aún no cabe, toma una muestra uniforme
+    del tamaño que permite el coste medio por registro y la reduce hasta
+    que el total medido queda dentro del presupuesto.
+    """
+    if not records or budget <= 0:
+        return []
+
+    costs = estimate_costs(records, model)
+    if sum(costs) > budget:
+        records = [_truncate_record(record) for record in records]
+        costs = estimate_costs(records, model)
+
+    if sum(costs) <= budget:
+        selected = records
+    else:
+        average = sum(costs) / len(costs)
+        selected = _sample_evenly(records, int(budget / average))
+
+    while selected and count_tokens(to_json(selected), model) > budget:
+        selected = _sample_evenly(selected, int(len(selected) * 0.9))
+    return selected
+
+def fit_section(value, budget, model=OPENAI_MODEL):
+    """Ajusta una sección de detalle (lista o diccionario) a un presupuesto de tokens."""
+    if isinstance(value, list):
+        return fit_records(value, budget, model)
+    if isinstance(value, dict):
+        if count_tokens(to_json(value), model) <= budget:
+            return value
+        # Reparto del presupuesto entre las entradas (hojas, tablas, épicas...)
+        share = budget / max(len(value), 1)
+        fitted = {}
+        for key, item in value.items():
+            if isinstance(item, (list, dict)):
+                fitted[key] = fit_section(item, share, model)
+            else:
+                fitted[key] = truncate_text(item)
+        while fitted and count_tokens(to_json(fitted), model) > budget:
+            fitted = dict(list(fitted.items())[:int(len(fitted) * 0.9)])
+        return fitted
+    return truncate_text(value)
+
+def _count_items(value):
+    if isinstance(value, (list, dict)):
+        return len(value)
+    return 1
+
+def build_prompt_data(data, token_budget, model=OPENAI_MODEL):
+    """Ajusta los datos del informe a un presupuesto de tokens.
+
+    Conserva siempre las secciones fijas (incluido "statistics") y reparte
+    lo que queda del presupuesto entre las secciones de DETAIL_KEYS por
+    orden. Devuelve (datos_ajustados, uso) donde uso indica los tokens
+    gastados por sección y cuántos elementos de detalle se incluyeron.
+    """
+    if not isinstance(data, dict):
+        return data, {"total": count_tokens(to_json(data), model)}
+
+    fixed = {key: value for key, value in data.items() if key not in DETAIL_KEYS}
+    usage = {"sections": {key: count_tokens(to_json(value), model) for key, value in fixed.items()}}
+    remaining = token_budget - sum(usage["sections"].values())
+
+    fitted = dict(fixed)
+    usage["detail"] = {}
+    for key in DETAIL_KEYS:
+        if key not in data:
+            continue
+        value = fit_section(data[key], remaining, model)
+        tokens = count_tokens(to_json(value), model)
+        fitted[key] = value
+        remaining -= tokens
+        usage["sections"][key] = tokens
+        usage["detail"][key] = {"included": _count_items(value), "total": _count_items(data[key])}
+
+    # Conservar el orden original de las claves
+    fitted = {key: fitted[key] for key in data if key in fitted}
+    usage["total"] = sum(usage["sections"].values())
+    usage["budget"] = token_budget
+    return fitted, usage
+
+def _detail_units(data):
+    """Descompone las secciones de detalle en unidades (sección, subclave, elemento, es_fila)."""
+    units = []
+    for key in DETAIL_KEYS:
+        value = data.get(key)
+        if key == "hierarchy" or value is None:
+            continue
+        if isinstance(value, list):
+            units.extend((key, None, _truncate_record(item), True) for item in value)
+        elif isinstance(value, dict):
+            for subkey, item in value.items():
+                if isinstance(item, list):
+                    units.extend((key, subkey, _truncate_record(row), True) for row in item)
+                else:
+                    units.append((key, subkey, item, False))
+        else:
+            units.append((key, None, value, False))
+    return units
+
+def _rebuild_chunk(units):
+    """Reconstruye un fragmento con la misma forma que las secciones originales."""
+    chunk = {}
+    for key, subkey, item, is_row in units:
+        if subkey is None:
+            if is_row:
+                chunk.setdefault(key, []).append(item)
+            else:
+                chunk[key] = item
+        elif is_row:
+            chunk.setdefault(key, {}).setdefault(subkey, []).append(item)
+        else:
+            chunk.setdefault(key, {})[subkey] = item
+    return chunk
+
+def split_detail(data, chunk_tokens, model=OPENAI_MODEL):
+    """Divide las secciones de detalle en fragmentos de hasta chunk_tokens.
+
+    Las incidencias, filas de hojas o tablas se agrupan en orden y de forma
+    voraz según su coste estimado. Devuelve una lista de diccionarios con
+    la misma forma que los datos originales (solo con claves de detalle).
+    """
+    if not isinstance(data, dict):
+        return [data]
+    units = _detail_units(data)
+    if not units:
+        return []
+
+    costs = estimate_costs([unit[2] for unit in units], model)
+    chunks, current, current_cost = [], [], 0
+    for unit, cost in zip(units, costs):
+        if current and current_cost + cost > chunk_tokens:
+            chunks.append(_rebuild_chunk(current))
+            current, current_cost = [], 0
+        current.append(unit)
+        current_cost += cost
+    if current:
+        chunks.append(_rebuild_chunk(current))
+    return chunks
@@ -0,0 +1,271 @@
+"""Trazas por etapa del pipeline de informes.
+
+Cada etapa se envuelve en un span (ver span y traced) que mide su
+duración y recoge atributos como bytes descargados, incidencias o filas,
+tokens del prompt y de la respuesta o tamaño del archivo generado. Los
+spans anidados comparten traza (contextvars, también a través de asyncio y
+de los hilos lanzados con contextvars.copy_context).
+
+Al cerrarse, cada span se añade como una línea JSON al archivo de trazas
+(que rota a .1 al superar trace_max_bytes) y se acumula en las métricas, que se escriben en formato de texto de
+Prometheus (para el textfile collector de node_exporter) al terminar cada
+traza. Con profile_dir, los spans abiertos con profile=True guardan un
+volcado de cProfile por etapa.
+"""
+import os
+import json
+import time
+import uuid
+import atexit
+import cProfile
+import threading
+import functools
+import contextlib
+import contextvars
+from config import TRACING_CONFIG
+
+# Atributos numéricos que se acumulan como contadores de Prometheus
+COUNTED_ATTRIBUTES = ("bytes", "requests", "issues", "rows", "tables", "prompt_tokens",
+                      "completion_tokens", "output_bytes")
+# Límites (segundos) del histograma de duración de los spans
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_current = contextvars.ContextVar("tracing_span", default=None)
+_captured = contextvars.ContextVar("tracing_captured", default=None)
+
+class Span:
+    """Etapa medida: nombre, identificadores de traza y atributos."""
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self.seconds = None
+        self.error = None
+
+    def set(self, **attributes):
+        """Añade o reemplaza atributos del span."""
+        self.attributes.update(attributes)
+
+    def add(self, **values):
+        """Suma valores numéricos a los atributos del span."""
+        for key, value in values.items():
+            self.attributes[key] = self.attributes.get(key, 0) + (value or 0)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "seconds": self.seconds,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+class Tracer:
+    """Destino de los spans: archivo de trazas, métricas acumuladas y perfiles."""
+
+    def __init__(self, trace_path=None, metrics_path=None, profile_dir=None, enabled=True,
+                 trace_max_bytes=None):
+        self.trace_path = trace_path
+        self.trace_max_bytes = trace_max_bytes
+        self.metrics_path = metrics_path
+        self.profile_dir = profile_dir
+        self.enabled = enabled
+        self.metrics = {}
+        self._lock = threading.Lock()
+        self._profiling = threading.local()
+
+    def configure(self, **options):
+        """Cambia trace_path, trace_max_bytes, metrics_path, profile_dir o enabled (p. ej. desde la CLI)."""
+        for key, value in options.items():
+            setattr(self, key, value)
+
+    def _write_trace(self, record):
+        if not self.trace_path:
+            return
+        directory = os.path.dirname(self.trace_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self.trace_max_bytes:
+                # Rotación por tamaño: el archivo lleno pasa a .1 (reemplazando el anterior)
+                try:
+                    size = os.path.getsize(self.trace_path)
+                except OSError:
+                    size = 0
+                if size and size + len(line) > self.trace_max_bytes:
+                    os.replace(self.trace_path, f"{self.trace_path}.1")
+            with open(self.trace_path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def _observe(self, record):
+        with self._lock:
+            metric = self.metrics.setdefault(record["name"], {
+                "count": 0, "errors": 0, "seconds": 0.0,
+                "buckets": [0] * len(SECONDS_BUCKETS), "counters": {},
+            })
+            metric["count"] += 1
+            metric["errors"] += 1 if record["error"] else 0
+            metric["seconds"] += record["seconds"]
+            for i, bound in enumerate(SECONDS_BUCKETS):
+                if record["seconds"] <= bound:
+                    metric["buckets"][i] += 1
+            for key in COUNTED_ATTRIBUTES:
+                value = record["attributes"].get(key)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    metric["counters"][key] = metric["counters"].get(key, 0) + value
+
+    def finish(self, record):
+        """Registra un span terminado (como dict): traza, métricas y, si es raíz, archivo de métricas."""
+        if not self.enabled:
+            return
+        captured = _captured.get()
+        if captured is not None:
+            captured.append(record)
+            return
+        self._write_trace(record)
+        self._observe(record)
+        if record["parent_id"] is None:
+            self.write_metrics()
+
+    def ingest(self, records):
+        """Registra spans capturados en otro proceso (ver capture) como hijos del span actual."""
+        parent = _current.get()
+        for record in records:
+            if parent is not None:
+                record["trace_id"] = parent.trace_id
+                if record["parent_id"] is None:
+                    record["parent_id"] = parent.span_id
+            self.finish(record)
+
+    def write_metrics(self):
+        """Escribe las métricas acumuladas en formato de texto de Prometheus (de forma atómica)."""
+        if not self.metrics_path:
+            return
+        with self._lock:
+            metrics = json.loads(json.dumps(self.metrics))
+        lines = [
+            "# HELP report_span_seconds Duración de las etapas del pipeline de informes.",
+            "# TYPE report_span_seconds histogram",
+        ]
+        for name, metric in sorted(metrics.items()):
+            for bound, count in zip(SECONDS_BUCKETS, metric["buckets"]):
+                lines.append(f'report_span_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+            lines.append(f'report_span_seconds_bucket{{span="{name}",le="+Inf"}} {metric["count"]}')
+            lines.append(f'report_span_seconds_sum{{span="{name}"}} {metric["seconds"]:.6f}')
+            lines.append(f'report_span_seconds_count{{span="{name}"}} {metric["count"]}')
+        lines += ["# HELP report_span_errors_total Etapas terminadas con error.",
+                  "# TYPE report_span_errors_total counter"]
+        lines += [f'report_span_errors_total{{span="{name}"}} {metric["errors"]}'
+                  for name, metric in sorted(metrics.items())]
+        for key in COUNTED_ATTRIBUTES:
+            values = [(name, metric["counters"][key]) for name, metric in sorted(metrics.items())
+                      if key in metric["counters"]]
+            if values:
+                lines += [f"# HELP report_{key}_total Total de {key} registrado por etapa.",
+                          f"# TYPE report_{key}_total counter"]
+                lines += [f'report_{key}_total{{span="{name}"}} {value}' for name, value in values]
+
+        directory = os.path.dirname(self.metrics_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.metrics_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.metrics_path)
+
+    def _start_profile(self):
+        # Un solo perfil activo por hilo: las etapas anidadas o intercaladas
+        # (asyncio) quedan dentro del perfil que ya está en marcha
+        if not self.profile_dir or getattr(self._profiling, "active", False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return None
+        self._profiling.active = True
+        return profile
+
+    def _stop_profile(self, profile, current):
+        profile.disable()
+        self._profiling.active = False
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{current.trace_id}-{current.name}-{current.span_id}.prof")
+        profile.dump_stats(path)
+        current.set(profile=path)
+
+tracer = Tracer(TRACING_CONFIG["trace_path"], TRACING_CONFIG["metrics_path"],
+                TRACING_CONFIG["profile_dir"], TRACING_CONFIG["enabled"], TRACING_CONFIG["trace_max_bytes"])
+atexit.register(tracer.write_metrics)
+
+@contextlib.contextmanager
+def span(name, profile=False, **attributes):
+    """Mide el bloque como un span hijo del span actual; devuelve el Span para añadir atributos.
+
+    Con profile=True y tracer.profile_dir, el bloque se ejecuta con cProfile
+    y el volcado queda en el atributo "profile".
+    """
+    if not tracer.enabled:
+        yield Span(name, attributes=attributes)
+        return
+    current = Span(name, _current.get(), attributes)
+    token = _current.set(current)
+    profiler = tracer._start_profile() if profile else None
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = str(e) or type(e).__name__
+        raise
+    finally:
+        current.seconds = time.perf_counter() - start
+        if profiler is not None:
+            tracer._stop_profile(profiler, current)
+        _current.reset(token)
+        tracer.finish(current.to_dict())
+
+def traced(name, profile=False):
+    """Decorador: ejecuta la función dentro de span(name)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, profile=profile):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record(**attributes):
+    """Añade atributos al span actual (no hace nada fuera de un span)."""
+    current = _current.get()
+    if current is not None:
+        current.set(**attributes)
+
+def add(**values):
+    """Suma valores numéricos a los atributos del span actual."""
+    current = _current.get()
+    if current is not None:
+        current.add(**values)
+
+@contextlib.contextmanager
+def capture():
+    """Acumula en una lista, en lugar de registrarlos, los spans que terminan dentro del bloque.
+
+    Sirve para devolver los spans de un proceso del pool al proceso
+    principal, que los registra con tracer.ingest.
+    """
+    records = []
+    captured_token = _captured.set(records)
+    current_token = _current.set(None)
+    try:
+        yield records
+    finally:
+        _current.reset(current_token)
+        _captured.reset(captured_token)